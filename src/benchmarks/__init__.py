@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Spot It! engine, on made-up symbols so no images are needed.
+
+Run them with `python -m src.benchmarks`. See `python -m src.benchmarks --help`.
+"""
@@ -0,0 +1,75 @@
+"""Run the benchmarks, save the results, and compare them with earlier results."""
+import argparse
+import contextlib
+import io
+import json
+import pathlib
+import sys
+
+from . import suite
+
+parser = argparse.ArgumentParser(
+    prog="benchmarks", description="Benchmark the Spot It! engine on made-up symbols."
+)
+parser.add_argument(
+    "names",
+    nargs="*",
+    help="only run benchmarks whose names contain one of these, like 'layout/' or 'pdf'",
+)
+parser.add_argument(
+    "--quick", action="store_true", help="run fewer and smaller cases, to check things work"
+)
+parser.add_argument(
+    "--output", type=pathlib.Path, help="save the results as JSON to this file"
+)
+parser.add_argument(
+    "--compare",
+    type=pathlib.Path,
+    help="compare the results with results saved from an earlier run, like on another commit",
+)
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=0.1,
+    help="how much slower or faster (as a fraction) counts as a change (default 0.1)",
+)
+parser.add_argument(
+    "--fail-on-regression",
+    action="store_true",
+    help="exit with status 1 if anything got slower, when comparing",
+)
+args = parser.parse_args()
+
+old = None
+if args.compare is not None:
+    old = json.loads(args.compare.read_text(encoding="utf-8"))
+
+# The PDF code draws progress bars, which would get in the way of the results.
+with contextlib.redirect_stderr(io.StringIO()):
+    results = suite.run(
+        args.names, args.quick, lambda name: print(f"{name} ...", file=sys.__stdout__)
+    )
+
+for name, result in results["results"].items():
+    print(
+        f"{name:<55} {result['median'] * 1000:10.3f} ms"
+        f"  ({result['items_per_second']:.1f}/s)"
+    )
+if args.output is not None:
+    args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+if old is not None:
+    if old.get("quick") != results["quick"]:
+        print("Warning: only one of the runs was --quick, so the results don't match up.")
+    print(
+        f"\nComparing with {old['environment'].get('commit')} "
+        f"(now {results['environment'].get('commit')}):"
+    )
+    rows = suite.compare(old, results, args.threshold)
+    for name, before, after, verdict in rows:
+        print(
+            f"{name:<55} {before * 1000:10.3f} -> {after * 1000:10.3f} ms"
+            f"  {after / before:5.2f}x  {verdict}"
+        )
+    if args.fail_on_regression and any(verdict == "slower" for *_, verdict in rows):
+        sys.exit(1)
@@ -0,0 +1,282 @@
+"""The benchmarks, and how they are timed."""
+
+import dataclasses
+import functools
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable
+
+import numpy
+import PIL
+from PIL import Image
+
+from ..spot_it import images, pdfs, placement, projective_plane
+from ..spot_it.randomization import RandomizeImageInfo
+from ..spot_it.utils import FloatRange
+from . import synthetic
+
+# Every order of projective plane up to 31 that can be made.
+ORDERS = (2, 3, 4, 5, 7, 8, 9, 11, 13, 16, 17, 19, 23, 25, 27, 29, 31)
+# How many different layouts each layout or card benchmark makes per run, so that one unlucky
+# seed doesn't decide the result.
+LAYOUT_SEEDS = 5
+# The most symbols each engine is benchmarked with. The rejection engine takes seconds per card
+# at 8 symbols, and much longer after that.
+MAX_SYMBOLS = {"rejection": 6, "vectorized": 12}
+
+
+@dataclasses.dataclass
+class Benchmark:
+    """
+    Something to time. `setup` makes its inputs and returns the function to time, which does
+    `items` things (like laying out cards) and is called `number` times for each of `repeat`
+    timings. Nothing is made until the benchmark is measured, so skipped ones cost nothing.
+    """
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    items: int = 1
+    number: int = 1
+    repeat: int = 5
+
+    def measure(self) -> dict:
+        """Set up and time the benchmark, after running it once to warm up."""
+        run = self.setup()
+        run()
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            for _ in range(self.number):
+                run()
+            times.append((time.perf_counter() - start) / self.number)
+        median = statistics.median(times)
+        return {
+            "min": min(times),
+            "median": median,
+            "mean": statistics.fmean(times),
+            "items": self.items,
+            "items_per_second": self.items / median if median else None,
+            "number": self.number,
+            "repeat": self.repeat,
+        }
+
+
+def _plane(order: int) -> Callable[[], object]:
+    def run():
+        projective_plane.get_plane.cache_clear()
+        return list(projective_plane.all_lines(order))
+
+    return run
+
+
+def _layout(count: int, size: int, engine: str) -> Callable[[], object]:
+    def run():
+        for seed in range(LAYOUT_SEEDS):
+            placement.layout_card(count, size, engine, random.Random(seed))
+
+    return run
+
+
+def _card(
+    symbols: Callable[[], list[Image.Image]], count: int, size: int, engine: str
+) -> Callable[[], object]:
+    chosen = symbols()[:count]
+
+    def run():
+        for seed in range(LAYOUT_SEEDS):
+            images.spot_it_card(chosen, size, engine=engine, rng=random.Random(seed))
+
+    return run
+
+
+def _transform(
+    symbols: Callable[[], list[Image.Image]], size: int
+) -> Callable[[], object]:
+    symbol = symbols()[0]
+    info = RandomizeImageInfo.placed(size, 37, 0.3 * size, 0j)
+    return lambda: images.make_image_random(symbol, info)
+
+
+def _float_ranges(intervals: int, seed: int) -> FloatRange:
+    rng = random.Random(seed)
+    ends = sorted(rng.uniform(0, 1000) for _ in range(2 * intervals))
+    return FloatRange(*zip(ends[::2], ends[1::2]))
+
+
+_FLOAT_RANGE_OPERATIONS = {
+    "union": lambda a, b, rng: a + b,
+    "difference": lambda a, b, rng: a - b,
+    "intersection": lambda a, b, rng: a & b,
+    "contains": lambda a, b, rng: 500.0 in a,
+    "random": lambda a, b, rng: a.random(rng),
+}
+
+
+def _float_range(operation: str, intervals: int) -> Callable[[], object]:
+    first, second = _float_ranges(intervals, 1), _float_ranges(intervals, 2)
+    function, rng = _FLOAT_RANGE_OPERATIONS[operation], random.Random(0)
+    return lambda: function(first, second, rng)
+
+
+def _pdf(
+    symbols: Callable[[], list[Image.Image]],
+    count: int,
+    size: int,
+    directory: pathlib.Path,
+) -> Callable[[], object]:
+    chosen = symbols()[:4]
+    cards = [
+        images.spot_it_card(chosen, size, engine="vectorized", rng=random.Random(seed))
+        for seed in range(count)
+    ]
+    return lambda: pdfs.put_on_pdf(cards, directory / "cards.pdf")
+
+
+def benchmarks(directory: pathlib.Path, quick: bool = False) -> list[Benchmark]:
+    """
+    Get every benchmark. Files they write go in `directory`. If `quick` is True, fewer and
+    smaller cases are run, to check that things work rather than to compare results.
+    """
+    orders = (2, 3, 7, 13) if quick else ORDERS
+    counts = (3, 6, 8) if quick else (3, 4, 6, 8, 12)
+    sizes = (250,) if quick else (250, 500, 1000)
+    repeat = 2 if quick else 5
+    # Drawn by the first benchmark that needs them, then shared.
+    symbols = functools.cache(functools.partial(synthetic.symbols, max(counts)))
+    result = [
+        Benchmark(
+            f"plane/all_lines/order={order}",
+            functools.partial(_plane, order),
+            repeat=repeat,
+        )
+        for order in orders
+    ]
+    for engine in sorted(placement.LAYOUT_ENGINES):
+        for count in counts:
+            if count > MAX_SYMBOLS.get(engine, max(counts)):
+                continue
+            for size in sizes:
+                result.append(
+                    Benchmark(
+                        f"layout/{engine}/symbols={count}/size={size}",
+                        functools.partial(_layout, count, size, engine),
+                        items=LAYOUT_SEEDS,
+                        repeat=repeat,
+                    )
+                )
+    for count in counts:
+        for size in sizes:
+            result.append(
+                Benchmark(
+                    f"card/symbols={count}/size={size}",
+                    functools.partial(_card, symbols, count, size, "vectorized"),
+                    items=LAYOUT_SEEDS,
+                    repeat=repeat,
+                )
+            )
+    for size in sizes:
+        result.append(
+            Benchmark(
+                f"transform/size={size}",
+                functools.partial(_transform, symbols, size),
+                number=20,
+                repeat=repeat,
+            )
+        )
+    for intervals in (10, 100) if quick else (10, 100, 1000):
+        result += [
+            Benchmark(
+                f"floatrange/intervals={intervals}/{operation}",
+                functools.partial(_float_range, operation, intervals),
+                number=100,
+                repeat=repeat,
+            )
+            for operation in _FLOAT_RANGE_OPERATIONS
+        ]
+    cards_in_pdf, card_size = (7, 250) if quick else (13, 1000)
+    result.append(
+        Benchmark(
+            f"pdf/put_on_pdf/cards={cards_in_pdf}/size={card_size}",
+            functools.partial(_pdf, symbols, cards_in_pdf, card_size, directory),
+            items=cards_in_pdf,
+            repeat=repeat,
+        )
+    )
+    return result
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=pathlib.Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """Describe what the benchmarks were run on, so results can be compared fairly."""
+    status = _git("status", "--porcelain")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": None if status is None else bool(status),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def run(
+    names: list[str] | None = None,
+    quick: bool = False,
+    progress: Callable[[str], None] | None = None,
+) -> dict:
+    """
+    Run the benchmarks whose names contain any of `names` (all of them if not given), calling
+    `progress` with each name before it runs. Returns the results with the environment.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for benchmark in benchmarks(pathlib.Path(directory), quick):
+            if names and not any(name in benchmark.name for name in names):
+                continue
+            if progress is not None:
+                progress(benchmark.name)
+            results[benchmark.name] = benchmark.measure()
+    return {"environment": environment(), "quick": quick, "results": results}
+
+
+def compare(
+    old: dict, new: dict, threshold: float = 0.1
+) -> list[tuple[str, float, float, str]]:
+    """
+    Compare the median times of benchmarks in both `old` and `new` results. Each row is the name,
+    both times and a verdict: "slower" or "faster" if they differ by more than `threshold` (as a
+    fraction of the old time), or "same".
+    """
+    rows = []
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before, after = old["results"][name]["median"], result["median"]
+        verdict = "same"
+        if after > before * (1 + threshold):
+            verdict = "slower"
+        elif after < before * (1 - threshold):
+            verdict = "faster"
+        rows.append((name, before, after, verdict))
+    return rows
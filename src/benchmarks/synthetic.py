@@ -0,0 +1,31 @@
+"""Made-up symbols to benchmark with."""
+
+import random
+
+from PIL import Image, ImageDraw
+
+
+def symbol(size: int, seed: int) -> Image.Image:
+    """
+    Draw a symbol `size` pixels across: a few coloured shapes on a transparent background, like
+    the clip art that real decks use. The same `seed` always draws the same symbol.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(2, 5)):
+        colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+        left, top = rng.randrange(size // 2), rng.randrange(size // 2)
+        right, bottom = rng.randrange(left + 1, size), rng.randrange(top + 1, size)
+        if rng.random() < 0.5:
+            draw.ellipse([(left, top), (right, bottom)], colour)
+        else:
+            draw.polygon(
+                [(rng.randrange(size), rng.randrange(size)) for _ in range(3)], colour
+            )
+    return image
+
+
+def symbols(count: int, size: int = 300, seed: int = 0) -> list[Image.Image]:
+    """Draw `count` different symbols."""
+    return [symbol(size, seed * 1_000_003 + index) for index in range(count)]
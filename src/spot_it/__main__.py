@@ -1,4 +1,518 @@
-"""__main__"""
-from . import spot_it
+"""
+The command line interface.
 
-spot_it.deck()
+Only the standard library is imported up front. Each command imports what it needs when it runs,
+so `plan` and `check` don't load Pillow, reportlab or tqdm and start in milliseconds, and `plan`
+doesn't load numpy either.
+"""
+import argparse
+import json
+import pathlib
+import random
+import sys
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .profiling import Recorder
+
+# The commands, for when the first argument is an option and `make` is meant.
+COMMANDS = ("make", "plan", "check", "merge", "watch")
+# The same defaults as in `spot_it`, which isn't imported until a deck is made.
+DIRECTORY = pathlib.Path("images")
+OUTPUT_DIR = pathlib.Path("output")
+RESOLUTION = 1000
+
+
+def _count_symbols(directory: pathlib.Path) -> int:
+    """Count the PNGs in `directory` the way `utils.get_images` finds them, without Pillow."""
+    return sum(
+        1
+        for file in directory.iterdir()
+        if file.is_file() and file.suffix.lower() == ".png"
+    )
+
+
+def _order(directory: pathlib.Path) -> int:
+    """Get the order of the plane for the symbols in `directory`, or exit with the reason."""
+    # Not `projective_plane`, which loads numpy.
+    from . import plane_order  # pylint: disable=import-outside-toplevel
+
+    try:
+        symbols = _count_symbols(directory)
+        if not symbols:
+            sys.exit(f"{directory}: There are no PNGs to make symbols from.")
+        return plane_order.get_order(symbols)
+    except (OSError, plane_order.ProjectivePlaneError) as error:
+        sys.exit(f"{directory}: {error}")
+
+
+def plan(args: argparse.Namespace):
+    """Print the size of the deck the symbols would make, without reading any images."""
+    order = _order(args.images)
+    cards = order**2 + order + 1
+    canvas = 4 * (2 * args.resolution) ** 2
+    print(f"Symbols:          {cards}")
+    print(f"Order:            {order}")
+    print(f"Cards:            {cards}")
+    print(f"Symbols per card: {order + 1}")
+    print(f"Card size:        {args.resolution}x{args.resolution} pixels")
+    print(f"Memory per card:  {canvas / 2**20:.1f} MiB while it is being made")
+
+
+def check(args: argparse.Namespace):
+    """Check that the deck for the symbols has exactly one match between every two cards."""
+    # pylint: disable=import-outside-toplevel
+    from . import projective_plane, validation
+
+    order = _order(args.images)
+    start = time.perf_counter()
+    try:
+        plane = projective_plane.get_plane(order)
+    except projective_plane.ProjectivePlaneError as error:
+        sys.exit(str(error))
+    report = validation.validate_deck(plane.lines)
+    print(f"{report} ({time.perf_counter() - start:.3f}s)")
+    if not report.ok:
+        sys.exit(1)
+
+
+def _print_timings(recorder: "Recorder", cards: int, seconds: float):
+    """Print how long a dry run took, in total and in each stage."""
+    print(f"Made {cards} cards in {seconds:.3f}s ({cards / seconds:.1f} cards/s)")
+    recorded = recorder.snapshot()
+    stages = recorded["stages"]
+    if stages:
+        print("Time in each stage, added up across every process:")
+    for name, stage in sorted(
+        stages.items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
+        print(
+            f"  {name:<12} {stage['seconds']:9.3f}s  {stage['calls']:7} calls"
+            f"  {stage['seconds'] / stage['calls'] * 1000:9.3f} ms/call"
+        )
+    for name, amount in sorted(recorded["counters"].items()):
+        print(f"  {name:<24} {amount}")
+    for name, amount in sorted(recorded["peaks"].items()):
+        print(f"  peak {name:<19} {amount / 2**20:.1f} MiB")
+
+
+def make(args: argparse.Namespace):
+    """Make the deck."""
+    # pylint: disable=import-outside-toplevel
+    from . import images, outputs, shards, spot_it
+    from .symbol_cache import SymbolCache
+
+    cards = args.cards
+    if args.shard is not None:
+        cards = shards.shard_range(_count_symbols(args.images), *args.shard)
+    try:
+        images.get_quality(args.quality)
+        images.get_canvas(args.canvas)
+        symbol_cache = None
+        if args.symbol_cache or args.scale_step or args.rotation_step:
+            # Symbols are drawn on cards of the drawn size, which is smaller for a preview.
+            symbol_cache = SymbolCache(
+                images.drawn_size(args.resolution, args.quality),
+                scale_step=args.scale_step,
+                rotation_step=args.rotation_step,
+            )
+        options = spot_it.DeckOptions(
+            directory=args.images,
+            output_dir=args.output,
+            backend=outputs.get_backend(args.format),
+            resolution=args.resolution,
+            engine=args.engine,
+            quality=args.quality,
+            canvas=args.canvas,
+            symbol_cache=symbol_cache,
+            seed=args.seed,
+            workers=args.workers,
+            max_in_flight=args.max_in_flight,
+            validate=args.validate,
+            cache_dir=args.cache_dir,
+            layouts_path=args.layouts,
+            atlas_path=args.atlas,
+            pdf_dpi=args.pdf_dpi,
+            pages_per_pdf=args.pages_per_pdf,
+            vector_pdf=args.vector_pdf,
+            cards=cards,
+            dry_run=args.dry_run,
+            report_path=args.profile_report,
+            cprofile_path=args.cprofile,
+            trace_memory=args.trace_memory,
+        )
+    except ValueError as error:
+        sys.exit(str(error))
+    start = time.perf_counter()
+    recorder = spot_it.deck(options)
+    if args.dry_run and recorder is not None:
+        made = _count_symbols(args.images) if cards is None else len(cards)
+        _print_timings(recorder, made, time.perf_counter() - start)
+
+
+def merge(args: argparse.Namespace):
+    """Put together the parts of a deck."""
+    from . import shards  # pylint: disable=import-outside-toplevel
+
+    try:
+        shards.merge(args.parts, args.output, args.pdf_dpi, args.pages_per_pdf)
+    except ValueError as error:
+        sys.exit(str(error))
+
+
+def watch(args: argparse.Namespace):
+    """Keep the deck warm, making cards again when the symbols change or when asked to."""
+    # pylint: disable=import-outside-toplevel
+    from . import outputs
+    from .watch import WarmDeck, serve, serve_socket
+
+    seed = random.getrandbits(64) if args.seed is None else args.seed
+    start = time.perf_counter()
+    try:
+        deck = WarmDeck(
+            args.images,
+            args.output,
+            seed,
+            resolution=args.resolution,
+            engine=args.engine,
+            quality=args.quality,
+            canvas=args.canvas,
+            backend=outputs.get_backend(args.format),
+            layouts_path=args.layouts,
+            pdf_dpi=args.pdf_dpi,
+        )
+    except (OSError, ValueError) as error:
+        sys.exit(str(error))
+    seconds = round(time.perf_counter() - start, 4)
+    print(json.dumps({"event": "ready", **deck.status(), "seconds": seconds}), flush=True)
+    interval = args.interval or None
+    if args.port is None:
+        serve(deck, sys.stdin, sys.stdout, interval)
+        return
+
+    def listening(address: tuple[str, int]):
+        host, port = address
+        print(json.dumps({"event": "listening", "host": host, "port": port}), flush=True)
+
+    try:
+        serve_socket(deck, args.port, interval=interval, ready=listening)
+    except KeyboardInterrupt:
+        pass
+
+
+def _seed(value: str) -> int | str:
+    """Seeds that look like numbers are numbers, so `--seed 1` matches `deck(seed=1)`."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _card_numbers(value: str) -> range:
+    """Cards are numbered from 1, as their files are, and both ends are included."""
+    first, _, last = value.partition("-")
+    try:
+        cards = range(int(first) - 1, int(last or first))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a range like 1-50") from None
+    if not cards or cards.start < 0:
+        raise argparse.ArgumentTypeError(f"{value} has no cards in it")
+    return cards
+
+
+def _part(value: str) -> tuple[int, int]:
+    shard, _, shards = value.partition("/")
+    try:
+        part = (int(shard), int(shards))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a part like 2/4") from None
+    if not 1 <= part[0] <= part[1]:
+        raise argparse.ArgumentTypeError(f"there is no part {value}")
+    return part
+
+
+def _not_negative(value: str) -> float:
+    number = float(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return number
+
+
+def _fraction(value: str) -> float:
+    number = float(value)
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(f"{value} is not between 0 and 1")
+    return number
+
+
+def _positive(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
+
+
+def _add_symbol_options(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--images",
+        type=pathlib.Path,
+        default=DIRECTORY,
+        help=f"the directory with a PNG for each symbol (default {DIRECTORY})",
+    )
+    parser.add_argument(
+        "--resolution",
+        type=_positive,
+        default=RESOLUTION,
+        help=f"the width and height of each card in pixels (default {RESOLUTION})",
+    )
+
+
+def _add_deck_options(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        default=OUTPUT_DIR,
+        help=f"the directory to write the cards to (default {OUTPUT_DIR})",
+    )
+    parser.add_argument(
+        "--format",
+        default="png",
+        help="how to write each card: png, webp, jpeg, or pdf-only to only make the PDF "
+        "(default png)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=_seed,
+        help="make the same deck every time with this seed",
+    )
+    parser.add_argument(
+        "--engine",
+        default="rejection",
+        help="the layout engine: rejection, vectorized, packed or template (default rejection)",
+    )
+    parser.add_argument(
+        "--quality",
+        default="default",
+        help="preview to quickly draw the same deck at a quarter of the resolution, default, or "
+        "print for smoother symbols (default default)",
+    )
+    parser.add_argument(
+        "--canvas",
+        default="rgba",
+        help="draw cards on rgba with a transparent background, rgb flattened onto white, or "
+        "gray for symbols without colour, in a quarter of the memory (default rgba)",
+    )
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Make the parser for every command."""
+    parser = argparse.ArgumentParser(
+        prog="spot_it",
+        description="Make a Spot It! deck. Without a command, the deck is made.",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    make_command = commands.add_parser(
+        "make", help="make the deck (the default)", description="Make a Spot It! deck."
+    )
+    make_command.set_defaults(run=make)
+    _add_symbol_options(make_command)
+    _add_deck_options(make_command)
+    make_command.add_argument(
+        "--workers",
+        type=_positive,
+        help="render cards in this many processes (default: in this process)",
+    )
+    make_command.add_argument(
+        "--max-in-flight",
+        type=_positive,
+        help="write cards while more are made, with at most this many in memory at once",
+    )
+    make_command.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        help="keep rendered cards here and only make cards that changed (needs --seed)",
+    )
+    make_command.add_argument(
+        "--pdf-dpi",
+        type=_positive,
+        help="shrink cards to this many dots per inch on the PDF",
+    )
+    make_command.add_argument(
+        "--pages-per-pdf",
+        type=_positive,
+        help="split the PDF into files of this many pages, written at the same time",
+    )
+    make_command.add_argument(
+        "--vector-pdf",
+        action="store_true",
+        help="draw the PDF from the layouts of the cards, with each symbol in it once, which is "
+        "much smaller and faster to make",
+    )
+    make_command.add_argument(
+        "--layouts",
+        type=pathlib.Path,
+        help="pick layouts from the library of layouts in this file, making it first if needed",
+    )
+    make_command.add_argument(
+        "--symbol-cache",
+        action="store_true",
+        help="scale each symbol down once, and keep symbols as they are drawn to use again",
+    )
+    make_command.add_argument(
+        "--scale-step",
+        type=_fraction,
+        help="round symbol sizes down to steps of this fraction of the card, so more of them are "
+        "shared (turns on --symbol-cache)",
+    )
+    make_command.add_argument(
+        "--rotation-step",
+        type=_positive,
+        help="round symbol rotations to steps of this many degrees, so more of them are shared "
+        "(turns on --symbol-cache)",
+    )
+    make_command.add_argument(
+        "--atlas",
+        type=pathlib.Path,
+        help="decode the symbols once into this file, which worker processes share instead of "
+        "each decoding every symbol",
+    )
+    make_command.add_argument(
+        "--validate",
+        action="store_true",
+        help="check that every pair of cards has exactly one symbol in common before making "
+        "the deck",
+    )
+    part = make_command.add_mutually_exclusive_group()
+    part.add_argument(
+        "--cards",
+        type=_card_numbers,
+        help="only make these cards, like 1-50, with a manifest to merge them with the others",
+    )
+    part.add_argument(
+        "--shard",
+        type=_part,
+        help="only make this part of the deck, like 2/4 for the second of four parts that are "
+        "about the same size, with a manifest to merge them",
+    )
+    make_command.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="make the cards without writing anything, and print how long each stage took",
+    )
+    make_command.add_argument(
+        "--profile-report",
+        type=pathlib.Path,
+        help="write the time spent in each stage and other counts as JSON to this file",
+    )
+    make_command.add_argument(
+        "--cprofile",
+        type=pathlib.Path,
+        help="also profile the main thread with cProfile, and save the stats to this file",
+    )
+    make_command.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="add the peak memory allocated by Python to the profile report",
+    )
+
+    plan_command = commands.add_parser(
+        "plan",
+        help="print how many cards the symbols make, without reading them",
+        description="Print how many cards the symbols make, without reading them.",
+    )
+    plan_command.set_defaults(run=plan)
+    _add_symbol_options(plan_command)
+
+    check_command = commands.add_parser(
+        "check",
+        help="check that every pair of cards would have one symbol in common",
+        description="Check that every pair of cards would have exactly one symbol in common. "
+        "Use make --validate to also check for symbols that are the same image.",
+    )
+    check_command.set_defaults(run=check)
+    check_command.add_argument(
+        "--images",
+        type=pathlib.Path,
+        default=DIRECTORY,
+        help=f"the directory with a PNG for each symbol (default {DIRECTORY})",
+    )
+
+    merge_command = commands.add_parser(
+        "merge",
+        help="put together the parts of a deck made with --cards or --shard",
+        description="Put together the parts of a deck made with make --cards or --shard, "
+        "checking that they are all for the same deck and that no cards are missing.",
+    )
+    merge_command.set_defaults(run=merge)
+    merge_command.add_argument(
+        "parts",
+        type=pathlib.Path,
+        nargs="+",
+        help="the directories the parts were made in",
+    )
+    merge_command.add_argument(
+        "--output",
+        type=pathlib.Path,
+        default=OUTPUT_DIR,
+        help=f"the directory to put the whole deck in (default {OUTPUT_DIR})",
+    )
+    merge_command.add_argument(
+        "--pdf-dpi",
+        type=_positive,
+        help="shrink cards to this many dots per inch on the PDF",
+    )
+    merge_command.add_argument(
+        "--pages-per-pdf",
+        type=_positive,
+        help="split the PDF into files of this many pages, written at the same time",
+    )
+
+    watch_command = commands.add_parser(
+        "watch",
+        help="keep the deck in memory, and make cards again as their symbols change",
+        description="Make the deck, then keep the symbols and the layout of every card in "
+        "memory, making only the cards a changed symbol is on again. Requests are read as lines "
+        'of JSON from stdin, or from connections to --port: {"command": "refresh"}, "render" '
+        '(with "cards": [numbers]), "pdf", "status" or "quit". Each gets a line of JSON back.',
+    )
+    watch_command.set_defaults(run=watch)
+    _add_symbol_options(watch_command)
+    _add_deck_options(watch_command)
+    watch_command.add_argument(
+        "--layouts",
+        type=pathlib.Path,
+        help="pick layouts from the library of layouts in this file, making it first if needed",
+    )
+    watch_command.add_argument(
+        "--pdf-dpi",
+        type=_positive,
+        help="shrink symbols to this many dots per inch on the PDF",
+    )
+    watch_command.add_argument(
+        "--interval",
+        type=_not_negative,
+        default=0.5,
+        help="look for changed symbols this often, in seconds, or never if it is 0 (default 0.5)",
+    )
+    watch_command.add_argument(
+        "--port",
+        type=int,
+        help="take requests from connections to this port on 127.0.0.1 instead of stdin, or any "
+        "free port if it is 0",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    """Run the command in `argv` (the program's arguments by default)."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["make", *argv]
+    args = make_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+A symbol atlas: every decoded symbol packed into one buffer, which any process can map instead of
+decoding and keeping its own copy of every symbol.
+"""
+
+import contextlib
+import json
+import mmap
+import pathlib
+import struct
+from multiprocessing import shared_memory
+from typing import Generator, Iterator
+
+from PIL import Image
+
+from .utils import LazySymbol, Symbol, as_image, get_images, set_source
+
+# The start of every atlas file, followed by the length of the index.
+MAGIC = b"SPOTATLAS1"
+HEADER = struct.Struct(f"<{len(MAGIC)}sI")
+# Each symbol's pixels start at a multiple of this many bytes.
+ALIGNMENT = 64
+
+
+class SymbolAtlas:
+    """
+    Decoded RGBA symbols, one after the other in a single buffer, with the offset and size of
+    each. Getting a symbol wraps its part of the buffer in an image without copying it.
+
+    An atlas is either a file mapped with `mmap` (see `open` and `load_or_build`) or a block of
+    shared memory (see `shared`). Pickling an atlas only sends the file path or the name of the
+    shared memory, so every process maps the same pixels, and memory doesn't grow with the number
+    of worker processes.
+    """
+
+    index: dict
+    # Where the atlas is, to map it again in another process: ("file", path) or ("shared", name).
+    source: tuple[str, str]
+
+    def __init__(self, buffer: memoryview, source: tuple[str, str], keep=None) -> None:
+        magic, length = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("This is not a symbol atlas.")
+        self.index = json.loads(bytes(buffer[HEADER.size : HEADER.size + length]))
+        self.source = source
+        self._buffer = buffer
+        # The mmap or shared memory the buffer is in, which has to stay open while it is used.
+        self._keep = keep
+        self._images: dict[int, Image.Image] = {}
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "SymbolAtlas":
+        """Map the atlas file at `path`."""
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(memoryview(mapped), ("file", str(path)), mapped)
+
+    @classmethod
+    def attach(cls, name: str) -> "SymbolAtlas":
+        """Map the atlas in the shared memory called `name`."""
+        memory = shared_memory.SharedMemory(name)
+        return cls(memory.buf, ("shared", name), memory)
+
+    def __getstate__(self) -> tuple[str, str]:
+        return self.source
+
+    def __setstate__(self, state: tuple[str, str]):
+        kind, location = state
+        atlas = (
+            self.open(pathlib.Path(location)) if kind == "file" else self.attach(location)
+        )
+        self.__dict__.update(atlas.__dict__)
+
+    def __len__(self) -> int:
+        return len(self.index["symbols"])
+
+    def __getitem__(self, number: int) -> Image.Image:
+        """
+        Get symbol `number`, sharing the atlas's memory. The same image is returned every time,
+        so caches keyed by image (like `SymbolCache`) work. It is read-only: drawing on it makes
+        a copy first.
+        """
+        if number < 0:
+            number += len(self)
+        image = self._images.get(number)
+        if image is None:
+            entry = self.index["symbols"][number]
+            width, height = entry["size"]
+            pixels = self._buffer[entry["offset"] : entry["offset"] + 4 * width * height]
+            image = Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, 1)
+            if "path" in entry:
+                set_source(image, entry["path"])
+            self._images[number] = image
+        return image
+
+    def __iter__(self):
+        return (self[number] for number in range(len(self)))
+
+    @property
+    def names(self) -> list[str]:
+        """The file name of each symbol."""
+        return [entry["name"] for entry in self.index["symbols"]]
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the whole atlas, in bytes."""
+        return len(self._buffer)
+
+    def close(self):
+        """
+        Stop using the atlas. If images got from it are still in use, the memory is only unmapped
+        once they are gone.
+        """
+        self._images.clear()
+        self._buffer = memoryview(b"")
+        if self._keep is not None:
+            with contextlib.suppress(BufferError):
+                self._keep.close()
+            self._keep = None
+
+
+def _index(symbols: list[Symbol], sources: list[dict] | None = None) -> tuple[bytes, int]:
+    """
+    Work out where each symbol goes in an atlas. Returns the start of the atlas, up to the end of
+    the index, and the size of the whole atlas.
+    """
+    entries = [dict(source) for source in sources] if sources else [{} for _ in symbols]
+    for entry, symbol in zip(entries, symbols):
+        if isinstance(symbol, LazySymbol):
+            entry["path"] = str(symbol.path)
+        entry["size"] = list(symbol.size)
+        entry["offset"] = 0
+    # Leave room for the offsets to be filled in, with up to 20 digits each.
+    offset = HEADER.size + len(json.dumps({"symbols": entries})) + 20 * len(entries)
+    for entry in entries:
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entry["offset"] = offset
+        width, height = entry["size"]
+        offset += 4 * width * height
+    encoded = json.dumps({"symbols": entries}).encode()
+    return HEADER.pack(MAGIC, len(encoded)) + encoded, offset
+
+
+def _pixels(symbols: list[Symbol], header: bytes) -> Iterator[tuple[int, bytes]]:
+    """Decode each symbol in turn, for where its pixels go in the atlas with `header`."""
+    entries = json.loads(header[HEADER.size :])["symbols"]
+    for entry, symbol in zip(entries, symbols):
+        image = as_image(symbol).convert("RGBA")
+        if list(image.size) != entry["size"]:
+            raise ValueError(f"{symbol!r} decoded at a different size than expected.")
+        yield entry["offset"], image.tobytes()
+
+
+@contextlib.contextmanager
+def shared(symbols: list[Symbol]) -> Generator[SymbolAtlas, None, None]:
+    """
+    Decode `symbols` into an atlas in shared memory, for the `with` block. Worker processes the
+    atlas is sent to map the same memory. The memory is freed at the end of the block.
+    """
+    header, size = _index(symbols)
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        memory.buf[: len(header)] = header
+        for offset, pixels in _pixels(symbols, header):
+            memory.buf[offset : offset + len(pixels)] = pixels
+        atlas = SymbolAtlas(memory.buf, ("shared", memory.name))
+        try:
+            yield atlas
+        finally:
+            atlas.close()
+    finally:
+        memory.unlink()
+        with contextlib.suppress(BufferError):
+            memory.close()
+
+
+def _sources(symbols: list[LazySymbol], max_dimension: int | None) -> list[dict]:
+    """Describe the files symbols are decoded from, to tell when an atlas is out of date."""
+    sources = []
+    for symbol in symbols:
+        stat = symbol.path.stat()
+        sources.append(
+            {
+                "name": symbol.path.name,
+                "path": str(symbol.path),
+                "bytes": stat.st_size,
+                "modified": stat.st_mtime_ns,
+                "max_dimension": max_dimension,
+            }
+        )
+    return sources
+
+
+def load_or_build(
+    path: pathlib.Path, directory: pathlib.Path, max_dimension: int | None = None
+) -> SymbolAtlas:
+    """
+    Map the atlas at `path` of the PNGs in `directory`, decoded as `utils.get_images` would with
+    `max_dimension`. If there isn't one, or the PNGs have changed since it was made, it is made
+    again first.
+    """
+    symbols = get_images(directory, max_dimension, lazy=True)
+    sources = _sources(symbols, max_dimension)
+    if path.is_file():
+        atlas = SymbolAtlas.open(path)
+        keys = ("name", "path", "bytes", "modified", "max_dimension")
+        found = [{key: entry.get(key) for key in keys} for entry in atlas.index["symbols"]]
+        if found == sources:
+            return atlas
+        atlas.close()
+    # Write to another file first, so a process that has the old atlas mapped isn't affected.
+    partial = path.with_name(path.name + ".partial")
+    header, size = _index(symbols, sources)
+    with open(partial, "wb") as file:
+        file.write(header)
+        for offset, pixels in _pixels(symbols, header):
+            file.seek(offset)
+            file.write(pixels)
+        file.truncate(size)
+    partial.replace(path)
+    return SymbolAtlas.open(path)
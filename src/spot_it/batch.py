@@ -0,0 +1,278 @@
+"""Make many decks at once, sharing one pool of worker processes."""
+
+import asyncio
+import concurrent.futures
+import os
+import pathlib
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable
+
+from PIL import Image
+
+from . import images, outputs, pdfs, projective_plane, utils
+from .progress import (
+    CARD,
+    FAILED,
+    FINISHED,
+    REPORT,
+    STARTED,
+    ProgressCallback,
+    ProgressEvent,
+)
+from .spot_it import RESOLUTION
+from .symbol_cache import ImageLRU
+
+# How many bytes of decoded symbols each worker process keeps, across every deck it works on.
+WORKER_SYMBOL_BYTES = 256 * 2**20
+
+# Symbols decoded in a worker process, by path and size.
+_worker_symbols: ImageLRU[Image.Image] = ImageLRU(WORKER_SYMBOL_BYTES)
+
+
+@dataclass
+class DeckJob:
+    """
+    A deck to make from the PNGs in `symbols`, written to `output` with the output backend called
+    `backend` and, if `pdf` is True, on PDFs. The other options are as for `spot_it.DeckOptions`.
+    Decks without a `seed` get a random one.
+    """
+
+    symbols: pathlib.Path
+    output: pathlib.Path
+    name: str | None = None
+    seed: int | str | None = None
+    resolution: int = RESOLUTION
+    engine: str = "rejection"
+    quality: str = "default"
+    canvas: str = "rgba"
+    backend: str = "png"
+    pdf: bool = True
+    pdf_dpi: int | None = None
+    pages_per_pdf: int | None = None
+
+    @property
+    def label(self) -> str:
+        """The name of the deck in progress events."""
+        return self.name or str(self.output)
+
+
+@dataclass
+class DeckResult:
+    """How making the deck for `job` went. `error` is what went wrong, if anything."""
+
+    job: DeckJob
+    cards: int = 0
+    seconds: float = 0
+    error: BaseException | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the whole deck was made."""
+        return self.error is None
+
+
+def card_bytes(resolution: int, canvas: str = "rgba") -> int:
+    """
+    Get how much memory one card at `resolution` takes up while it is being made on the canvas
+    called `canvas`.
+    """
+    pixel = 1 if images.get_canvas(canvas).mode == "L" else 4
+    return pixel * (2 * resolution) ** 2
+
+
+def _symbol(symbol: utils.LazySymbol) -> Image.Image:
+    """Decode a symbol in a worker process, or take it from the ones decoded already."""
+    key = (symbol.path, symbol.max_dimension)
+    image = _worker_symbols.get(key)
+    if image is None:
+        image = symbol.load()
+        _worker_symbols.put(key, image)
+    return image
+
+
+def _render_card(
+    task: tuple[list[utils.LazySymbol], int, int | str, int, str, str, str]
+) -> Image.Image:
+    """Render one card of any deck in a worker process."""
+    symbols, resolution, seed, index, engine, quality, canvas = task
+    return images.spot_it_card(
+        [_symbol(symbol) for symbol in symbols],
+        resolution,
+        engine=engine,
+        rng=utils.card_rng(seed, index),
+        quality=quality,
+        canvas=canvas,
+    )
+
+
+async def _make_deck(
+    job: DeckJob,
+    pool: concurrent.futures.Executor,
+    in_flight: asyncio.Semaphore,
+    progress: ProgressCallback | None,
+) -> DeckResult:
+    """Make the deck for `job`, with each card rendered in `pool` once `in_flight` allows."""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    result = DeckResult(job)
+
+    def emit(stage: str, done: int = 0, total: int = 0, message: str | None = None):
+        if progress is not None:
+            progress(ProgressEvent(job.label, stage, done, total, message))
+
+    try:
+        symbols = await asyncio.to_thread(
+            utils.get_images,
+            job.symbols,
+            images.largest_symbol(images.drawn_size(job.resolution, job.quality)),
+            lazy=True,
+        )
+        order = projective_plane.get_order(len(symbols))
+        lines = projective_plane.get_plane(order).lines.tolist()
+        seed = random.getrandbits(64) if job.seed is None else job.seed
+        backend = outputs.get_backend(job.backend)
+        job.output.mkdir(parents=True, exist_ok=True)
+        pdf = (
+            pdfs.ShardedPdfWriter(job.output, job.pdf_dpi, job.pages_per_pdf)
+            if job.pdf
+            else None
+        )
+        emit(STARTED, 0, len(lines))
+
+        async def render(index: int, line: list[int]) -> Image.Image:
+            work = (
+                [symbols[point] for point in line],
+                job.resolution,
+                seed,
+                index,
+                job.engine,
+                job.quality,
+                job.canvas,
+            )
+            await in_flight.acquire()
+            try:
+                return await loop.run_in_executor(pool, _render_card, work)
+            except BaseException:
+                in_flight.release()
+                raise
+
+        def release():
+            loop.call_soon_threadsafe(in_flight.release)
+
+        # Cards are rendered in any order, but written in order so the PDF is in order. A card
+        # holds its place in `in_flight` until it has been written and put on the PDF.
+        pending: list[asyncio.Task[Image.Image] | None] = [
+            asyncio.create_task(render(index, line)) for index, line in enumerate(lines)
+        ]
+        try:
+            for index, task in enumerate(pending):
+                card = await task
+                # Done tasks keep their results, so only the card is kept from here on.
+                pending[index] = None
+                result.cards += 1
+                handed_over = False
+                try:
+                    stem = job.output / str(index + 1)
+                    await asyncio.to_thread(backend.write, card, stem)
+                    if pdf is not None:
+                        await asyncio.to_thread(pdf.add, card, release)
+                        handed_over = True
+                finally:
+                    if not handed_over:
+                        in_flight.release()
+                del card
+                emit(CARD, index + 1, len(lines))
+        finally:
+            for task in pending[result.cards :]:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    in_flight.release()
+                task.cancel()
+        emit(REPORT, message=backend.report())
+        if pdf is not None:
+            await asyncio.to_thread(pdf.save)
+            emit(REPORT, message=pdf.report())
+        emit(FINISHED, len(lines), len(lines))
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        result.error = error
+        emit(FAILED, result.cards, message=str(error))
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+async def make_decks(
+    jobs: Iterable[DeckJob],
+    workers: int | None = None,
+    max_in_flight: int | None = None,
+    memory_limit: int | None = None,
+    max_decks: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> list[DeckResult]:
+    """
+    Make the deck for every job, sharing one pool of `workers` processes (one per CPU by
+    default), so that the pool is kept busy across decks. A deck that fails doesn't stop the
+    others; its result has the error.
+
+    At most `max_in_flight` cards (twice the number of workers by default) are being made or
+    waiting to be written or put on a PDF at once, across every deck. If `memory_limit` is given, fewer are
+    allowed so that those cards fit in that many bytes. At most `max_decks` decks are worked on
+    at once (all of them by default). `progress` gets a `ProgressEvent` for everything that
+    happens, instead of progress bars being shown.
+    """
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+    limit = max_in_flight or 2 * workers
+    if memory_limit is not None and jobs:
+        largest = max(
+            card_bytes(images.drawn_size(job.resolution, job.quality), job.canvas)
+            for job in jobs
+        )
+        limit = max(1, min(limit, memory_limit // largest))
+    in_flight = asyncio.Semaphore(limit)
+    decks = asyncio.Semaphore(max_decks or max(len(jobs), 1))
+
+    async def make_one(job: DeckJob) -> DeckResult:
+        async with decks:
+            return await _make_deck(job, pool, in_flight, progress)
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return list(await asyncio.gather(*map(make_one, jobs)))
+
+
+async def deck_events(
+    jobs: Iterable[DeckJob], **options
+) -> AsyncIterator[ProgressEvent]:
+    """
+    Make the deck for every job like `make_decks` with `options`, yielding progress events as
+    they happen.
+    """
+    queue: asyncio.Queue[ProgressEvent | None] = asyncio.Queue()
+
+    async def run():
+        try:
+            await make_decks(jobs, progress=queue.put_nowait, **options)
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while (event := await queue.get()) is not None:
+            yield event
+        await task
+    finally:
+        task.cancel()
+
+
+def run_batch(
+    jobs: Iterable[DeckJob],
+    workers: int | None = None,
+    max_in_flight: int | None = None,
+    memory_limit: int | None = None,
+    max_decks: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> list[DeckResult]:
+    """Make the deck for every job, like `make_decks`, from code that isn't async."""
+    return asyncio.run(
+        make_decks(jobs, workers, max_in_flight, memory_limit, max_decks, progress)
+    )
@@ -0,0 +1,99 @@
+"""Arithmetic in finite fields, for building projective planes of prime power orders."""
+
+import numpy as np
+
+
+class FiniteFieldError(ValueError):
+    """Exception raised when a finite field can't be made"""
+
+
+def prime_power(number: int) -> tuple[int, int]:
+    """
+    Split `number` into a prime and an exponent. If `number` isn't a power of a prime, a
+    `FiniteFieldError` is raised.
+    """
+    if number < 2:
+        raise FiniteFieldError(f"{number} is not a power of a prime.")
+    prime = next(
+        divisor for divisor in range(2, number + 1) if number % divisor == 0
+    )
+    exponent = 0
+    remaining = number
+    while remaining % prime == 0:
+        remaining //= prime
+        exponent += 1
+    if remaining != 1:
+        raise FiniteFieldError(f"{number} is not a power of a prime.")
+    return prime, exponent
+
+
+class FiniteField:
+    """
+    The finite field with `order` elements, GF(p^k).
+
+    Elements are the integers 0 to order - 1. The base p digits of an element are the coefficients
+    of a polynomial over GF(p), which is reduced by a primitive polynomial of degree k. For a
+    prime order, this is just arithmetic modulo the prime. Addition, negation, multiplication and
+    inverses are looked up in tables, so they are all O(1).
+    """
+
+    order: int
+    characteristic: int
+    degree: int
+    add: np.ndarray
+    neg: np.ndarray
+    mul: np.ndarray
+    inv: np.ndarray
+
+    def __init__(self, order: int) -> None:
+        self.order = order
+        self.characteristic, self.degree = prime_power(order)
+        prime = self.characteristic
+        digits = (
+            np.arange(order)[:, None] // prime ** np.arange(self.degree)[None, :]
+        ) % prime
+        powers = prime ** np.arange(self.degree)
+        self.add = (
+            (digits[:, None, :] + digits[None, :, :]) % prime
+        ) @ powers
+        self.neg = ((-digits) % prime) @ powers
+        exp = self._powers_of_x()
+        log = np.empty(order, dtype=int)
+        log[exp] = np.arange(order - 1)
+        self.mul = np.zeros((order, order), dtype=int)
+        self.mul[1:, 1:] = exp[(log[1:, None] + log[None, 1:]) % (order - 1)]
+        self.inv = np.zeros(order, dtype=int)
+        self.inv[1:] = exp[(-log[1:]) % (order - 1)]
+
+    def _powers_of_x(self) -> np.ndarray:
+        """
+        Find a primitive polynomial, and get the powers x^0 to x^(order - 2) modulo it. Since x
+        generates every nonzero element, these powers are all of the nonzero elements.
+        """
+        prime, degree = self.characteristic, self.degree
+        for candidate in range(self.order):
+            # The lower coefficients of x^degree, which is -(the rest of the polynomial).
+            reduction = [-(candidate // prime**place) % prime for place in range(degree)]
+            powers = [1]
+            for _ in range(self.order - 1):
+                coefficients = [
+                    powers[-1] // prime**place % prime for place in range(degree)
+                ]
+                top = coefficients.pop()
+                shifted = [0, *coefficients]
+                powers.append(
+                    sum(
+                        (shifted[place] + top * reduction[place]) % prime * prime**place
+                        for place in range(degree)
+                    )
+                )
+                if powers[-1] in (0, 1):
+                    break
+            # x is a generator if x^(order - 1) is the first power to get back to 1.
+            if len(powers) == self.order and powers[-1] == 1:
+                return np.array(powers[:-1])
+        raise FiniteFieldError(f"No primitive polynomial for GF({self.order}).")
+
+    def sub(self, first: int, second: int) -> int:
+        """Subtract two elements of the field."""
+        return int(self.add[first, self.neg[second]])
@@ -1,13 +1,23 @@
 """Image manipulation for Spot-It!"""
 
+import functools
 import math
+import random
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 # import random
 
 from PIL import Image, ImageDraw
 
-from .randomization import RandomizeImageInfo
-from .utils import to_complex, to_int_tuple  # PlacedImage, get_random_pos,
+from . import profiling
+from .placement import layout_card
+from .randomization import MAX_RADIUS, RandomizeImageInfo
+from .utils import Symbol, as_image, to_complex, to_int_tuple  # PlacedImage, get_random_pos,
+
+if TYPE_CHECKING:
+    from .layouts import LayoutLibrary
+    from .symbol_cache import SymbolCache
 
 BACKGROUND = (255, 255, 255, 0)
 CIRCLE_OUTLINE = (0, 0, 0, 255)
@@ -15,29 +25,128 @@ CIRCLE_OUTLINE = (0, 0, 0, 255)
 # CROP_PERCISION = 10
 
 
-def get_circle(size: int) -> Image.Image:
-    """Get a circle in black for the max dimension given."""
-    image = Image.new("RGBA", (2 * size,) * 2, BACKGROUND)
+@dataclass(frozen=True)
+class Quality:
+    """
+    How symbols are resampled when they are resized and rotated, and the fraction of the
+    resolution cards are drawn at. Layouts are always found at the full resolution, so a card
+    drawn smaller has the same layout as the full card.
+    """
+
+    resize: int
+    rotate: int
+    scale: float = 1
+
+
+QUALITIES: dict[str, Quality] = {
+    # Quick to look through a whole deck, at a quarter of the resolution.
+    "preview": Quality(Image.BILINEAR, Image.NEAREST, 1 / 4),
+    # Pillow's defaults, which decks were always made with before there were presets.
+    "default": Quality(Image.BICUBIC, Image.NEAREST),
+    # Slower, with smoother edges, for printing.
+    "print": Quality(Image.LANCZOS, Image.BICUBIC),
+}
+
+
+@dataclass(frozen=True)
+class Canvas:
+    """The mode of the image cards are drawn on, and the colours of its background and circle."""
+
+    mode: str
+    background: int | tuple[int, ...]
+    outline: int | tuple[int, ...]
+
+
+CANVASES: dict[str, Canvas] = {
+    # A transparent background, which cards were always drawn on before there were canvases.
+    "rgba": Canvas("RGBA", BACKGROUND, CIRCLE_OUTLINE),
+    # Flattened onto white as the card is drawn. Pillow keeps RGB in four bytes a pixel too,
+    # but nothing needs to be flattened again to write JPEGs or PDFs, and PNGs are smaller.
+    "rgb": Canvas("RGB", (255, 255, 255), (0, 0, 0)),
+    # One byte a pixel, a quarter of the memory, for symbols in black, white and greys. Colours
+    # are turned into greys.
+    "gray": Canvas("L", 255, 0),
+}
+
+
+def get_quality(name: str) -> Quality:
+    """Get the quality preset called `name`."""
+    try:
+        return QUALITIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown quality {name!r}. Choose from {', '.join(QUALITIES)}."
+        ) from None
+
+
+def get_canvas(name: str) -> Canvas:
+    """Get the canvas called `name`."""
+    try:
+        return CANVASES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown canvas {name!r}. Choose from {', '.join(CANVASES)}."
+        ) from None
+
+
+def pixel_bytes(image: Image.Image) -> int:
+    """Get how many bytes Pillow keeps the pixels of `image` in: one a pixel or four."""
+    return image.width * image.height * (1 if image.mode in ("1", "L", "P") else 4)
+
+
+def drawn_size(size: int, quality: str = "default") -> int:
+    """Get the resolution a card laid out at `size` is drawn at with the preset `quality`."""
+    return max(round(size * get_quality(quality).scale), 1)
+
+
+def largest_symbol(size: int) -> int:
+    """Get the largest a symbol can be drawn on a card of `size`, in pixels across its diagonal."""
+    return math.ceil(2 * MAX_RADIUS * size)
+
+
+def get_circle(size: int, canvas: str = "rgba") -> Image.Image:
+    """Get a circle in black for the max dimension given, on the canvas called `canvas`."""
+    return _circle(size, canvas).copy()
+
+
+@functools.lru_cache(maxsize=4)
+def _circle(size: int, canvas: str) -> Image.Image:
+    """Draw the circle for `get_circle` once for each size, since every card starts from it."""
+    kind = get_canvas(canvas)
+    image = Image.new(kind.mode, (2 * size,) * 2, kind.background)
     draw = ImageDraw.Draw(image)
 
     draw.ellipse(
         [(0, 0), (2 * size,) * 2],
-        BACKGROUND,
-        CIRCLE_OUTLINE,
+        kind.background,
+        kind.outline,
         math.ceil(size / 100),
     )
     return image
 
 
-def make_image_random(image: Image.Image, info: RandomizeImageInfo) -> Image.Image:
-    """Randomize the scale and rotation of the image, to use as a spot-it symbol."""
+def make_image_random(
+    image: Symbol,
+    info: RandomizeImageInfo,
+    cache: "SymbolCache | None" = None,
+    quality: str = "default",
+) -> Image.Image:
+    """
+    Randomize the scale and rotation of the image, to use as a spot-it symbol, resampling it as
+    the preset `quality` says. If a `cache` is given, the transformed image is taken from it.
+    """
+    if cache is not None:
+        return cache.get(image, info, quality)
+    resample = get_quality(quality)
+    image = as_image(image)
     dimensions = to_complex(image.size)
     # Multiply the radius by two so we don't have to divide the dimensions by 2
     scale = info.radius * 2 / math.hypot(dimensions.real, dimensions.imag)
 
-    resized = image.resize(to_int_tuple(dimensions * scale))
-    rotated = resized.rotate(info.rotation, expand=True, fillcolor=BACKGROUND)
-    return rotated
+    resized = image.resize(to_int_tuple(dimensions * scale), resample.resize)
+    return resized.rotate(
+        info.rotation, resample.rotate, expand=True, fillcolor=BACKGROUND
+    )
 
 
 def crop_to_minimum(image: Image.Image) -> Image.Image:
@@ -45,40 +154,114 @@ def crop_to_minimum(image: Image.Image) -> Image.Image:
     return image.crop(image.getbbox())
 
 
-def spot_it_card(images: list[Image.Image], size: int) -> Image.Image:
-    """Generate a Spot It! card from a list of images."""
-    card = get_circle(size)
-    placed_images: list[tuple[Image.Image, RandomizeImageInfo]] = []
-    while len(placed_images) != len(images):
-        placed_images = []
-        for image in images:
-            placed_info = list(map(lambda item: item[1], placed_images))
-            random_info = RandomizeImageInfo(size, placed_info)
-            counter = 0
-            while not random_info.exists or not all(
-                map(random_info.dont_overlap, placed_info)
-            ):
-                # If we've done this ten times, it must be a difficult card. Start over.
-                if counter >= 10:
-                    break
-                random_info = RandomizeImageInfo(size, placed_info)
-                counter += 1
-            else:
-                placed_images.append((image, random_info))
-                continue
-            break
-    # Wait to preform image manipulation until the end to increase performance.
-    for image, info in placed_images:
-        randomized = make_image_random(image, info)
+def blend(card: Image.Image, image: Image.Image, location: tuple[int, int]) -> int:
+    """
+    Draw `image` over `card` with its top left corner at `location`. Only the part of `image`
+    that isn't transparent, and is on the card, is blended in. Cards that aren't RGBA have it
+    pasted with its alpha as the mask, which is the same as flattening afterwards. Returns how
+    many bytes of images were made to blend it.
+    """
+    # Pillow only looks at the alpha channel of RGBA images for the box.
+    box = image.getbbox()
+    if box is None:
+        return 0
+    left, top, right, bottom = box
+    # Clip to the card, in case rounding put an edge of the symbol just off it.
+    left = max(left, -location[0])
+    top = max(top, -location[1])
+    right = min(right, card.width - location[0])
+    bottom = min(bottom, card.height - location[1])
+    if left >= right or top >= bottom:
+        return 0
+    destination = (location[0] + left, location[1] + top)
+    if card.mode == "RGBA":
+        card.alpha_composite(image, destination, (left, top, right, bottom))
+        return 0
+    region = image.crop((left, top, right, bottom))
+    # Pillow converts the region to the card's mode while pasting.
+    converted = 0 if card.mode == "RGB" else region.width * region.height
+    card.paste(region, destination, region)
+    return pixel_bytes(region) + converted
+
+
+def composite_card(
+    images: list[Symbol],
+    placements: list[RandomizeImageInfo],
+    size: int,
+    cache: "SymbolCache | None" = None,
+    quality: str = "default",
+    canvas: str = "rgba",
+) -> Image.Image:
+    """
+    Draw each image on a card where its placement says, resampled as the preset `quality` says,
+    on the canvas called `canvas` (see `CANVASES`). Each transformed symbol is mostly transparent
+    padding from being rotated, so only the box around its opaque pixels is blended.
+
+    The most bytes of pixels alive at once while drawing the card are recorded as the
+    "card_bytes" peak. Each symbol is let go of as soon as it is blended.
+    """
+    card = get_circle(size, canvas)
+    working = 0
+    for image, info in zip(images, placements):
+        with profiling.stage("transform"):
+            randomized = make_image_random(image, info, cache, quality)
         location = to_int_tuple(
             info.center.real
             - info.center.imag * 1j
             + (1 + 1j) * size
             - to_complex(randomized.size) / 2
         )
-        card.paste(
-            randomized,
-            location,
-            randomized,
-        )
+        with profiling.stage("paste"):
+            made = blend(card, randomized, location)
+        # The resized symbol is never larger than the rotated one, and is let go of before
+        # blending, so while it is alive there are at most twice the rotated symbol's bytes.
+        symbol = pixel_bytes(randomized)
+        working = max(working, symbol + max(symbol, made))
+        del randomized
+    profiling.peak("card_bytes", pixel_bytes(card) + working)
     return card
+
+
+def card_placements(
+    count: int,
+    size: int,
+    engine: str = "rejection",
+    rng: random.Random | None = None,
+    layouts: "LayoutLibrary | None" = None,
+) -> list[RandomizeImageInfo]:
+    """
+    Lay out `count` symbols on a card of `size` the way `spot_it_card` does with the same
+    arguments, without drawing anything.
+    """
+    with profiling.stage("layout"):
+        if layouts is not None:
+            return layouts.placements(count, size, rng)
+        return layout_card(count, size, engine, rng)
+
+
+def spot_it_card(
+    images: list[Symbol],
+    size: int,
+    cache: "SymbolCache | None" = None,
+    engine: str = "rejection",
+    rng: random.Random | None = None,
+    layouts: "LayoutLibrary | None" = None,
+    quality: str = "default",
+    canvas: str = "rgba",
+) -> Image.Image:
+    """
+    Generate a Spot It! card from a list of images, drawn on the canvas called `canvas`: see
+    `CANVASES`.
+    `engine` is the name of the layout engine to use: see `placement.LAYOUT_ENGINES`. The layout
+    is drawn from `rng`, or the global random number generator if it is None. If a library of
+    `layouts` is given, the layout is picked from it instead.
+
+    Symbols are drawn with the preset `quality`: see `QUALITIES`. The layout is always found for a
+    card of `size`, so a preview drawn smaller has the same layout as the full card.
+    """
+    # Wait to preform image manipulation until the end to increase performance.
+    placements = card_placements(len(images), size, engine, rng, layouts)
+    drawn = drawn_size(size, quality)
+    if drawn != size:
+        placements = [info.scaled(drawn) for info in placements]
+    return composite_card(images, placements, drawn, cache, quality, canvas)
@@ -0,0 +1,165 @@
+"""A library of layouts made ahead of time, so decks don't need to search for layouts."""
+
+import cmath
+import concurrent.futures
+import hashlib
+import math
+import pathlib
+import random
+
+import numpy as np
+
+from .placement import layout_card
+from .randomization import RandomizeImageInfo
+from .utils import card_rng, rng_or_global
+
+
+class LayoutLibrary:
+    """
+    Layouts for cards with `count` symbols: the center, radius and rotation of each slot. Centers
+    and radii are stored as fractions of the size of the card, so a library works at any
+    resolution. `size` is the resolution the layouts were searched at.
+    """
+
+    count: int
+    size: int
+    centers: np.ndarray
+    radii: np.ndarray
+    rotations: np.ndarray
+
+    def __init__(
+        self,
+        size: int,
+        centers: np.ndarray,
+        radii: np.ndarray,
+        rotations: np.ndarray,
+    ) -> None:
+        self.size = size
+        self.centers = np.asarray(centers, dtype=np.complex128)
+        self.radii = np.asarray(radii, dtype=np.float64)
+        self.rotations = np.asarray(rotations, dtype=np.int16)
+        self.count = self.centers.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.centers)
+
+    @classmethod
+    def from_slots(
+        cls, size: int, layouts: list[list[tuple[complex, float, int]]]
+    ) -> "LayoutLibrary":
+        """
+        Make a library from layouts found on cards of `size`, with the center, radius and
+        rotation of each slot in pixels and degrees.
+        """
+        slots = np.array(layouts, dtype=np.complex128).reshape(len(layouts), -1, 3)
+        return cls(
+            size,
+            slots[:, :, 0] / size,
+            slots[:, :, 1].real / size,
+            slots[:, :, 2].real.round(),
+        )
+
+    def save(self, path: pathlib.Path):
+        """Save the library to `path`, as a compressed NumPy archive."""
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file,
+                size=self.size,
+                centers=self.centers,
+                radii=self.radii,
+                rotations=self.rotations,
+            )
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "LayoutLibrary":
+        """Load a library saved with `save`."""
+        with np.load(path) as data:
+            return cls(
+                int(data["size"]), data["centers"], data["radii"], data["rotations"]
+            )
+
+    def digest(self) -> str:
+        """Get a hash of the layouts, for keys of caches of cards made with them."""
+        digest = hashlib.sha256()
+        for array in (self.centers, self.radii, self.rotations):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def placements(
+        self, count: int, size: int, rng: random.Random | None = None
+    ) -> list[RandomizeImageInfo]:
+        """
+        Get the placements of `count` symbols on a card of `size` from a layout picked with `rng`
+        (or the global random number generator if it is None). The layout is turned by a random
+        angle (with the symbols in it) and its slots are shuffled, so cards that use the same
+        layout still look different.
+        """
+        if count != self.count:
+            raise ValueError(
+                f"This layout library is for cards with {self.count} symbols, not {count}."
+            )
+        rng = rng_or_global(rng)
+        index = rng.randrange(len(self))
+        angle = rng.random() * 2 * math.pi
+        turn = cmath.rect(1, angle)
+        slots = list(range(self.count))
+        rng.shuffle(slots)
+        return [
+            RandomizeImageInfo.placed(
+                size,
+                (int(self.rotations[index, slot]) + round(math.degrees(angle))) % 360,
+                float(self.radii[index, slot]) * size,
+                complex(self.centers[index, slot]) * turn * size,
+            )
+            for slot in slots
+        ]
+
+
+def _search(job: tuple[int, int, str, int | str, int]) -> list[tuple[complex, float, int]]:
+    count, size, engine, seed, index = job
+    return [
+        (info.center, info.radius, info.rotation)
+        for info in layout_card(count, size, engine, card_rng(seed, index))
+    ]
+
+
+def load_or_build(
+    path: pathlib.Path, count: int, size: int, workers: int | None = None
+) -> LayoutLibrary:
+    """
+    Load the library saved at `path`, or if there isn't one, build one for `count` symbols on
+    cards of `size` and save it there.
+    """
+    if path.is_file():
+        library = LayoutLibrary.load(path)
+        if library.count != count:
+            raise ValueError(
+                f"The layout library at {path} is for cards with {library.count} symbols, "
+                f"not {count}."
+            )
+        return library
+    library = build_library(count, size, workers=workers)
+    library.save(path)
+    return library
+
+
+def build_library(
+    count: int,
+    size: int,
+    layouts: int = 256,
+    engine: str = "packed",
+    seed: int | str = 0,
+    workers: int | None = None,
+) -> LayoutLibrary:
+    """
+    Search for `layouts` layouts of `count` symbols on cards of `size` with the layout engine
+    `engine`, in `workers` processes if it is more than 1. The same `seed` always gives the same
+    library.
+    """
+    jobs = [(count, size, engine, seed, index) for index in range(layouts)]
+    if workers is None or workers <= 1:
+        found = list(map(_search, jobs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            found = list(executor.map(_search, jobs, chunksize=16))
+    return LayoutLibrary.from_slots(size, found)
@@ -0,0 +1,190 @@
+"""Ways to write cards to files."""
+
+import abc
+import pathlib
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+
+from PIL import Image, features
+
+from . import profiling
+
+# The key in `Image.info` for how hard the PNG file an image was read from is compressed, when
+# that is known, so that `PNGBackend` can copy the file instead of encoding it again.
+COMPRESS_LEVEL = "spot_it_compress_level"
+# How hard `PNGBackend` compresses PNGs by default.
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+@dataclass
+class EncodeStats:
+    """How long encoding took and how big the output was."""
+
+    cards: int = 0
+    seconds: float = 0
+    bytes: int = 0
+
+    def add(self, seconds: float, size: int):
+        """Count one more card."""
+        self.cards += 1
+        self.seconds += seconds
+        self.bytes += size
+
+    def __str__(self) -> str:
+        if not self.cards:
+            return "nothing written"
+        return (
+            f"{self.cards} cards in {self.seconds:.2f}s of encoding, "
+            f"{self.bytes / 2**20:.1f} MiB ({self.bytes / self.cards / 2**10:.0f} KiB each)"
+        )
+
+
+def flatten(image: Image.Image, background: tuple[int, int, int]) -> Image.Image:
+    """Put an image with transparency on a solid background."""
+    if image.mode in ("RGB", "L"):
+        # Cards drawn on these canvases are flat already.
+        return image
+    if image.mode != "RGBA":
+        return image.convert("RGB")
+    flat = Image.new("RGB", image.size, background)
+    flat.paste(image, mask=image.getchannel("A"))
+    return flat
+
+
+class OutputBackend(abc.ABC):
+    """
+    Writes each card to a file with the suffix `suffix`, and keeps track of the time spent
+    encoding and the size of the files. Backends are safe to use from many threads.
+    """
+
+    name = "none"
+    suffix: str | None = None
+    # The Pillow feature needed to write these files, if any: see `PIL.features`.
+    feature: str | None = None
+
+    def __init__(self) -> None:
+        self.stats = EncodeStats()
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def encode(self, image: Image.Image, path: pathlib.Path):
+        """Write `image` to `path`."""
+
+    def write(self, image: Image.Image, stem: pathlib.Path) -> pathlib.Path | None:
+        """Write `image` to `stem` with this backend's suffix, returning the path written."""
+        if self.suffix is None:
+            return None
+        path = stem.with_suffix(self.suffix)
+        start = time.perf_counter()
+        with profiling.stage("encode"):
+            self.encode(image, path)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.stats.add(seconds, path.stat().st_size)
+        return path
+
+    def report(self) -> str:
+        """Describe how the encoding went."""
+        return f"{self.name}: {self.stats}"
+
+
+class PdfOnlyBackend(OutputBackend):
+    """Don't write any image files; the cards only go on the PDF."""
+
+    name = "pdf-only"
+
+    def encode(self, image: Image.Image, path: pathlib.Path):
+        # `write` never gets here, since there is no suffix.
+        raise TypeError("The pdf-only backend doesn't write files.")
+
+
+class PNGBackend(OutputBackend):
+    """
+    Write PNGs. `compress_level` goes from 0 (fastest, biggest) to 9 (slowest, smallest).
+    Cards that were loaded from a PNG compressed at the same level (like cards from a
+    `RenderCache`, at the default level) are copied instead of encoded again.
+    """
+
+    name = "png"
+    suffix = ".png"
+
+    def __init__(self, compress_level: int = DEFAULT_COMPRESS_LEVEL) -> None:
+        super().__init__()
+        self.compress_level = compress_level
+
+    def encode(self, image: Image.Image, path: pathlib.Path):
+        if (
+            image.format == "PNG"
+            and image.filename
+            and image.info.get(COMPRESS_LEVEL) == self.compress_level
+        ):
+            shutil.copyfile(image.filename, path)
+            return
+        image.save(path, format="PNG", compress_level=self.compress_level)
+
+
+class WebPBackend(OutputBackend):
+    """
+    Write WebP images, lossless by default. `method` goes from 0 (fastest) to 6 (smallest), and
+    `quality` is the quality for lossy images or the effort for lossless ones.
+    """
+
+    name = "webp"
+    suffix = ".webp"
+    feature = "webp"
+
+    def __init__(self, lossless: bool = True, quality: int = 80, method: int = 4) -> None:
+        super().__init__()
+        self.lossless = lossless
+        self.quality = quality
+        self.method = method
+
+    def encode(self, image: Image.Image, path: pathlib.Path):
+        image.save(
+            path,
+            format="WEBP",
+            lossless=self.lossless,
+            quality=self.quality,
+            method=self.method,
+        )
+
+
+class JPEGBackend(OutputBackend):
+    """Write JPEGs, with the transparent parts of cards filled with `background`."""
+
+    name = "jpeg"
+    suffix = ".jpg"
+
+    def __init__(
+        self, quality: int = 90, background: tuple[int, int, int] = (255, 255, 255)
+    ) -> None:
+        super().__init__()
+        self.quality = quality
+        self.background = background
+
+    def encode(self, image: Image.Image, path: pathlib.Path):
+        flatten(image, self.background).save(path, format="JPEG", quality=self.quality)
+
+
+BACKENDS: dict[str, type[OutputBackend]] = {
+    backend.name: backend
+    for backend in (PNGBackend, WebPBackend, JPEGBackend, PdfOnlyBackend)
+}
+
+
+def get_backend(name: str, **options) -> OutputBackend:
+    """Make the backend called `name` with `options`."""
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown output format {name!r}. Choose from {', '.join(BACKENDS)}."
+        ) from None
+    if backend.feature is not None and not features.check(backend.feature):
+        raise ValueError(
+            f"The {name} output format isn't available: Pillow was built without "
+            f"{backend.feature} support."
+        )
+    return backend(**options)
@@ -1,5 +1,12 @@
+import concurrent.futures
+import math
+import threading
+import time
+import zlib
 from pathlib import Path
+from typing import Callable, Iterable
 
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
 from reportlab.pdfgen.canvas import Canvas
 from reportlab.lib.units import inch
 from reportlab.lib.pagesizes import LETTER
@@ -7,6 +14,11 @@ from reportlab.lib.utils import ImageReader
 from PIL import Image
 from tqdm import tqdm
 
+from . import profiling
+from .outputs import EncodeStats
+from .randomization import MAX_RADIUS, RandomizeImageInfo
+from .utils import Symbol, as_image
+
 CARD_WIDTH = 3.5 * inch
 CARDS_ON_PAGE_HORIZ = 2
 CARDS_ON_PAGE_VERT = 3
@@ -14,21 +26,304 @@ HORIZ_SPACING = (LETTER[0] - CARDS_ON_PAGE_HORIZ * CARD_WIDTH) / (
     CARDS_ON_PAGE_HORIZ + 1
 )
 VERT_SPACING = (LETTER[1] - CARDS_ON_PAGE_VERT * CARD_WIDTH) / (CARDS_ON_PAGE_VERT + 1)
+CARDS_ON_PAGE = CARDS_ON_PAGE_HORIZ * CARDS_ON_PAGE_VERT
+# The PDF colour space for the pixels `ImageReader` gives for each mode.
+COLOR_SPACES = {"RGB": "DeviceRGB", "L": "DeviceGray", "CMYK": "DeviceCMYK"}
 
 
-def put_on_pdf(cards: list[Image.Image], output_path: Path):
-    pdf = Canvas(str(output_path.absolute()), pagesize=LETTER)
-    imgs_on_cur_page = 0
-    for image in tqdm(cards, desc="PDFing cards"):
-        if imgs_on_cur_page == CARDS_ON_PAGE_HORIZ * CARDS_ON_PAGE_VERT:
-            pdf.showPage()
-            imgs_on_cur_page = 0
-        x = HORIZ_SPACING + (CARD_WIDTH + HORIZ_SPACING) * (
-            imgs_on_cur_page % CARDS_ON_PAGE_HORIZ
-        )
-        y = LETTER[1] - (CARD_WIDTH + VERT_SPACING) * (
-            1 + imgs_on_cur_page // CARDS_ON_PAGE_HORIZ
+def prepare_card(image: Image.Image, dpi: int | None) -> Image.Image:
+    """
+    Shrink a card to the number of pixels it will be printed at with `dpi` dots per inch. If
+    `dpi` is None, or the card is already small enough, it is left alone.
+    """
+    if dpi is None:
+        return image
+    pixels = round(CARD_WIDTH / inch * dpi)
+    if max(image.size) <= pixels:
+        return image
+    with profiling.stage("pdf_prepare"):
+        return image.resize((pixels, pixels), Image.LANCZOS)
+
+
+def encode_card(image: Image.Image, dpi: int | None = None) -> PDFImageXObject:
+    """
+    Shrink a card for `dpi` dots per inch (see `prepare_card`) and compress it as an image for a
+    PDF, which is the slow part of putting it on one. It can be done in any thread, and the card
+    is placed with `PdfWriter.add_encoded`. Its pixels are flate compressed the way reportlab does
+    it, without also encoding them as ASCII85, which is slow and makes the PDF bigger.
+    """
+    reader = ImageReader(prepare_card(image, dpi))
+    pixels = reader.getRGBData()  # Drops any alpha, as `Canvas.drawImage` does without a mask
+    encoded = PDFImageXObject("card")
+    encoded.width, encoded.height = reader.getSize()
+    encoded.bitsPerComponent = 8
+    encoded.colorSpace = COLOR_SPACES[reader.mode]
+    encoded.streamContent = zlib.compress(pixels)
+    encoded._filters = ("FlateDecode",)  # pylint: disable=protected-access
+    return encoded
+
+
+def card_position(index: int) -> tuple[float, float]:
+    """Get the lower left corner of the card at `index` on its page."""
+    x = HORIZ_SPACING + (CARD_WIDTH + HORIZ_SPACING) * (index % CARDS_ON_PAGE_HORIZ)
+    y = LETTER[1] - (CARD_WIDTH + VERT_SPACING) * (1 + index // CARDS_ON_PAGE_HORIZ)
+    return x, y
+
+
+class PdfWriter:
+    """Place cards on the pages of a PDF one at a time, so they don't all need to be kept around."""
+
+    def __init__(self, output_path: Path) -> None:
+        self.output_path = output_path
+        self.pdf = Canvas(str(output_path.absolute()), pagesize=LETTER)
+        self.imgs_on_cur_page = 0
+        self.stats = EncodeStats()
+
+    def add(self, image: Image.Image):
+        """Add a card to the next spot on the PDF. The image is encoded right away."""
+        start = time.perf_counter()
+        encoded = encode_card(image)
+        self.add_encoded(encoded, time.perf_counter() - start)
+
+    def add_encoded(self, encoded: PDFImageXObject, seconds: float = 0):
+        """
+        Add a card made with `encode_card` to the next spot on the PDF, which took `seconds` to
+        encode.
+        """
+        start = time.perf_counter()
+        if self.imgs_on_cur_page == CARDS_ON_PAGE:
+            self.pdf.showPage()
+            self.imgs_on_cur_page = 0
+        x, y = card_position(self.imgs_on_cur_page)
+        # Register the image as `Canvas.drawImage` does, which would encode it again.
+        encoded.name = f"card{self.stats.cards}"
+        document = self.pdf._doc  # pylint: disable=protected-access
+        document.Reference(encoded, document.getXObjectName(encoded.name))
+        document.addForm(encoded.name, encoded)
+        self.pdf._currentPageHasImages = 1  # pylint: disable=protected-access
+        self.pdf.saveState()
+        self.pdf.translate(x, y)
+        self.pdf.scale(CARD_WIDTH, CARD_WIDTH)
+        self.pdf.doForm(encoded.name)
+        self.pdf.restoreState()
+        self.imgs_on_cur_page += 1
+        seconds += time.perf_counter() - start
+        self.stats.add(seconds, 0)
+        recorder = profiling.active()
+        if recorder is not None:
+            recorder.add_time("pdf", seconds)
+
+    def save(self):
+        """Write the PDF to disk."""
+        start = time.perf_counter()
+        self.pdf.save()
+        self.stats.seconds += time.perf_counter() - start
+        self.stats.bytes = self.output_path.stat().st_size
+
+    def report(self) -> str:
+        """Describe how encoding the PDF went."""
+        return f"pdf: {self.stats}"
+
+
+class VectorPdfWriter(PdfWriter):
+    """
+    Draw cards on a PDF from their layouts, instead of from rendered cards. Each symbol is
+    embedded once, as a form XObject wrapping its image, and every card places its symbols by
+    moving, turning and scaling that form, with the circle drawn as a path. The PDF's size grows
+    with the number of symbols instead of the number of cards.
+
+    If `dpi` is given, symbols are shrunk to the most pixels they can be printed at with that many
+    dots per inch before they are embedded.
+    """
+
+    def __init__(self, output_path: Path, dpi: int | None = None) -> None:
+        super().__init__(output_path)
+        self.dpi = dpi
+        # The name and size of the form for each symbol, by id. The symbol is kept so the id
+        # isn't reused.
+        self._forms: dict[int, tuple[Symbol, str, tuple[int, int]]] = {}
+
+    def _form(self, symbol: Symbol) -> tuple[str, tuple[int, int]]:
+        """Get the name of the form for `symbol` and its size, embedding it the first time."""
+        if id(symbol) in self._forms:
+            _, name, size = self._forms[id(symbol)]
+            return name, size
+        image = as_image(symbol)
+        name = f"symbol{len(self._forms)}"
+        embedded = image
+        if self.dpi is not None:
+            # A symbol is at most 2 * MAX_RADIUS of the card's radius across its diagonal.
+            pixels = MAX_RADIUS * CARD_WIDTH / inch * self.dpi
+            scale = pixels / math.hypot(*image.size)
+            if scale < 1:
+                shrunk = (
+                    max(round(image.width * scale), 1),
+                    max(round(image.height * scale), 1),
+                )
+                with profiling.stage("pdf_prepare"):
+                    embedded = image.resize(shrunk, Image.LANCZOS)
+        # The form is the image in a unit square, which each placement scales to size.
+        self.pdf.beginForm(name, 0, 0, 1, 1)
+        self.pdf.drawImage(ImageReader(embedded), 0, 0, 1, 1, mask="auto")
+        self.pdf.endForm()
+        self._forms[id(symbol)] = (symbol, name, image.size)
+        return name, image.size
+
+    def add_layout(
+        self, symbols: list[Symbol], placements: list[RandomizeImageInfo], size: int
+    ):
+        """
+        Add a card to the next spot on the PDF, with `symbols` placed as `placements` say on a card
+        laid out at `size`, the same as `images.composite_card` draws it.
+        """
+        start = time.perf_counter()
+        if self.imgs_on_cur_page == CARDS_ON_PAGE:
+            self.pdf.showPage()
+            self.imgs_on_cur_page = 0
+        x, y = card_position(self.imgs_on_cur_page)
+        # The card is 2 * size pixels across.
+        scale = CARD_WIDTH / (2 * size)
+        line_width = math.ceil(size / 100) * scale
+        self.pdf.setLineWidth(line_width)
+        self.pdf.setStrokeColorRGB(0, 0, 0)
+        self.pdf.circle(
+            x + CARD_WIDTH / 2, y + CARD_WIDTH / 2, (CARD_WIDTH - line_width) / 2
         )
-        pdf.drawImage(ImageReader(image), x, y, width=CARD_WIDTH, height=CARD_WIDTH)
-        imgs_on_cur_page += 1
+        for symbol, info in zip(symbols, placements):
+            name, (width, height) = self._form(symbol)
+            # Scale the symbol so its diagonal is the diameter of its circle.
+            fit = info.radius * 2 / math.hypot(width, height) * scale
+            self.pdf.saveState()
+            self.pdf.translate(
+                x + (size + info.center.real) * scale,
+                y + (size + info.center.imag) * scale,
+            )
+            self.pdf.rotate(info.rotation)
+            self.pdf.translate(-width * fit / 2, -height * fit / 2)
+            self.pdf.scale(width * fit, height * fit)
+            self.pdf.doForm(name)
+            self.pdf.restoreState()
+        self.imgs_on_cur_page += 1
+        seconds = time.perf_counter() - start
+        self.stats.add(seconds, 0)
+        recorder = profiling.active()
+        if recorder is not None:
+            recorder.add_time("pdf", seconds)
+
+
+def put_on_pdf(cards: Iterable[Image.Image], output_path: Path) -> PdfWriter:
+    pdf = PdfWriter(output_path)
+    for image in tqdm(cards, desc="PDFing cards"):
+        pdf.add(image)
     pdf.save()
+    return pdf
+
+
+class ShardedPdfWriter:
+    """
+    Put cards on PDFs in the background while more cards are made.
+
+    Cards are shrunk to `dpi` and encoded by a pool of `workers` threads, so only placing them on
+    the page is done in order. If `pages_per_file` is given, the deck is split into PDFs of that
+    many pages (`cards-1-12.pdf`, `cards-13-24.pdf`, ...), which are each written by their own
+    thread at the same time. Otherwise, everything goes in
+    `cards.pdf`. At most `max_pending` cards wait to be put on a PDF; `add` blocks after that.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        dpi: int | None = None,
+        pages_per_file: int | None = None,
+        workers: int | None = None,
+        max_pending: int = 16,
+    ) -> None:
+        self.output_dir = output_dir
+        self.dpi = dpi
+        self.cards_per_file = (
+            None if pages_per_file is None else pages_per_file * CARDS_ON_PAGE
+        )
+        self.added = 0
+        self._prepare_pool = concurrent.futures.ThreadPoolExecutor(workers)
+        # One thread per file, since a Canvas can only be drawn on in order.
+        self._shards: list[tuple[PdfWriter, concurrent.futures.ThreadPoolExecutor]] = []
+        self._futures: list[concurrent.futures.Future[None]] = []
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def _shard(self, index: int) -> tuple[PdfWriter, concurrent.futures.ThreadPoolExecutor]:
+        """Get the writer and thread for the card at `index`, starting a new file if needed."""
+        if self.cards_per_file is None:
+            shard = 0
+            name = "cards.pdf"
+        else:
+            shard = index // self.cards_per_file
+            first = shard * self.cards_per_file + 1
+            name = f"cards-{first}-{first + self.cards_per_file - 1}.pdf"
+        if shard == len(self._shards):
+            self._shards.append(
+                (
+                    PdfWriter(self.output_dir / name),
+                    concurrent.futures.ThreadPoolExecutor(1),
+                )
+            )
+        return self._shards[shard]
+
+    def add(self, image: Image.Image, done: Callable[[], None] | None = None):
+        """
+        Add the next card. It is shrunk and put on its PDF in the background, and then `done` is
+        called from the thread that put it there, once the card isn't needed any more.
+        """
+        self._pending.acquire()  # pylint: disable=consider-using-with
+        encoded = self._prepare_pool.submit(self._encode, image)
+        writer, thread = self._shard(self.added)
+        future = thread.submit(lambda: writer.add_encoded(*encoded.result()))
+
+        def finished(_):
+            self._pending.release()
+            if done is not None:
+                done()
+
+        future.add_done_callback(finished)
+        self._futures.append(future)
+        self.added += 1
+
+    def _encode(self, image: Image.Image) -> tuple[PDFImageXObject, float]:
+        """Encode a card for its PDF, returning how long that took too."""
+        start = time.perf_counter()
+        encoded = encode_card(image, self.dpi)
+        return encoded, time.perf_counter() - start
+
+    def save(self) -> list[Path]:
+        """Finish every PDF, saving them at the same time, and return their paths."""
+        try:
+            for future in self._futures:
+                future.result()  # Raise any errors from adding cards
+            saves = [thread.submit(writer.save) for writer, thread in self._shards]
+            for save in saves:
+                save.result()
+        finally:
+            for _, thread in self._shards:
+                thread.shutdown()
+            self._prepare_pool.shutdown()
+        if self.cards_per_file is not None and self.added % self.cards_per_file:
+            # The last file isn't full, so name it after the cards it really has.
+            writer = self._shards[-1][0]
+            first = (len(self._shards) - 1) * self.cards_per_file + 1
+            writer.output_path = writer.output_path.replace(
+                self.output_dir / f"cards-{first}-{self.added}.pdf"
+            )
+        return [writer.output_path for writer, _ in self._shards]
+
+    @property
+    def stats(self) -> EncodeStats:
+        """The encoding stats for all of the PDFs together."""
+        total = EncodeStats()
+        for writer, _ in self._shards:
+            total.cards += writer.stats.cards
+            total.seconds += writer.stats.seconds
+            total.bytes += writer.stats.bytes
+        return total
+
+    def report(self) -> str:
+        """Describe how encoding the PDFs went."""
+        return f"pdf ({len(self._shards)} files): {self.stats}"
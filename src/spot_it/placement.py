@@ -0,0 +1,337 @@
+"""Layout engines that decide where the symbols go on a Spot-It! card."""
+
+import functools
+import math
+import random
+from typing import Callable
+
+import numpy as np
+
+from . import profiling
+from .randomization import MAX_RADIUS, MIN_RADIUS, RandomizeImageInfo
+from .utils import rng_or_global
+
+# How far from the center of the card a symbol can reach, as a fraction of the size of the card.
+BOUNDARY = 9 / 10
+# The space between two symbols, as a fraction of the size of the card.
+BUFFER = 1 / 10
+# How much smaller than usual symbols can be made when they don't fit.
+SHRINK_LIMIT = 85 / 100
+# How much of the card the symbols (with half of the buffer around them) can be expected to cover.
+DENSITY = 7 / 10
+
+
+def rejection_layout(
+    count: int, size: int, rng: random.Random | None = None
+) -> list[RandomizeImageInfo]:
+    """
+    Place `count` symbols one at a time with `RandomizeImageInfo`, starting over if a symbol
+    can't be placed.
+    """
+    placed_info: list[RandomizeImageInfo] = []
+    while len(placed_info) != count:
+        placed_info = []
+        for _ in range(count):
+            random_info = RandomizeImageInfo(size, placed_info, rng)
+            counter = 0
+            while not random_info.exists or not all(
+                map(random_info.dont_overlap, placed_info)
+            ):
+                # If we've done this ten times, it must be a difficult card. Start over.
+                if counter >= 10:
+                    break
+                random_info = RandomizeImageInfo(size, placed_info, rng)
+                counter += 1
+            else:
+                placed_info.append(random_info)
+                continue
+            profiling.count("layout_restarts")
+            break
+    return placed_info
+
+
+def _fits(
+    distances: np.ndarray,
+    directions: np.ndarray,
+    candidate_radii: np.ndarray,
+    centers: np.ndarray,
+    radii: np.ndarray,
+    size: int,
+) -> np.ndarray:
+    """
+    Check which candidates fit with the rules `RandomizeImageInfo` uses: a candidate may not
+    overlap a placed symbol, and along its ray from the center of the card, it must be at least
+    the buffer away from where the ray crosses a placed symbol.
+    """
+    # Rotate every placed center so that the candidate's ray is along the positive real axis.
+    relative = centers[None, :] * np.conj(directions)[:, None]
+    along = relative.real
+    across = np.abs(relative.imag)
+    half_chord = np.sqrt(np.maximum(radii[None, :] ** 2 - across**2, 0))
+    crosses = (across <= radii[None, :]) & (along + half_chord >= 0)
+    buffer = candidate_radii[:, None] + size * BUFFER
+    blocked = (
+        crosses
+        & (distances[:, None] >= np.maximum(along - half_chord, 0) - buffer)
+        & (distances[:, None] <= along + half_chord + buffer)
+    )
+    overlaps = (
+        np.abs(centers[None, :] - (distances * directions)[:, None])
+        < candidate_radii[:, None] + radii[None, :]
+    )
+    return ~np.any(blocked | overlaps, axis=1)
+
+
+def vectorized_layout(
+    count: int,
+    size: int,
+    rng: random.Random | None = None,
+    batch: int = 256,
+    attempts: int = 10,
+    restarts: int = 20,
+) -> list[RandomizeImageInfo]:
+    """
+    Place `count` symbols by drawing `batch` candidates (angle, distance and radius) at once and
+    checking them against every symbol already placed with NumPy. Of the candidates that fit, the
+    one that reaches out the farthest is used. If none of `attempts` batches fit, the card is
+    started over. Radii are limited so that the symbols left to place still have room, which
+    keeps dense cards from starting over again and again. After `restarts` tries, the card is
+    laid out with `packed_layout` instead, since cards with many symbols may never fit this way.
+
+    The random numbers are drawn from a NumPy generator seeded from `rng`, so the same `rng` gives
+    the same layout.
+    """
+    generator = np.random.default_rng(rng_or_global(rng).getrandbits(64))
+    centers = np.empty(count, dtype=complex)
+    radii = np.empty(count)
+    rotations = np.empty(count, dtype=int)
+    placed = 0
+    for _ in range(restarts + 1):
+        if placed == count:
+            break
+        placed = 0
+        area_left = math.pi * (size * (BOUNDARY + BUFFER / 2)) ** 2 * DENSITY
+        for _ in range(count):
+            # Don't let one symbol take up the space that the rest of the symbols need.
+            largest = (
+                math.sqrt(max(area_left, 0) / (count - placed) / math.pi)
+                - size * BUFFER / 2
+            )
+            largest = min(max(largest, MIN_RADIUS * size), MAX_RADIUS * size)
+            for _ in range(attempts):
+                profiling.count("candidate_batches")
+                candidate_radii = (
+                    generator.random(batch) * (largest - MIN_RADIUS * size)
+                    + MIN_RADIUS * size
+                )
+                distances = generator.random(batch) * (
+                    size * BOUNDARY - candidate_radii
+                )
+                directions = np.exp(1j * generator.random(batch) * 2 * math.pi)
+                fits = np.flatnonzero(
+                    _fits(
+                        distances,
+                        directions,
+                        candidate_radii,
+                        centers[:placed],
+                        radii[:placed],
+                        size,
+                    )
+                )
+                if fits.size:
+                    # Use the candidate that reaches out the farthest, to leave room in the middle.
+                    chosen = fits[np.argmax(distances[fits] + candidate_radii[fits])]
+                    centers[placed] = distances[chosen] * directions[chosen]
+                    radii[placed] = candidate_radii[chosen]
+                    rotations[placed] = generator.integers(360)
+                    area_left -= math.pi * (radii[placed] + size * BUFFER / 2) ** 2
+                    placed += 1
+                    break
+            else:
+                # None of the batches fit, start over.
+                profiling.count("layout_restarts")
+                break
+    if placed != count:
+        profiling.count("packed_fallbacks")
+        return packed_layout(count, size, rng)
+    return [
+        RandomizeImageInfo.placed(size, int(rotation), float(radius), complex(center))
+        for center, radius, rotation in zip(centers, radii, rotations)
+    ]
+
+
+def _follows_rules(centers: np.ndarray, radii: np.ndarray, size: float) -> bool:
+    """Check that symbols placed in this order all fit with the rules that `_fits` checks."""
+    # Allow for rounding, since templates put symbols right against the edge.
+    if np.any(np.abs(centers) + radii > size * BOUNDARY * (1 + 1e-12)):
+        return False
+    for index in range(1, len(centers)):
+        distance = np.abs(centers[index : index + 1])
+        direction = centers[index : index + 1] / distance if distance[0] else np.ones(1)
+        if not _fits(
+            distance,
+            direction,
+            radii[index : index + 1],
+            centers[:index],
+            radii[:index],
+            size,
+        )[0]:
+            return False
+    return True
+
+
+def _rings(count: int, inner: int, radius: float) -> np.ndarray:
+    """
+    Get the centers of `count` symbols of `radius` on a card of size 1: `inner` of them in the
+    middle (one in the center, or a ring of them), and the rest in a ring around the edge.
+    """
+    outer = count - inner
+    outer_distance = BOUNDARY - radius
+    centers = [
+        outer_distance * np.exp(2j * math.pi * index / outer) for index in range(outer)
+    ]
+    if inner == 1:
+        centers.append(0j)
+    elif inner > 1:
+        inner_distance = outer_distance - 2 * radius - BUFFER
+        centers += [
+            inner_distance * np.exp(2j * math.pi * (index + 0.5) / inner)
+            for index in range(inner)
+        ]
+    return np.array(centers, dtype=complex)
+
+
+@functools.cache
+def ring_template(count: int) -> tuple[np.ndarray, float]:
+    """
+    Get the centers and the radius of `count` symbols of the same size, on a card of size 1, that
+    fit with the rules that `_fits` checks. Of the ways to put them in one or two rings, the one
+    that lets the symbols be the largest is used.
+    """
+    best: tuple[np.ndarray, float] = (np.zeros(count, dtype=complex), 0.0)
+    for inner in range(0, count // 3 + 1):
+        low, high = 0.0, MAX_RADIUS
+        for _ in range(30):
+            radius = (low + high) / 2
+            centers = _rings(count, inner, radius)
+            if _follows_rules(centers, np.full(count, radius), 1):
+                low = radius
+            else:
+                high = radius
+        if low > best[1]:
+            best = (_rings(count, inner, low), low)
+    return best
+
+
+def template_layout(
+    count: int, size: int, rng: random.Random | None = None
+) -> list[RandomizeImageInfo]:
+    """
+    Place `count` symbols with `ring_template`, turned by a random angle, with each symbol
+    shrunk a little at random and given a random rotation. This always works the first time.
+    """
+    generator = np.random.default_rng(rng_or_global(rng).getrandbits(64))
+    centers, radius = ring_template(count)
+    centers = centers * np.exp(2j * math.pi * generator.random()) * size
+    # Making symbols smaller never breaks the rules, so sizes can be jittered downwards.
+    radii = radius * size * generator.uniform(SHRINK_LIMIT, 1, count)
+    centers = centers[generator.permutation(count)]
+    return [
+        RandomizeImageInfo.placed(size, int(rotation), float(radius), complex(center))
+        for center, radius, rotation in zip(
+            centers, radii, generator.integers(360, size=count)
+        )
+    ]
+
+
+def packed_layout(
+    count: int,
+    size: int,
+    rng: random.Random | None = None,
+    batch: int = 128,
+    attempts: int = 4,
+    shrinks: int = 6,
+) -> list[RandomizeImageInfo]:
+    """
+    Place `count` symbols largest first, without ever starting over, so no card takes more than
+    `count * (shrinks + 1) * attempts` batches. Each symbol gets `attempts` batches of `batch`
+    candidates, like in `vectorized_layout`. If none fit, the symbol is shrunk and tried again,
+    up to `shrinks` times, down to `SHRINK_LIMIT` times `MIN_RADIUS` (or the size of the
+    symbols in `ring_template`, if that is smaller). If it still doesn't fit, the card is laid
+    out with `template_layout` instead.
+    """
+    generator = np.random.default_rng(rng_or_global(rng).getrandbits(64))
+    template_radius = ring_template(count)[1] * size
+    smallest = min(MIN_RADIUS * size, template_radius) * SHRINK_LIMIT
+    area = math.pi * (size * (BOUNDARY + BUFFER / 2)) ** 2 * DENSITY
+    typical = math.sqrt(area / count / math.pi) - size * BUFFER / 2
+    jittered = typical * generator.uniform(0.8, 1.2, count)
+    targets = np.sort(np.clip(jittered, smallest, MAX_RADIUS * size))[::-1]
+    centers = np.empty(count, dtype=complex)
+    radii = np.empty(count)
+    for placed, radius in enumerate(targets):
+        shrink = (smallest / radius) ** (1 / shrinks) if shrinks else 1
+        for _ in range(shrinks + 1):
+            for _ in range(attempts):
+                profiling.count("candidate_batches")
+                distances = generator.random(batch) * (size * BOUNDARY - radius)
+                directions = np.exp(1j * generator.random(batch) * 2 * math.pi)
+                fits = np.flatnonzero(
+                    _fits(
+                        distances,
+                        directions,
+                        np.full(batch, radius),
+                        centers[:placed],
+                        radii[:placed],
+                        size,
+                    )
+                )
+                if fits.size:
+                    chosen = fits[np.argmax(distances[fits])]
+                    centers[placed] = distances[chosen] * directions[chosen]
+                    radii[placed] = radius
+                    break
+            else:
+                profiling.count("layout_shrinks")
+                radius *= shrink
+                continue
+            break
+        else:
+            profiling.count("template_fallbacks")
+            return template_layout(count, size, rng)
+    order = generator.permutation(count)
+    return [
+        RandomizeImageInfo.placed(size, int(rotation), float(radius), complex(center))
+        for center, radius, rotation in zip(
+            centers[order], radii[order], generator.integers(360, size=count)
+        )
+    ]
+
+
+LAYOUT_ENGINES: dict[
+    str, Callable[[int, int, random.Random | None], list[RandomizeImageInfo]]
+] = {
+    "rejection": rejection_layout,
+    "vectorized": vectorized_layout,
+    "packed": packed_layout,
+    "template": template_layout,
+}
+
+
+def layout_card(
+    count: int,
+    size: int,
+    engine: str = "rejection",
+    rng: random.Random | None = None,
+) -> list[RandomizeImageInfo]:
+    """
+    Place `count` symbols on a card of size `size` using the layout engine `engine`.
+    Random numbers are drawn from `rng`, or the global random number generator if it is None.
+    """
+    try:
+        layout_engine = LAYOUT_ENGINES[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown layout engine {engine!r}. Choose from {', '.join(LAYOUT_ENGINES)}."
+        ) from None
+    return layout_engine(count, size, rng)
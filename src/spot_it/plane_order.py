@@ -0,0 +1,24 @@
+"""
+The order of a projective plane, found from its size without numpy, so that the command line can
+plan a deck without loading it.
+"""
+import math
+
+
+class ProjectivePlaneError(ValueError):
+    """Exception that can be raised when there is an error with the projective plane"""
+
+
+def get_order(number: int) -> int:
+    """
+    Get the order of a projective plane from the number of points or lines in it.
+    If the number is not a valid number of points for a projective plane, then a
+    `ProjectivePlaneError` is raised.
+    """
+    possible_n = math.floor(math.sqrt(number - 1))
+    if possible_n**2 + possible_n + 1 != number:
+        raise ProjectivePlaneError(
+            "The number of points/lines in a projective field needs to conform to the formula "
+            f"n² + n + 1. The nearest such number is {possible_n ** 2 + possible_n + 1}."
+        )
+    return possible_n
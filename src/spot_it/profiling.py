@@ -0,0 +1,201 @@
+"""Timers and counters for the stages of making a deck."""
+
+import contextlib
+import cProfile
+import json
+import pathlib
+import threading
+import time
+import tracemalloc
+from typing import Generator
+
+# The recorder that `stage` and `count` report to, if any. It is a plain global rather than a
+# context variable so that threads started by the pipeline report to it too.
+_active: "Recorder | None" = None
+
+
+class Recorder:
+    """
+    Adds up how long each stage takes and how many times things happen, and keeps the highest
+    of peaks like memory, for the whole deck and for each card.
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.peaks: dict[str, int] = {}
+        # The peaks since the card being made was started.
+        self.card_peaks: dict[str, int] = {}
+        self.cards: list[dict] = []
+        self.extra: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        """Add time spent in stage `name`."""
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + calls
+
+    def count(self, name: str, amount: int = 1):
+        """Add to counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def peak(self, name: str, amount: int):
+        """Raise peak `name` to `amount`, if it is higher."""
+        with self._lock:
+            for peaks in (self.peaks, self.card_peaks):
+                peaks[name] = max(peaks.get(name, 0), amount)
+
+    def snapshot(self) -> dict:
+        """Get everything recorded so far."""
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"seconds": self.seconds[name], "calls": self.calls[name]}
+                    for name in self.seconds
+                },
+                "counters": dict(self.counters),
+                "peaks": dict(self.peaks),
+            }
+
+    def merge(self, snapshot: dict):
+        """Add a snapshot or report from another recorder, like one in a worker process."""
+        for name, stage in snapshot["stages"].items():
+            self.add_time(name, stage["seconds"], stage["calls"])
+        for name, amount in snapshot["counters"].items():
+            self.count(name, amount)
+        for name, amount in snapshot.get("peaks", {}).items():
+            self.peak(name, amount)
+        with self._lock:
+            self.cards.extend(snapshot.get("cards", []))
+
+    def add_card(self, index: int, snapshot: dict):
+        """Keep what happened while making the card at `index`."""
+        with self._lock:
+            self.cards.append({"index": index, **snapshot})
+
+    def to_dict(self) -> dict:
+        """Get the whole report."""
+        report = self.snapshot()
+        with self._lock:
+            report["cards"] = sorted(self.cards, key=lambda card: card["index"])
+            report.update(self.extra)
+        return report
+
+    def to_json(self, path: pathlib.Path):
+        """Write the whole report as JSON."""
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+
+def difference(after: dict, before: dict) -> dict:
+    """Get what was recorded between two snapshots."""
+    stages = {}
+    for name, stage in after["stages"].items():
+        earlier = before["stages"].get(name, {"seconds": 0, "calls": 0})
+        if stage["calls"] != earlier["calls"]:
+            stages[name] = {
+                "seconds": stage["seconds"] - earlier["seconds"],
+                "calls": stage["calls"] - earlier["calls"],
+            }
+    counters = {
+        name: amount - before["counters"].get(name, 0)
+        for name, amount in after["counters"].items()
+        if amount != before["counters"].get(name, 0)
+    }
+    return {"stages": stages, "counters": counters}
+
+
+def peak(name: str, amount: int):
+    """Raise peak `name` to `amount`, if anything is being recorded."""
+    if _active is not None:
+        _active.peak(name, amount)
+
+
+def active() -> Recorder | None:
+    """Get the recorder that is being reported to, if any."""
+    return _active
+
+
+@contextlib.contextmanager
+def recording(recorder: Recorder | None) -> Generator[Recorder | None, None, None]:
+    """Report to `recorder` inside the `with` block. Nothing is recorded if it is None."""
+    global _active  # pylint: disable=global-statement
+    previous = _active
+    _active = recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Generator[None, None, None]:
+    """Time the `with` block as part of stage `name`."""
+    recorder = _active
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_time(name, time.perf_counter() - start)
+
+
+def count(name: str, amount: int = 1):
+    """Add to counter `name`, if anything is being recorded."""
+    if _active is not None:
+        _active.count(name, amount)
+
+
+@contextlib.contextmanager
+def card(index: int) -> Generator[None, None, None]:
+    """Record what happens in the `with` block as the making of the card at `index`."""
+    recorder = _active
+    if recorder is None:
+        yield
+        return
+    before = recorder.snapshot()
+    recorder.card_peaks = {}
+    with stage("card"):
+        yield
+    made = difference(recorder.snapshot(), before)
+    if recorder.card_peaks:
+        made["peaks"] = dict(recorder.card_peaks)
+    recorder.add_card(index, made)
+
+
+@contextlib.contextmanager
+def profile(
+    recorder: Recorder | None,
+    cprofile_path: pathlib.Path | None = None,
+    trace_memory: bool = False,
+) -> Generator[Recorder | None, None, None]:
+    """
+    Record to `recorder` inside the `with` block, if it isn't None. If `cprofile_path` is given,
+    the calling thread is also profiled with cProfile, and the stats are saved there. If
+    `trace_memory` is True, the peak memory allocated by Python (not by Pillow's image buffers)
+    is added to the report.
+    """
+    profiler = cProfile.Profile() if cprofile_path is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with recording(recorder):
+            yield recorder
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if recorder is not None:
+                recorder.extra["memory"] = {
+                    "current_bytes": current,
+                    "peak_bytes": peak,
+                }
@@ -0,0 +1,59 @@
+"""Progress events, for showing how making decks is going without printing progress bars."""
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from tqdm import tqdm
+
+T = TypeVar("T")
+
+# What happened, in the `stage` of an event.
+STARTED = "started"
+CARD = "card"
+REPORT = "report"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """
+    Something that happened while making the deck called `deck`. `done` out of `total` cards are
+    finished. `message` is a report or an error, for the stages that have one.
+    """
+
+    deck: str
+    stage: str
+    done: int = 0
+    total: int = 0
+    message: str | None = None
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+def track(
+    items: Iterable[T],
+    description: str,
+    total: int,
+    progress: ProgressCallback | None,
+    deck: str,
+) -> Iterator[T]:
+    """
+    Go through `items`, showing a progress bar if `progress` is None, and otherwise sending a
+    `CARD` event to `progress` after each item is dealt with.
+    """
+    if progress is None:
+        yield from tqdm(items, desc=description, total=total)
+        return
+    for done, item in enumerate(items, start=1):
+        yield item
+        progress(ProgressEvent(deck, CARD, done, total))
+
+
+def report(message: str, progress: ProgressCallback | None, deck: str):
+    """Print `message`, or send it to `progress` as a `REPORT` event."""
+    if progress is None:
+        tqdm.write(message)
+    else:
+        progress(ProgressEvent(deck, REPORT, message=message))
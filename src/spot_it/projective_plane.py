@@ -1,15 +1,19 @@
 """Generate projective planes."""
-import math
+import functools
 from collections import namedtuple
 from dataclasses import dataclass
 from typing import Generator, Iterable, Type, Union
 
+import numpy as np
 
-class ProjectivePlaneError(ValueError):
-    """Exception that can be raised when there is an error with the projective plane"""
+from .finite_field import FiniteField, FiniteFieldError
+from .plane_order import ProjectivePlaneError, get_order  # pylint: disable=unused-import
 
 
 Point: Type[tuple[int, int]] = namedtuple("Point", ["x", "y"])
+# The plane of order 1 is a triangle, numbered as every other plane is. It can't be built like
+# the others, since there is no field with one element.
+TRIANGLE = [[1, 0], [2, 0], [1, 2]]
 
 
 @dataclass
@@ -28,6 +32,8 @@ class PointAtInfinity:
     def lines(self) -> Generator[list[Union[Point, "PointAtInfinity"]], None, None]:
         """
         Generate the lines for this point at infinity in the projective plane of order `order`.
+        This uses arithmetic modulo `order`, so it is only right for prime orders.
+        `ProjectivePlane` works for every prime power order.
         """
         if self.num is not None:
             for offset in range(self.order):
@@ -58,11 +64,13 @@ def points_at_infinity(order: int) -> Iterable[PointAtInfinity]:
 
 
 def all_lines(order: int) -> Generator[list[Point | PointAtInfinity], None, None]:
-    """Get all lines in the projective plane of order `order`."""
-    infinity_points = list(points_at_infinity(order))
-    for point in infinity_points:
-        yield from point.lines()
-    yield list(infinity_points)
+    """
+    Get all lines in the projective plane of order `order`. If there is no such plane that can be
+    made, a `ProjectivePlaneError` is raised.
+    """
+    points = list(all_points(order))
+    for line in get_plane(order).lines:
+        yield [points[point] for point in line]
 
 
 def all_points(order: int) -> Generator[Point | PointAtInfinity, None, None]:
@@ -73,16 +81,191 @@ def all_points(order: int) -> Generator[Point | PointAtInfinity, None, None]:
     yield from points_at_infinity(order)
 
 
-def get_order(number: int) -> int:
+class ProjectivePlane:
     """
-    Get the order of a projective plane from the number of points or lines in it.
-    If the number is not a valid number of points for a projective plane, then a
-    `ProjectivePlaneError` is raised.
+    The projective plane of a prime power order (or of order 1, which is a triangle), with points
+    and lines numbered in the same order that `all_points` and `all_lines` give them.
+
+    The point (x, y) is number x * order + y, and the point at infinity for slope m is number
+    order² + m (order² + order for vertical lines). The line y = m * x + b is number
+    m * order + b, the vertical line x = c is number order² + c, and the line at infinity is the
+    last one.
+
+    `lines[i]` holds the points on line i, and `point_lines[j]` holds the lines through point j.
+    Both tables are only made when they are first used: `line` works out the points on one line
+    straight from its number, so any card of a deck can be found without the others.
+    Points and lines also have homogeneous coordinates over the finite field, which are used to
+    find the line through two points and the point on two lines in O(1). The plane of order 1
+    has no field, so `field` is None and they are looked up in the tables instead.
     """
-    possible_n = math.floor(math.sqrt(number - 1))
-    if possible_n**2 + possible_n + 1 != number:
-        raise ProjectivePlaneError(
-            "The number of points/lines in a projective field needs to conform to the formula "
-            f"n² + n + 1. The nearest such number is {possible_n ** 2 + possible_n + 1}."
+
+    order: int
+    field: FiniteField | None
+
+    def __init__(self, order: int) -> None:
+        self.order = order
+        if order == 1:
+            self.field = None
+            return
+        try:
+            self.field = FiniteField(order)
+        except FiniteFieldError as error:
+            raise ProjectivePlaneError(
+                f"There is no known projective plane of order {order}. The order must be a power "
+                "of a prime."
+            ) from error
+
+    @functools.cached_property
+    def lines(self) -> np.ndarray:
+        """The points on every line, in the same order as `line` gives them."""
+        order = self.order
+        if self.field is None:
+            return np.array(TRIANGLE, dtype=np.int32)
+        add, mul = self.field.add, self.field.mul
+        xs = np.arange(order)
+        lines = np.empty((self.size, order + 1), dtype=np.int32)
+        for slope in range(order):
+            lines[slope * order : (slope + 1) * order, 0] = order**2 + slope
+            lines[slope * order : (slope + 1) * order, 1:] = (
+                xs[None, :] * order + add[mul[slope, xs][None, :], xs[:, None]]
+            )
+        lines[order**2 : order**2 + order, 0] = order**2 + order
+        lines[order**2 : order**2 + order, 1:] = xs[:, None] * order + xs[None, :]
+        lines[-1] = order**2 + np.arange(order + 1)
+        return lines
+
+    @functools.cached_property
+    def point_lines(self) -> np.ndarray:
+        """The lines through every point, in order."""
+        order = self.order
+        # Each point is on order + 1 lines, and the lines are already in order.
+        line_numbers = np.repeat(np.arange(self.size), order + 1)
+        return line_numbers[np.argsort(self.lines.ravel(), kind="stable")].reshape(
+            self.size, order + 1
         )
-    return possible_n
+
+    def line(self, index: int) -> list[int]:
+        """
+        Get the points on line `index`, the same as `lines[index]`, without making the table of
+        every line.
+        """
+        order = self.order
+        if not 0 <= index < self.size:
+            raise IndexError(f"There is no line {index} in a plane with {self.size} lines.")
+        if self.field is None:
+            return list(TRIANGLE[index])
+        if index < order**2:
+            slope, offset = divmod(index, order)
+            mul, add = self.field.mul, self.field.add
+            return [order**2 + slope] + [
+                x * order + int(add[mul[slope, x], offset]) for x in range(order)
+            ]
+        if index < order**2 + order:
+            x = index - order**2
+            return [order**2 + order] + [x * order + y for y in range(order)]
+        return [order**2 + point for point in range(order + 1)]
+
+    @property
+    def size(self) -> int:
+        """The number of points, which is also the number of lines."""
+        return self.order**2 + self.order + 1
+
+    def incidence(self) -> np.ndarray:
+        """Get the matrix whose entry [line, point] is True if the point is on the line."""
+        matrix = np.zeros((self.size, self.size), dtype=bool)
+        matrix[np.arange(self.size)[:, None], self.lines] = True
+        return matrix
+
+    def point_coordinates(self, point: int) -> tuple[int, int, int]:
+        """Get homogeneous coordinates for a point."""
+        affine_points = self.order**2
+        if point < affine_points:
+            return (point // self.order, point % self.order, 1)
+        if point < affine_points + self.order:
+            return (1, point - affine_points, 0)
+        return (0, 1, 0)
+
+    def line_coordinates(self, line: int) -> tuple[int, int, int]:
+        """
+        Get homogeneous coordinates (a, b, c) for a line, so that the points on it are the points
+        where a * x + b * y + c * z = 0.
+        """
+        affine_lines = self.order**2
+        minus_one = int(self.field.neg[1])
+        if line < affine_lines:
+            return (line // self.order, minus_one, line % self.order)
+        if line < affine_lines + self.order:
+            return (1, 0, int(self.field.neg[line - affine_lines]))
+        return (0, 0, 1)
+
+    def point_number(self, coordinates: tuple[int, int, int]) -> int:
+        """Get the number of the point with the homogeneous coordinates given."""
+        x, y, z = coordinates
+        field = self.field
+        if z:
+            scale = field.inv[z]
+            return int(field.mul[x, scale] * self.order + field.mul[y, scale])
+        if x:
+            return int(self.order**2 + field.mul[y, field.inv[x]])
+        if y:
+            return self.order**2 + self.order
+        raise ProjectivePlaneError("(0, 0, 0) is not a point.")
+
+    def line_number(self, coordinates: tuple[int, int, int]) -> int:
+        """Get the number of the line with the homogeneous coordinates given."""
+        a, b, c = coordinates
+        field = self.field
+        if b:
+            scale = field.neg[field.inv[b]]
+            return int(field.mul[a, scale] * self.order + field.mul[c, scale])
+        if a:
+            return int(self.order**2 + field.neg[field.mul[c, field.inv[a]]])
+        if c:
+            return self.size - 1
+        raise ProjectivePlaneError("(0, 0, 0) is not a line.")
+
+    def _cross(
+        self, first: tuple[int, int, int], second: tuple[int, int, int]
+    ) -> tuple[int, int, int]:
+        """The cross product over the field, which is orthogonal to both vectors."""
+        mul, sub = self.field.mul, self.field.sub
+        return (
+            sub(mul[first[1], second[2]], mul[first[2], second[1]]),
+            sub(mul[first[2], second[0]], mul[first[0], second[2]]),
+            sub(mul[first[0], second[1]], mul[first[1], second[0]]),
+        )
+
+    @staticmethod
+    def _shared(table: np.ndarray, first: int, second: int) -> int:
+        """Get the one number in both rows of `table`, for the plane of order 1."""
+        (shared,) = set(table[first].tolist()) & set(table[second].tolist())
+        return shared
+
+    def line_through(self, first: int, second: int) -> int:
+        """Get the line through two different points."""
+        if first == second:
+            raise ProjectivePlaneError("There are many lines through one point.")
+        if self.field is None:
+            return self._shared(self.point_lines, first, second)
+        return self.line_number(
+            self._cross(self.point_coordinates(first), self.point_coordinates(second))
+        )
+
+    def common_point(self, first: int, second: int) -> int:
+        """
+        Get the point on two different lines. For a deck, this is the symbol two cards have in
+        common.
+        """
+        if first == second:
+            raise ProjectivePlaneError("A line has many points in common with itself.")
+        if self.field is None:
+            return self._shared(self.lines, first, second)
+        return self.point_number(
+            self._cross(self.line_coordinates(first), self.line_coordinates(second))
+        )
+
+
+@functools.cache
+def get_plane(order: int) -> ProjectivePlane:
+    """Get the projective plane of order `order`, which is only made once."""
+    return ProjectivePlane(order)
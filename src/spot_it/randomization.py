@@ -3,10 +3,14 @@
 import cmath
 import math
 import random
-import functools
 from typing import Union
 
-from .utils import FloatRange
+from . import profiling
+from .utils import FloatRange, rng_or_global
+
+# The smallest and largest radius of a symbol, as a fraction of the size of the card.
+MIN_RADIUS = 1 / 5
+MAX_RADIUS = 4 / 5
 
 
 class RandomizeImageInfo:
@@ -18,25 +22,56 @@ class RandomizeImageInfo:
     radius: float
     already_placed: list["RandomizeImageInfo"]
     exists: bool
+    rng: random.Random
 
-    def __init__(self, size: int, already_placed: list["RandomizeImageInfo"]) -> None:
+    def __init__(
+        self,
+        size: int,
+        already_placed: list["RandomizeImageInfo"],
+        rng: random.Random | None = None,
+    ) -> None:
         self.center = None
         self.size = size
         self.already_placed = already_placed
+        self.rng = rng_or_global(rng)
+        profiling.count("random_image_info")
         counter = 0
         while self.center is None:
             if counter >= 10:
                 self.exists = False
                 break
-            self.rotation = random.randrange(360)
+            self.rotation = self.rng.randrange(360)
             # Pick a radius between 2/5 and 5/5 of size so that the side lengths of the image will be
             # approximately between 3/5 and 7/5 of size.
-            self.radius = ((random.random() * 3 / 5) + 1 / 5) * self.size
+            self.radius = (
+                self.rng.random() * (MAX_RADIUS - MIN_RADIUS) + MIN_RADIUS
+            ) * self.size
             self.center = self.get_random_pos()
+            profiling.count("random_pos_attempts")
             counter += 1
         else:
             self.exists = True
 
+    @classmethod
+    def placed(
+        cls, size: int, rotation: int, radius: float, center: complex
+    ) -> "RandomizeImageInfo":
+        """Make the information for an image that has already been placed somewhere."""
+        info = cls.__new__(cls)
+        info.size = size
+        info.already_placed = []
+        info.rotation = rotation
+        info.radius = radius
+        info.center = center
+        info.exists = True
+        info.rng = rng_or_global(None)
+        return info
+
+    def scaled(self, size: int) -> "RandomizeImageInfo":
+        """Get the same placement on a card of `size`, scaled to fit."""
+        scale = size / self.size
+        return self.placed(size, self.rotation, self.radius * scale, self.center * scale)
+
     def get_random_pos(
         self,
     ) -> complex | None:
@@ -44,25 +79,24 @@ class RandomizeImageInfo:
         Get a random position for the upper left of a circle with radius `self.radius` within a
         circle with radius `self.size * 2`.
         """
-        theta = random.random() * 2 * math.pi
+        theta = self.rng.random() * 2 * math.pi
         if self.already_placed:
-            no_radius_range = functools.reduce(
-                FloatRange.__add__,
-                map(
-                    lambda placed: placed.get_not_allowable(theta).with_buffer(
-                        self.radius + self.size / 10  # buffer between two images
-                    ),
-                    self.already_placed,
-                ),
+            buffer = self.radius + self.size / 10  # buffer between two images
+            no_radius_range = FloatRange.from_ranges(
+                float_range
+                for placed in self.already_placed
+                for float_range in placed.get_not_allowable(theta)
+                .with_buffer(buffer)
+                .ranges
             )
             radius_range = (
                 FloatRange((0, self.size * 9 / 10 - self.radius)) - no_radius_range
             )
             if not radius_range:
                 return None
-            radius = radius_range.random()
+            radius = radius_range.random(self.rng)
         else:
-            radius = random.random() * (self.size * 9 / 10 - self.radius)
+            radius = self.rng.random() * (self.size * 9 / 10 - self.radius)
         center = cmath.rect(radius, theta)
         return center
 
@@ -0,0 +1,73 @@
+"""An on-disk cache of rendered cards, so unchanged cards don't need to be made again."""
+
+import hashlib
+import json
+import pathlib
+from typing import Sequence
+
+from PIL import Image
+
+from .outputs import COMPRESS_LEVEL, DEFAULT_COMPRESS_LEVEL
+
+# Change this whenever a change to the layout or drawing code changes how cards come out, so
+# that old cards in caches are not used.
+RENDER_VERSION = 2
+
+
+class RenderCache:
+    """
+    Rendered cards saved as PNGs in `directory`, named by a hash of everything that goes into a
+    card: its position in the deck, the contents of its symbols, the seed and the settings.
+    """
+
+    directory: pathlib.Path
+    hits: int
+    misses: int
+
+    def __init__(self, directory: pathlib.Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, index: int, symbol_digests: Sequence[str], **settings) -> str:
+        """
+        Get the key for the card at `index` with the symbols whose contents hash to
+        `symbol_digests`. `settings` are anything else that changes how the card comes out.
+        """
+        description = json.dumps(
+            {
+                "version": RENDER_VERSION,
+                "index": index,
+                "symbols": list(symbol_digests),
+                "settings": settings,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        """Get where the card for `key` is saved."""
+        return self.directory / f"{key}.png"
+
+    def get(self, key: str) -> Image.Image | None:
+        """Get the card for `key`, or None if it hasn't been saved."""
+        path = self.path(key)
+        if not path.is_file():
+            self.misses += 1
+            return None
+        self.hits += 1
+        image = Image.open(path)
+        image.load()
+        # Saved at the PNG backend's default level, so it can copy the file as it is.
+        image.info[COMPRESS_LEVEL] = DEFAULT_COMPRESS_LEVEL
+        return image
+
+    def put(self, key: str, card: Image.Image):
+        """Save the card for `key`."""
+        path = self.path(key)
+        temporary = path.with_suffix(".tmp")
+        card.save(temporary, format="PNG", compress_level=DEFAULT_COMPRESS_LEVEL)
+        # Replace in one step, so other processes never see half of a file.
+        temporary.replace(path)
@@ -0,0 +1,121 @@
+"""
+Make a deck in parts, possibly on different machines, and put the parts together.
+
+Each part is made with `spot_it.deck(cards=...)`, which writes the part's cards, numbered as in
+the whole deck, and a manifest describing them. `merge` checks that the manifests are all for the
+same deck and together cover every card, then copies the cards into one directory and makes the
+PDF.
+"""
+
+import hashlib
+import json
+import pathlib
+import shutil
+from typing import Iterable
+
+from PIL import Image
+
+from . import pdfs, utils
+from .progress import ProgressCallback, report, track
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def shard_range(total: int, shard: int, shards: int) -> range:
+    """
+    Get the indices of the cards in part `shard` (counting from 1) of a deck of `total` cards
+    split into `shards` parts that are as close to the same size as they can be.
+    """
+    if not 1 <= shard <= shards:
+        raise ValueError(f"Part {shard} of {shards} doesn't exist.")
+    return range((shard - 1) * total // shards, shard * total // shards)
+
+
+def symbols_digest(directory: pathlib.Path) -> str:
+    """Get a hash of the contents of every symbol in `directory`, in order."""
+    digest = hashlib.sha256()
+    for symbol in utils.get_images(directory, lazy=True):
+        digest.update(utils.image_digest(symbol).encode())
+    return digest.hexdigest()
+
+
+def write_manifest(
+    output_dir: pathlib.Path, cards: range, deck: dict, files: list[str]
+) -> pathlib.Path:
+    """
+    Write the manifest for the part of a deck with the cards at `cards`, saved in `output_dir` as
+    `files`. `deck` describes the whole deck, and has to be the same for every part.
+    """
+    path = output_dir / f"cards-{cards.start + 1}-{cards.stop}{MANIFEST_SUFFIX}"
+    manifest = {"deck": deck, "cards": dict(zip(map(str, cards), files))}
+    path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return path
+
+
+def _read_manifests(
+    directories: Iterable[pathlib.Path],
+) -> tuple[dict, dict[int, pathlib.Path]]:
+    """Read the manifests in `directories`, and check that they are all for the same deck."""
+    deck = None
+    files: dict[int, pathlib.Path] = {}
+    for directory in directories:
+        paths = sorted(directory.glob(f"*{MANIFEST_SUFFIX}"))
+        if not paths:
+            raise ValueError(f"There is no manifest in {directory}.")
+        for path in paths:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+            if deck is None:
+                deck = manifest["deck"]
+            elif manifest["deck"] != deck:
+                different = sorted(
+                    key
+                    for key in deck.keys() | manifest["deck"].keys()
+                    if deck.get(key) != manifest["deck"].get(key)
+                )
+                raise ValueError(
+                    f"{path} is for a different deck than the other parts: "
+                    f"{', '.join(different)} differ."
+                )
+            for index, name in manifest["cards"].items():
+                if int(index) in files:
+                    raise ValueError(f"Card {int(index) + 1} is in more than one part.")
+                files[int(index)] = directory / name
+    if deck is None:
+        raise ValueError("There are no parts to merge.")
+    missing = [index + 1 for index in range(deck["cards"]) if index not in files]
+    if missing:
+        listed = ", ".join(map(str, missing[:10]))
+        more = f" and {len(missing) - 10} more" if len(missing) > 10 else ""
+        raise ValueError(f"Cards {listed}{more} aren't in any part.")
+    return deck, files
+
+
+def merge(
+    directories: Iterable[pathlib.Path],
+    output_dir: pathlib.Path,
+    pdf_dpi: int | None = None,
+    pages_per_pdf: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> list[pathlib.Path]:
+    """
+    Put together the parts of a deck in `directories` into `output_dir`, numbered as in the whole
+    deck, and put them on PDFs as `spot_it.deck` would with `pdf_dpi` and `pages_per_pdf`.
+    Returns the paths of the PDFs. A `ValueError` is raised if the parts aren't all for the same
+    deck, or some cards are missing.
+    """
+    deck, files = _read_manifests(directories)
+    name = str(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pdf = pdfs.ShardedPdfWriter(output_dir, pdf_dpi, pages_per_pdf)
+    indices = track(range(deck["cards"]), "Merging cards", deck["cards"], progress, name)
+    for index in indices:
+        source = files[index]
+        target = output_dir / f"{index + 1}{source.suffix}"
+        if source.resolve() != target.resolve():
+            shutil.copyfile(source, target)
+        with Image.open(target) as card:
+            card.load()
+        pdf.add(card)
+    paths = pdf.save()
+    report(pdf.report(), progress, name)
+    return paths
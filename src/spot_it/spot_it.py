@@ -1,16 +1,53 @@
 """The main Spot It! generator module."""
 
+import collections
+import concurrent.futures
+import dataclasses
+import itertools
+import random
 import threading
-from typing import Generator
+from dataclasses import dataclass
+from typing import Callable, Generator, Iterable, Sequence, TypeVar
 import pathlib
 
 from PIL import Image
 from tqdm import tqdm
 
-from . import images, projective_plane, utils, pdfs
+from . import (
+    atlas,
+    images,
+    outputs,
+    pdfs,
+    profiling,
+    projective_plane,
+    shards,
+    utils,
+    validation,
+)
+from .layouts import LayoutLibrary, load_or_build
+from .randomization import RandomizeImageInfo
+from .progress import (
+    FAILED,
+    FINISHED,
+    STARTED,
+    ProgressCallback,
+    ProgressEvent,
+    report,
+    track,
+)
+from .render_cache import RenderCache
+from .symbol_cache import SymbolCache
 
 DIRECTORY = pathlib.Path("images")
 OUTPUT_DIR = pathlib.Path("output")
+RESOLUTION = 1000
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+# Symbols given to each worker process once, so that tasks only need to send indices.
+_worker_symbols: list[utils.Symbol] = []
+_worker_options: dict = {}
 
 
 def save_image(image: Image.Image, name: pathlib.Path):
@@ -18,46 +55,558 @@ def save_image(image: Image.Image, name: pathlib.Path):
     image.save(name)
 
 
-def deck():
-    """main()"""
-    list_of_images = utils.get_images(DIRECTORY)
+@dataclass(frozen=True)
+class DeckOptions:
+    """How `deck` makes a deck. Checks that options go together when it is made."""
+
+    # The PNG for each symbol, and where the cards go.
+    directory: pathlib.Path = DIRECTORY
+    output_dir: pathlib.Path = OUTPUT_DIR
+    # How cards are written (PNGs by default): see `outputs.BACKENDS`.
+    backend: outputs.OutputBackend | None = None
+    # The width and height of each card, and how it is laid out and drawn: see
+    # `placement.LAYOUT_ENGINES`, `images.QUALITIES` and `images.CANVASES`.
+    resolution: int = RESOLUTION
+    engine: str = "rejection"
+    quality: str = "default"
+    canvas: str = "rgba"
+    # Transform symbols through this cache, which worker processes each get an empty copy of:
+    # see `symbol_cache.SymbolCache`.
+    symbol_cache: SymbolCache | None = None
+    # Makes the same deck every time, with any number of worker processes.
+    seed: int | str | None = None
+    # Render cards in this many processes: see `deck_generator`.
+    workers: int | None = None
+    # Stream the deck, with at most this many cards in memory: see `stream_deck`.
+    max_in_flight: int | None = None
+    # Check that every two cards have exactly one match first: see `validation.check_deck`.
+    validate: bool = False
+    # Keep rendered cards here, and only make cards that changed again. Needs a `seed`.
+    cache_dir: pathlib.Path | None = None
+    # Pick layouts from the library saved here, making it first if needed: see `load_or_build`.
+    layouts_path: pathlib.Path | None = None
+    # Decode the symbols once into an atlas saved here, which worker processes map instead of
+    # each decoding every symbol: see `atlas.SymbolAtlas`.
+    atlas_path: pathlib.Path | None = None
+    # Shrink cards on the PDF to this many dots per inch, and split it into files of this many
+    # pages, which are written at the same time.
+    pdf_dpi: int | None = None
+    pages_per_pdf: int | None = None
+    # Draw the PDF from the layouts of the cards, with each symbol embedded once: see
+    # `pdfs.VectorPdfWriter`. With the "pdf-only" backend, no cards are rendered at all.
+    vector_pdf: bool = False
+    # Only make the cards with these indices (counting from 0), numbered as in the whole deck,
+    # with a manifest instead of a PDF, to be put together with `shards.merge`. Needs a `seed`.
+    cards: range | None = None
+    # Make the cards and throw them away, writing nothing, so only making them is timed.
+    dry_run: bool = False
+    # Write the time spent in each stage and counts of things like layout restarts here as JSON.
+    # The other two are passed to `profiling.profile`.
+    report_path: pathlib.Path | None = None
+    cprofile_path: pathlib.Path | None = None
+    trace_memory: bool = False
+
+    def __post_init__(self):
+        if self.cache_dir is not None and self.seed is None:
+            raise ValueError("Caching rendered cards needs a seed, since cards are random.")
+        if self.cards is not None:
+            if self.seed is None:
+                raise ValueError("Making part of a deck needs a seed, so every part matches.")
+            if self.backend is not None and self.backend.suffix is None:
+                raise ValueError("Parts of a deck need their cards written, to merge them.")
+            if self.vector_pdf:
+                raise ValueError("Parts of a deck have no PDF: merge them to make one.")
+        if self.vector_pdf and self.pages_per_pdf is not None:
+            raise ValueError("Vector PDFs can't be split into files yet.")
+
+
+def deck(
+    options: DeckOptions | None = None,
+    progress: ProgressCallback | None = None,
+    **changes,
+) -> profiling.Recorder | None:
+    """
+    Make a deck with `options`, with any `changes` made to them, like `deck(seed=1)`. If
+    `progress` is given, it gets `progress.ProgressEvent`s instead of progress bars and reports
+    being printed. Returns what was recorded, if a report was asked for or this is a dry run.
+    """
+    options = dataclasses.replace(options or DeckOptions(), **changes)
+    name = str(options.output_dir)
+    recorder = (
+        profiling.Recorder()
+        if options.report_path is not None or options.dry_run
+        else None
+    )
+    try:
+        with profiling.profile(recorder, options.cprofile_path, options.trace_memory):
+            made = _make_deck(options, progress)
+    except Exception as error:
+        if progress is not None:
+            progress(ProgressEvent(name, FAILED, message=str(error)))
+        raise
+    if recorder is not None and options.report_path is not None:
+        recorder.to_json(options.report_path)
+        report(f"Profile written to {options.report_path}", progress, name)
+    if progress is not None:
+        progress(ProgressEvent(name, FINISHED, made, made))
+    return recorder
+
+
+def _make_deck(options: DeckOptions, progress: ProgressCallback | None) -> int:
+    """Make the deck for `deck`, returning how many cards were made."""
+    output_dir = options.output_dir
+    name = str(output_dir)
+    # Only read the headers at first, so that a wrong number of images is found right away.
+    # Symbols only need to be decoded as large as they are drawn.
+    largest = images.largest_symbol(
+        images.drawn_size(options.resolution, options.quality)
+    )
+    list_of_images: list[utils.Symbol] | atlas.SymbolAtlas
+    if options.atlas_path is not None:
+        list_of_images = atlas.load_or_build(
+            options.atlas_path, options.directory, largest
+        )
+    else:
+        list_of_images = utils.get_images(options.directory, largest, lazy=True)
+    order = projective_plane.get_order(len(list_of_images))
+    library = None
+    if options.layouts_path is not None:
+        library = load_or_build(
+            options.layouts_path, order + 1, options.resolution, options.workers
+        )
+    if (options.workers is None or options.workers <= 1) and options.atlas_path is None:
+        # Worker processes decode the images themselves.
+        list_of_images = utils.load_symbols(list_of_images)
+    if options.validate:
+        validation.check_deck(_deck_lines(len(list_of_images)), list_of_images)
+    backend = outputs.PNGBackend() if options.backend is None else options.backend
+    seed = options.seed
+    vector_pdf = options.vector_pdf
+    if vector_pdf and seed is None:
+        # The PDF is laid out apart from the cards, so they need the same random numbers.
+        seed = random.getrandbits(64)
+    cards = options.cards
+    render_cache = None if options.cache_dir is None else RenderCache(options.cache_dir)
+    count = len(list_of_images) if cards is None else len(cards)
+    if progress is not None:
+        progress(ProgressEvent(name, STARTED, 0, count))
+    generated_deck = deck_generator(
+        list_of_images,
+        options.resolution,
+        workers=options.workers,
+        seed=seed,
+        cache=options.symbol_cache,
+        engine=options.engine,
+        render_cache=render_cache,
+        layouts=library,
+        quality=options.quality,
+        canvas=options.canvas,
+        cards=cards,
+    )
+    if options.dry_run:
+        collections.deque(
+            track(generated_deck, "Making cards", count, progress, name), maxlen=0
+        )
+        return count
+    if cards is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        made = track(generated_deck, "Making cards", count, progress, name)
+        numbers = [index + 1 for index in cards]
+        stream_deck(
+            made,
+            output_dir,
+            options.max_in_flight or 2 * (options.workers or 1),
+            backend=backend,
+            numbers=numbers,
+            make_pdf=False,
+        )
+        deck_settings = {
+            "cards": len(list_of_images),
+            "symbols": shards.symbols_digest(options.directory),
+            "seed": seed,
+            "resolution": options.resolution,
+            "engine": options.engine,
+            "quality": options.quality,
+            "canvas": options.canvas,
+            "layouts": None if library is None else library.digest(),
+        }
+        files = [f"{number}{backend.suffix}" for number in numbers]
+        shards.write_manifest(output_dir, cards, deck_settings, files)
+        report(backend.report(), progress, name)
+        return count
     threads: list[threading.Thread] = []
-    generated_deck = deck_generator(list_of_images)
-    cards: list[Image.Image] = []
-    for file in tqdm(
-        (
-            file
-            for file in OUTPUT_DIR.iterdir()
-            if file.is_file() and file.suffix in {".pdf", ".png"}
-        ),
-        desc="Cleaning old",
-    ):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pdf = None
+    if not vector_pdf:
+        pdf = pdfs.ShardedPdfWriter(
+            output_dir,
+            options.pdf_dpi,
+            options.pages_per_pdf,
+            max_pending=options.max_in_flight or len(list_of_images),
+        )
+    suffixes = {".pdf", *(kind.suffix for kind in outputs.BACKENDS.values())}
+    old_files = [
+        file
+        for file in output_dir.iterdir()
+        if file.is_file() and file.suffix in suffixes
+    ]
+    for file in old_files if progress else tqdm(old_files, desc="Cleaning old"):
         file.unlink()
-    for num, card in enumerate(
-        tqdm(generated_deck, desc="Making cards", total=len(list_of_images)), start=1
+    vector_options = options.resolution, seed, options.engine, library, options.pdf_dpi
+    if vector_pdf and backend.suffix is None:
+        vector = _vector_pdf(list_of_images, output_dir, *vector_options)
+        report(vector.report(), progress, name)
+        return len(list_of_images)
+    made = track(generated_deck, "Making cards", len(list_of_images), progress, name)
+    if options.max_in_flight is not None:
+        stream_deck(
+            made,
+            output_dir,
+            options.max_in_flight,
+            backend=backend,
+            pdf=pdf,
+            make_pdf=pdf is not None,
+        )
+    else:
+        for num, card in enumerate(made, start=1):
+            if pdf is not None:
+                pdf.add(card[0])
+            thread = threading.Thread(
+                target=backend.write, args=(card[0], output_dir / str(num))
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads if progress else tqdm(threads, desc="Saving cards"):
+            thread.join()
+        if pdf is not None:
+            pdf.save()
+    report(backend.report(), progress, name)
+    if pdf is not None:
+        report(pdf.report(), progress, name)
+    else:
+        vector = _vector_pdf(list_of_images, output_dir, *vector_options)
+        report(vector.report(), progress, name)
+    return len(list_of_images)
+
+
+def _vector_pdf(
+    list_of_images: Sequence[utils.Symbol],
+    output_dir: pathlib.Path,
+    resolution: int,
+    seed: int | str,
+    engine: str,
+    layouts: LayoutLibrary | None,
+    dpi: int | None,
+) -> pdfs.VectorPdfWriter:
+    """Draw `cards.pdf` in `output_dir` from the layouts of the cards in the deck."""
+    writer = pdfs.VectorPdfWriter(output_dir / "cards.pdf", dpi)
+    for line, placements in deck_placements(
+        len(list_of_images), resolution, seed, engine, layouts
     ):
-        cards.append(card[0])
-        thread = threading.Thread(
-            target=save_image, args=(card[0], OUTPUT_DIR / f"{num}.png")
+        writer.add_layout(
+            [list_of_images[point] for point in line], placements, resolution
+        )
+    writer.save()
+    return writer
+
+
+def stream_deck(
+    generated_deck: Iterable[tuple[Image.Image, list[utils.Symbol]]],
+    output_dir: pathlib.Path,
+    max_in_flight: int,
+    writers: int | None = None,
+    backend: outputs.OutputBackend | None = None,
+    pdf: pdfs.ShardedPdfWriter | None = None,
+    numbers: Iterable[int] | None = None,
+    make_pdf: bool = True,
+) -> pdfs.ShardedPdfWriter | None:
+    """
+    Save cards with `backend` (PNGs by default) and put them on a PDF as they are generated.
+    The PDF is written by `pdf`, or a `pdfs.ShardedPdfWriter` that writes `cards.pdf`. If
+    `make_pdf` is False, there is no PDF. Files are named with `numbers`, or counting from 1.
+
+    The files are written by a pool of `writers` threads (by default, `max_in_flight`). A card
+    holds one of `max_in_flight` places from when it is taken from `generated_deck` until it is
+    both saved and on the PDF, and no more cards are taken while every place is held. So at most
+    `max_in_flight` cards are waiting to be saved or put on the PDF, on top of the one being taken
+    and those `generated_deck` makes ahead (twice the number of workers, for `deck_generator`).
+    """
+    if backend is None:
+        backend = outputs.PNGBackend()
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    if pdf is None and make_pdf:
+        pdf = pdfs.ShardedPdfWriter(output_dir, max_pending=max_in_flight)
+    if numbers is None:
+        numbers = itertools.count(1)
+    futures: list[concurrent.futures.Future[pathlib.Path | None]] = []
+    with concurrent.futures.ThreadPoolExecutor(writers or max_in_flight) as pool:
+        for num, (card, _) in zip(numbers, generated_deck):
+            in_flight.acquire()  # pylint: disable=consider-using-with
+            release = _after(1 if pdf is None else 2, in_flight.release)
+            future = pool.submit(backend.write, card, output_dir / str(num))
+            future.add_done_callback(lambda _, release=release: release())
+            futures.append(future)
+            if pdf is not None:
+                pdf.add(card, release)
+            del card
+    for future in futures:
+        future.result()  # Raise any errors from saving
+    if pdf is not None:
+        pdf.save()
+    return pdf
+
+
+def _after(count: int, callback: Callable[[], None]) -> Callable[[], None]:
+    """Make a function that calls `callback` the `count`th time it is called, from any thread."""
+    lock = threading.Lock()
+    remaining = count
+
+    def call():
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        callback()
+
+    return call
+
+
+def _init_worker(list_of_images: list[utils.Symbol], options: dict):
+    """Store the symbols and the keyword arguments for `images.spot_it_card` in a worker process."""
+    global _worker_symbols, _worker_options  # pylint: disable=global-statement
+    _worker_symbols = list_of_images
+    _worker_options = options
+
+
+def _cached_card(
+    render_cache: RenderCache | None,
+    key: str | None,
+    make_card: Callable[[], Image.Image],
+) -> Image.Image:
+    """Get a card from `render_cache` if it is there, and otherwise make it and save it there."""
+    if render_cache is None or key is None:
+        return make_card()
+    card = render_cache.get(key)
+    if card is None:
+        profiling.count("render_cache_misses")
+        card = make_card()
+        render_cache.put(key, card)
+    else:
+        profiling.count("render_cache_hits")
+    return card
+
+
+def _render_card(
+    job: tuple[list[int], int, int | str, int, RenderCache | None, str | None, bool]
+) -> tuple[Image.Image, dict | None]:
+    """
+    Render one card in a worker process from the indices of its symbols. If the last item of
+    `job` is True, what happened is recorded and sent back with the card.
+    """
+    indices, resolution, seed, index, render_cache, key, record = job
+    recorder = profiling.Recorder() if record else None
+    with profiling.recording(recorder), profiling.card(index):
+        card = _cached_card(
+            render_cache,
+            key,
+            lambda: images.spot_it_card(
+                [_worker_symbols[point] for point in indices],
+                resolution,
+                rng=utils.card_rng(seed, index),
+                **_worker_options,
+            ),
         )
-        thread.start()
-        threads.append(thread)
-    for thread in tqdm(threads, desc="Saving cards", total=len(threads)):
-        thread.join()
-    pdfs.put_on_pdf(cards, OUTPUT_DIR / "cards.pdf")
+    return card, None if recorder is None else recorder.to_dict()
+
+
+def _ordered_map(
+    executor: concurrent.futures.Executor,
+    function: Callable[[T], S],
+    iterable: Iterable[T],
+    window: int,
+) -> Generator[S, None, None]:
+    """
+    Like `executor.map`, but only keep `window` tasks submitted at a time, so that results are
+    not piled up faster than they are consumed. Results are yielded in order.
+    """
+    pending: collections.deque[concurrent.futures.Future[S]] = collections.deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _deck_lines(number_of_images: int) -> list[list[int]]:
+    """Get the indices of the images on each card of a deck."""
+    order = projective_plane.get_order(number_of_images)
+    return projective_plane.get_plane(order).lines.tolist()
+
+
+def _card_lines(
+    number_of_images: int, cards: range | None = None
+) -> tuple[range, list[list[int]]]:
+    """
+    Get the indices of the cards in `cards` (every card if it is None), and of the images on each
+    of them, without working out the rest of the deck.
+    """
+    plane = projective_plane.get_plane(projective_plane.get_order(number_of_images))
+    if cards is None:
+        cards = range(plane.size)
+    elif cards and (min(cards) < 0 or max(cards) >= plane.size):
+        raise ValueError(
+            f"The deck has {plane.size} cards, so cards {cards.start} to {cards.stop - 1} "
+            "can't all be made."
+        )
+    return cards, [plane.line(index) for index in cards]
 
 
 def deck_generator(
-    list_of_images: list[Image.Image], resolution=1000
-) -> Generator[tuple[Image.Image, list[Image.Image]], None, None]:
+    list_of_images: list[utils.Symbol],
+    resolution=RESOLUTION,
+    workers: int | None = None,
+    seed: int | str | None = None,
+    cache: SymbolCache | None = None,
+    engine: str = "rejection",
+    render_cache: RenderCache | None = None,
+    layouts: LayoutLibrary | None = None,
+    quality: str = "default",
+    canvas: str = "rgba",
+    cards: range | None = None,
+) -> Generator[tuple[Image.Image, list[utils.Symbol]], None, None]:
     """
     Generate deck using a generator, no file IO.
     Generated values are tuples: (card, images in card).
+
+    If `cards` is given, only the cards with those indices (counting from 0) are made, the same as
+    they are in the whole deck, so a deck can be split between machines: see `shards`.
+
+    If `workers` is more than 1, the cards are rendered in that many processes. Cards are still
+    generated in line order. If `seed` is given, every card gets its own random number generator
+    seeded from it and the card's index, so the same deck is made no matter how many workers are
+    used, and any card can be made again on its own with `deck_card`.
+
+    If a symbol `cache` is given, symbols are transformed through it. Each worker process gets
+    its own empty cache with the same settings. `engine` is the layout engine to use. If a
+    library of `layouts` is given, layouts are picked from it instead of searched for, so only
+    the symbols need to be drawn. Symbols are drawn with the preset `quality`: a "preview" deck
+    has the same layouts as the full deck with the same seed, drawn smaller and faster. Cards are
+    drawn on the canvas called `canvas`: see `images.CANVASES`.
+
+    If a `render_cache` and a `seed` are given, cards are taken from the cache when nothing that
+    goes into them has changed, and saved to it otherwise. Without a seed, cards are random, so
+    the render cache isn't used.
     """
-    order = projective_plane.get_order(len(list_of_images))
-    mapping = utils.create_mapping(projective_plane.all_points(order), list_of_images)
-    lines = projective_plane.all_lines(order)
-    for line in lines:
-        line_images = list(map(mapping.get, line))
-        card = images.spot_it_card(line_images, resolution)
-        yield (card, line_images)
+    options = {
+        "cache": cache,
+        "engine": engine,
+        "layouts": layouts,
+        "quality": quality,
+        "canvas": canvas,
+    }
+    indices, lines = _card_lines(len(list_of_images), cards)
+    keys: list[str | None] = [None] * len(lines)
+    if render_cache is not None and seed is not None:
+        digests = [utils.image_digest(image) for image in list_of_images]
+        layouts_digest = None if layouts is None else layouts.digest()
+        keys = [
+            render_cache.key(
+                index,
+                [digests[point] for point in line],
+                resolution=resolution,
+                seed=seed,
+                engine=engine,
+                symbol_cache=None if cache is None else cache.settings(),
+                layouts=layouts_digest,
+                quality=quality,
+                canvas=canvas,
+            )
+            for index, line in zip(indices, lines)
+        ]
+    else:
+        render_cache = None
+    if workers is None or workers <= 1:
+        for index, line, key in zip(indices, lines, keys):
+            rng = None if seed is None else utils.card_rng(seed, index)
+            line_images = [list_of_images[point] for point in line]
+            with profiling.card(index):
+                card = _cached_card(
+                    render_cache,
+                    key,
+                    # pylint: disable-next=cell-var-from-loop
+                    lambda: images.spot_it_card(
+                        line_images, resolution, rng=rng, **options
+                    ),
+                )
+            yield (card, line_images)
+        return
+    if seed is None:
+        # Worker processes may start with the same random state, so always give them a seed.
+        seed = random.getrandbits(64)
+    recorder = profiling.active()
+    jobs = (
+        (line, resolution, seed, index, render_cache, key, recorder is not None)
+        for index, line, key in zip(indices, lines, keys)
+    )
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=(list_of_images, options)
+    ) as executor:
+        for line, (card, report) in zip(
+            lines, _ordered_map(executor, _render_card, jobs, 2 * workers)
+        ):
+            if recorder is not None and report is not None:
+                recorder.merge(report)
+            yield (card, [list_of_images[point] for point in line])
+
+
+def deck_card(
+    list_of_images: list[utils.Symbol],
+    index: int,
+    seed: int | str,
+    resolution=RESOLUTION,
+    cache: SymbolCache | None = None,
+    engine: str = "rejection",
+    layouts: LayoutLibrary | None = None,
+    quality: str = "default",
+    canvas: str = "rgba",
+) -> Image.Image:
+    """
+    Make only the card at `index` (counting from 0) of the deck that `deck_generator` makes with
+    the same `seed` and options.
+    """
+    _, (line,) = _card_lines(len(list_of_images), range(index, index + 1))
+    return images.spot_it_card(
+        [list_of_images[point] for point in line],
+        resolution,
+        cache,
+        engine,
+        utils.card_rng(seed, index),
+        layouts,
+        quality,
+        canvas,
+    )
+
+
+def deck_placements(
+    number_of_images: int,
+    resolution=RESOLUTION,
+    seed: int | str | None = None,
+    engine: str = "rejection",
+    layouts: LayoutLibrary | None = None,
+    cards: range | None = None,
+) -> Generator[tuple[list[int], list[RandomizeImageInfo]], None, None]:
+    """
+    Lay out the cards of a deck without drawing them. Generated values are tuples: (indices of
+    the images on the card, their placements). With the same `seed` and options, the layouts are
+    the same as the cards `deck_generator` makes.
+    """
+    indices, lines = _card_lines(number_of_images, cards)
+    for index, line in zip(indices, lines):
+        rng = None if seed is None else utils.card_rng(seed, index)
+        yield line, images.card_placements(len(line), resolution, engine, rng, layouts)
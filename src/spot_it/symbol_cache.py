@@ -0,0 +1,209 @@
+"""A cache of scaled and rotated symbols for Spot-It!"""
+
+import collections
+import math
+import threading
+from typing import Callable, Generic, Hashable, TypeVar
+
+from PIL import Image
+
+from .images import BACKGROUND, get_quality
+from .randomization import MAX_RADIUS, RandomizeImageInfo
+from .utils import Symbol, as_image, to_complex, to_int_tuple
+
+
+def image_bytes(image: Image.Image) -> int:
+    """Get the number of bytes the pixels of an image take up."""
+    return image.width * image.height * len(image.getbands())
+
+
+Value = TypeVar("Value")
+
+
+class ImageLRU(Generic[Value]):
+    """
+    Values by key, with the least recently used dropped once they take up more than `max_bytes`
+    bytes, as `size` measures them (the pixels of an image, by default). The last value added is
+    always kept. It can be used from many threads.
+    """
+
+    def __init__(
+        self, max_bytes: int, size: Callable[[Value], int] = image_bytes
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.size = size
+        self.current_bytes = 0
+        self._values: collections.OrderedDict[Hashable, Value] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable) -> Value | None:
+        """Get the value for `key`, or None if it isn't kept."""
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Value):
+        """Keep `value` for `key`, unless there is one already."""
+        with self._lock:
+            if key in self._values:
+                return
+            self._values[key] = value
+            self.current_bytes += self.size(value)
+            while self.current_bytes > self.max_bytes and len(self._values) > 1:
+                _, evicted = self._values.popitem(last=False)
+                self.current_bytes -= self.size(evicted)
+
+    def drop(self, keys: Callable[[Hashable], bool]):
+        """Drop the values for every key that `keys` is true for."""
+        with self._lock:
+            for key in [key for key in self._values if keys(key)]:
+                self.current_bytes -= self.size(self._values.pop(key))
+
+
+class SymbolCache:
+    """
+    A cache of symbols transformed for cards of a certain size.
+
+    Every symbol is first scaled down to a master image no bigger than the largest it can be drawn
+    on a card, with the resampling filter of the quality it is drawn at, so placements never
+    resize the full resolution source. If `scale_step` (a fraction
+    of the size the card is drawn at) or `rotation_step` (in degrees) is given, diameters are rounded down and
+    rotations are rounded to those steps, so placements can share the same transformed image. These
+    variants are kept in a least recently used cache of at most `max_bytes` bytes of pixels.
+    """
+
+    size: int
+    max_bytes: int
+    scale_step: float | None
+    rotation_step: int | None
+    hits: int
+    misses: int
+
+    def __init__(
+        self,
+        size: int,
+        max_bytes: int = 256 * 2**20,
+        scale_step: float | None = None,
+        rotation_step: int | None = None,
+    ) -> None:
+        self.size = size
+        self.max_bytes = max_bytes
+        self.scale_step = scale_step
+        self.rotation_step = rotation_step
+        self.hits = 0
+        self.misses = 0
+        # Keyed by id(source) and resampling filter. The source is kept so its id can't be reused.
+        self._masters: dict[tuple[int, int], tuple[Symbol, Image.Image]] = {}
+        self._variants: ImageLRU[Image.Image] = ImageLRU(max_bytes)
+        self._lock = threading.Lock()
+
+    def settings(self) -> dict:
+        """Get the arguments this cache was made with."""
+        return {
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "scale_step": self.scale_step,
+            "rotation_step": self.rotation_step,
+        }
+
+    def __getstate__(self) -> dict:
+        # Only the settings are sent to other processes, which will fill their own caches.
+        return self.settings()
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)  # pylint: disable=unnecessary-dunder-call
+
+    @property
+    def current_bytes(self) -> int:
+        """How many bytes of pixels the transformed symbols kept take up."""
+        return self._variants.current_bytes
+
+    @property
+    def quantized(self) -> bool:
+        """Whether placements are rounded so that they can share transformed images."""
+        return self.scale_step is not None or self.rotation_step is not None
+
+    def master(self, image: Symbol, quality: str = "default") -> Image.Image:
+        """
+        Get `image` scaled down to the largest size it can be drawn at on a card, resampled as the
+        preset `quality` says.
+        """
+        resample = get_quality(quality).resize
+        key = (id(image), resample)
+        with self._lock:
+            if key in self._masters:
+                return self._masters[key][1]
+        source = as_image(image)
+        dimensions = to_complex(source.size)
+        scale = 2 * MAX_RADIUS * self.size / abs(dimensions)
+        if scale < 1:
+            master = source.resize(to_int_tuple(dimensions * scale), resample)
+        else:
+            master = source
+        with self._lock:
+            self._masters[key] = (image, master)
+        return master
+
+    def _key(
+        self, image: Symbol, info: RandomizeImageInfo, quality: str
+    ) -> tuple[int, tuple[int, int], int, str]:
+        """Get the (possibly rounded) size and rotation for a symbol placed with `info`."""
+        diameter = info.radius * 2
+        if self.scale_step is not None:
+            # A fraction of the card the symbol is drawn on, which is smaller for a preview.
+            step = self.scale_step * info.size
+            # Round down so a symbol never gets bigger than the space it was given.
+            diameter = max(math.floor(diameter / step), 1) * step
+        rotation = info.rotation
+        if self.rotation_step is not None:
+            rotation = round(rotation / self.rotation_step) * self.rotation_step % 360
+        dimensions = to_complex(image.size)
+        return (
+            id(image),
+            to_int_tuple(dimensions * diameter / abs(dimensions)),
+            rotation,
+            quality,
+        )
+
+    def get(
+        self, image: Symbol, info: RandomizeImageInfo, quality: str = "default"
+    ) -> Image.Image:
+        """
+        Get `image` scaled and rotated as given by `info`, resampled as the preset `quality`
+        says.
+        """
+        key = self._key(image, info, quality)
+        if self.quantized:
+            found = self._variants.get(key)
+            with self._lock:
+                if found is not None:
+                    self.hits += 1
+                    return found
+                self.misses += 1
+        _, resized_size, rotation, _ = key
+        resample = get_quality(quality)
+        resized = self.master(image, quality).resize(resized_size, resample.resize)
+        rotated = resized.rotate(
+            rotation, resample.rotate, expand=True, fillcolor=BACKGROUND
+        )
+        if self.quantized:
+            self._variants.put(key, rotated)
+        return rotated
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters and the memory used, to help tune the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "variants": len(self._variants),
+                "masters": len(self._masters),
+                "bytes": self.current_bytes,
+            }
@@ -1,30 +1,184 @@
 """Utilities for the Spot It application."""
 
-import functools
+import bisect
+import concurrent.futures
+import hashlib
+import itertools
 import random
+import threading
 import typing
+import weakref
 from pathlib import Path
-from typing import Iterable, TypeVar
+from typing import Iterable, TypeVar, Union
 
 from PIL import Image
 
+from . import profiling
+
 T = TypeVar("T")
 S = TypeVar("S")
 
+# The file each decoded symbol came from, by id, so it is hashed the same way whether or not it
+# was decoded: see `image_digest`. This isn't kept in `Image.info`, since Pillow copies that to
+# every image made from one, which would then be hashed as the untouched file.
+_sources: dict[int, tuple[weakref.ref, Path]] = {}
+
+
+def set_source(image: Image.Image, path: Path | str):
+    """Remember that `image` is the symbol decoded from `path`, as long as it exists."""
+    key = id(image)
+
+    def forget(reference: weakref.ref):
+        if _sources.get(key, (None,))[0] is reference:
+            del _sources[key]
+
+    _sources[key] = (weakref.ref(image, forget), Path(path))
+
 
 def create_mapping(seq1: Iterable[T], seq2: Iterable[S]) -> dict[T, S]:
     """Create a mapping between to sequences of possibly different types."""
     return dict(zip(seq1, seq2))
 
 
-def get_images(directory: Path) -> list[Image.Image]:
+class LazySymbol:
+    """
+    A symbol image that is only decoded when it is first needed. Only the header of the file is
+    read to begin with, for the size.
+
+    If `max_dimension` is given, the image is shrunk by a whole factor while it is loaded, as long
+    as its larger side stays at least `max_dimension`. Pickling a lazy symbol only sends the path,
+    so another process decodes the file itself.
+    """
+
+    path: Path
+    max_dimension: int | None
+
+    def __init__(self, path: Path, max_dimension: int | None = None) -> None:
+        self.path = path
+        self.max_dimension = max_dimension
+        self._image: Image.Image | None = None
+        self._lock = threading.Lock()
+        with Image.open(path) as image:
+            self._header_size = image.size
+
+    def __getstate__(self) -> dict:
+        return {"path": self.path, "max_dimension": self.max_dimension}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)  # pylint: disable=unnecessary-dunder-call
+
+    def _reduce_factor(self, size: tuple[int, int]) -> int:
+        """How much an image of `size` can be shrunk while it is loaded."""
+        if self.max_dimension is None:
+            return 1
+        return max(1, max(size) // self.max_dimension)
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """The size of the image once it is loaded."""
+        if self._image is not None:
+            return self._image.size
+        factor = self._reduce_factor(self._header_size)
+        return (
+            -(-self._header_size[0] // factor),
+            -(-self._header_size[1] // factor),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the image has been decoded yet."""
+        return self._image is not None
+
+    def load(self) -> Image.Image:
+        """Decode the image, if it hasn't been already, and return it in RGBA."""
+        with self._lock:
+            if self._image is None:
+                with profiling.stage("decode"), Image.open(self.path) as image:
+                    # Formats like JPEG can decode at a smaller size in the first place.
+                    image.draft(None, self.size)
+                    factor = self._reduce_factor(image.size)
+                    decoded = image.reduce(factor) if factor > 1 else image
+                    self._image = decoded.convert("RGBA")
+                set_source(self._image, self.path)
+            return self._image
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.path!r})"
+
+
+Symbol = Union[Image.Image, LazySymbol]
+
+
+def as_image(symbol: Symbol) -> Image.Image:
+    """Get the image for a symbol, decoding it if it is a `LazySymbol`."""
+    if isinstance(symbol, LazySymbol):
+        return symbol.load()
+    return symbol
+
+
+def load_symbols(symbols: Iterable[Symbol], workers: int | None = None) -> list[Image.Image]:
+    """Decode symbols in a pool of `workers` threads."""
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(as_image, symbols))
+
+
+def get_images(
+    directory: Path,
+    max_dimension: int | None = None,
+    lazy: bool = False,
+    workers: int | None = None,
+) -> list[Symbol]:
     """
-    Return a list of all PNGs in a directory.
+    Return a list of all PNGs in a directory, sorted by name.
+
+    If `lazy` is True, the images are `LazySymbol`s which are decoded when they are first used.
+    Otherwise, they are all decoded by a pool of `workers` threads. If `max_dimension` is given,
+    images that are much larger than that are shrunk while they are loaded.
     """
-    images = []
-    for file in directory.glob("*.png", case_sensitive=False):
-        images.append(Image.open(file).convert("RGBA"))
-    return images
+    symbols: list[Symbol] = [
+        LazySymbol(file, max_dimension)
+        for file in sorted(directory.iterdir())
+        if file.is_file() and file.suffix.lower() == ".png"
+    ]
+    if lazy:
+        return symbols
+    return load_symbols(symbols, workers)
+
+
+def card_seed(seed: int | str, index: int) -> str:
+    """Derive the seed for the card at `index` from the seed for the whole deck."""
+    return f"{seed}:{index}"
+
+
+def card_rng(seed: int | str, index: int) -> random.Random:
+    """
+    Get an independent random number generator for the card at `index` in the deck seeded with
+    `seed`. It does not depend on any other card, so one card can be made again on its own.
+    """
+    return random.Random(card_seed(seed, index))
+
+
+def rng_or_global(rng: random.Random | None) -> random.Random:
+    """Use `rng`, or the global random number generator if it is None."""
+    if rng is None:
+        return random  # type: ignore[return-value]
+    return rng
+
+
+def image_digest(image: Symbol) -> str:
+    """
+    Get a hash of the contents of an image. For a `LazySymbol`, or a symbol decoded from a file,
+    the file is hashed, so that it doesn't need to be decoded and the hash is the same either way.
+    Images made from a decoded symbol, like rotated copies, are hashed by their pixels.
+    """
+    if isinstance(image, LazySymbol):
+        return hashlib.sha256(image.path.read_bytes()).hexdigest()
+    reference, path = _sources.get(id(image), (None, None))
+    if reference is not None and reference() is image:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    digest = hashlib.sha256(f"{image.mode} {image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
 
 
 def to_int_tuple(complex_number: complex) -> tuple[int, int]:
@@ -37,46 +191,96 @@ def to_complex(ints: tuple[int, int]) -> complex:
     return ints[0] + ints[1] * 1j
 
 
+def _lower_bound(float_range: tuple[float, float]) -> float:
+    return float_range[0]
+
+
 class FloatRange:
     """
     A class to represent a set of ranges of floats.
+
+    The ranges are kept sorted and merged, with their lower and upper bounds in two lists. Two
+    sets are combined in one pass over both, and `in` and `random` use a binary search.
     """
 
-    ranges: list[tuple[float, float]]
+    __slots__ = ("_lowers", "_uppers", "_cumulative", "_backwards")
+
+    _lowers: list[float]
+    _uppers: list[float]
+    # Running totals of the lengths of the ranges, for `random`. Made when it is first needed.
+    _cumulative: list[float] | None
+    # Whether any range is backwards, so that the running totals aren't sorted.
+    _backwards: bool
 
     def __init__(self, *initial_ranges: tuple[float, float]):
-        self.ranges = list(initial_ranges)
-        self.__cleanup()
-
-    def __cleanup(self) -> typing.Self:
-        self.ranges = sorted(self.ranges, key=lambda float_range: float_range[0])
-        if not self.ranges:
-            return self
-        merged = [self.ranges[0]]
-        for current in self.ranges[1:]:
-            previous = merged[-1]
-            if current[0] <= previous[1]:
-                upper_bound = max(previous[1], current[1])
-                merged[-1] = (previous[0], upper_bound)  # merge with the previous range
+        self._assign(sorted(initial_ranges, key=_lower_bound))
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[tuple[float, float]]) -> "FloatRange":
+        """Make a FloatRange from any number of ranges at once, in any order."""
+        return cls._from_sorted(sorted(ranges, key=_lower_bound))
+
+    @classmethod
+    def _from_sorted(cls, ranges: Iterable[tuple[float, float]]) -> "FloatRange":
+        float_range = cls.__new__(cls)
+        float_range._assign(ranges)
+        return float_range
+
+    def _assign(self, ranges: Iterable[tuple[float, float]]) -> typing.Self:
+        """Set the ranges from ranges sorted by their lower bounds, merging any that overlap."""
+        lowers: list[float] = []
+        uppers: list[float] = []
+        for lower, upper in ranges:
+            if lowers and lower <= uppers[-1]:
+                if upper > uppers[-1]:
+                    uppers[-1] = upper  # merge with the previous range
             else:
-                merged.append(current)
-        self.ranges = merged
+                lowers.append(lower)
+                uppers.append(upper)
+        self._lowers = lowers
+        self._uppers = uppers
+        self._cumulative = None
         return self
 
-    def random(self) -> float:
+    @property
+    def ranges(self) -> list[tuple[float, float]]:
+        """The ranges, sorted and merged."""
+        return list(zip(self._lowers, self._uppers))
+
+    @ranges.setter
+    def ranges(self, ranges: Iterable[tuple[float, float]]):
+        self._assign(sorted(ranges, key=_lower_bound))
+
+    def copy(self) -> "FloatRange":
+        """Get a copy, to change in place without changing this one."""
+        return FloatRange._from_sorted(self.ranges)
+
+    def random(self, rng: random.Random | None = None) -> float:
         """
         Generate a random float value within the specified ranges.
 
+        Args:
+            rng: The random number generator to use. The global one is used if it is None.
+
         Returns:
             A random float value within the specified ranges.
         """
-        total_length = sum(upper - lower for lower, upper in self.ranges)
-        random_value = random.random() * total_length
-        for lower, upper in self.ranges:
-            random_value -= upper - lower
-            if random_value <= 0:
-                return upper + random_value
-        return self.ranges[-1][1]
+        if self._cumulative is None:
+            lengths = [upper - lower for lower, upper in zip(self._lowers, self._uppers)]
+            self._cumulative = list(itertools.accumulate(lengths))
+            self._backwards = any(length < 0 for length in lengths)
+        cumulative = self._cumulative
+        random_value = rng_or_global(rng).random() * (cumulative[-1] if cumulative else 0)
+        if self._backwards:
+            index = next(
+                (index for index, total in enumerate(cumulative) if random_value <= total),
+                len(cumulative),
+            )
+        else:
+            index = bisect.bisect_left(cumulative, random_value)
+        if index == len(cumulative):
+            return self._uppers[-1]
+        return self._uppers[index] + (random_value - cumulative[index])
 
     def with_buffer(self, buffer: float) -> "FloatRange":
         """
@@ -88,15 +292,80 @@ class FloatRange:
         Returns:
             A new FloatRange object with the buffer added to every range.
         """
-        return FloatRange(
-            *((lower - buffer, upper + buffer) for lower, upper in self.ranges)
+        profiling.count("floatrange_ops")
+        # Moving every lower bound by the same amount keeps them sorted.
+        return FloatRange._from_sorted(
+            (lower - buffer, upper + buffer)
+            for lower, upper in zip(self._lowers, self._uppers)
         )
 
     def __contains__(self, value: float) -> bool:
-        for lower, upper in self.ranges:
-            if lower <= value <= upper:
-                return True
-        return False
+        # Ranges don't overlap, so only the last range that starts at or before `value` can
+        # contain it.
+        index = bisect.bisect_right(self._lowers, value) - 1
+        return index >= 0 and value <= self._uppers[index]
+
+    def _union(
+        self, other: typing.Self | tuple[float, float]
+    ) -> list[tuple[float, float]]:
+        other_ranges = [other] if isinstance(other, tuple) else other.ranges
+        # Both lists are already sorted, so this only merges them, in linear time.
+        return sorted(self.ranges + other_ranges, key=_lower_bound)
+
+    def _difference(
+        self, other: typing.Self | tuple[float, float]
+    ) -> list[tuple[float, float]]:
+        # Ranges that are a single point or backwards remove nothing.
+        removed = [
+            (lower, upper)
+            for lower, upper in ([other] if isinstance(other, tuple) else other.ranges)
+            if lower < upper
+        ]
+        result: list[tuple[float, float]] = []
+        first = 0
+        for cur_lower, cur_upper in zip(self._lowers, self._uppers):
+            if not cur_lower < cur_upper:
+                result.append((cur_lower, cur_upper))
+                continue
+            # Skip the removed ranges that end before this one, which end before the rest too.
+            while first < len(removed) and removed[first][1] < cur_lower:
+                first += 1
+            lower: float | None = cur_lower
+            for remove_lower, remove_upper in itertools.islice(removed, first, None):
+                if remove_lower > cur_upper:
+                    break
+                if remove_upper < lower:
+                    continue
+                if remove_lower > lower:
+                    result.append((lower, remove_lower))
+                if remove_upper >= cur_upper:
+                    lower = None
+                    break
+                lower = remove_upper
+            if lower is not None:
+                result.append((lower, cur_upper))
+        return result
+
+    def _intersection(self, other: "FloatRange") -> list[tuple[float, float]]:
+        lowers, uppers = self._lowers, self._uppers
+        other_lowers, other_uppers = other._lowers, other._uppers
+        result: list[tuple[float, float]] = []
+        index = other_index = 0
+        while index < len(lowers) and other_index < len(other_lowers):
+            upper, other_upper = uppers[index], other_uppers[other_index]
+            lower = max(lowers[index], other_lowers[other_index])
+            # Ranges that are backwards have nothing in common with anything.
+            if (
+                lower <= min(upper, other_upper)
+                and lowers[index] <= upper
+                and other_lowers[other_index] <= other_upper
+            ):
+                result.append((lower, min(upper, other_upper)))
+            if upper < other_upper:
+                index += 1
+            else:
+                other_index += 1
+        return result
 
     def __add__(self, other: typing.Self | tuple[float, float]) -> "FloatRange":
         """
@@ -108,9 +377,13 @@ class FloatRange:
         Returns:
             A new FloatRange object representing the union of the two FloatRanges.
         """
-        if isinstance(other, tuple):
-            return FloatRange(*self.ranges, other)
-        return FloatRange(*self.ranges, *other.ranges)
+        profiling.count("floatrange_ops")
+        return FloatRange._from_sorted(self._union(other))
+
+    def update(self, other: typing.Self | tuple[float, float]) -> typing.Self:
+        """Add `other` to this FloatRange in place. See __add__."""
+        profiling.count("floatrange_ops")
+        return self._assign(self._union(other))
 
     def __sub__(self, other: tuple[float, float] | typing.Self) -> "FloatRange":
         """
@@ -122,23 +395,13 @@ class FloatRange:
         Returns:
             The FloatRange object which is the subtraction (?) of the two FloatRanges.
         """
-        if isinstance(other, tuple):
-            result_ranges = []
-            lower, upper = other
-            for cur_lower, cur_upper in self.ranges:
-                if cur_lower < lower < upper < cur_upper:
-                    result_ranges.append((cur_lower, lower))
-                    result_ranges.append((upper, cur_upper))
-                elif lower <= cur_lower < cur_upper <= upper:
-                    continue
-                elif cur_lower < lower <= cur_upper <= upper:
-                    result_ranges.append((cur_lower, lower))
-                elif lower <= cur_lower <= upper < cur_upper:
-                    result_ranges.append((upper, cur_upper))
-                else:
-                    result_ranges.append((cur_lower, cur_upper))
-            return FloatRange(*result_ranges)
-        return functools.reduce(FloatRange.__sub__, other.ranges, self)
+        profiling.count("floatrange_ops")
+        return FloatRange._from_sorted(self._difference(other))
+
+    def difference_update(self, other: tuple[float, float] | typing.Self) -> typing.Self:
+        """Remove `other` from this FloatRange in place. See __sub__."""
+        profiling.count("floatrange_ops")
+        return self._assign(self._difference(other))
 
     def __or__(self, other: typing.Self | tuple) -> "FloatRange":
         """
@@ -156,18 +419,13 @@ class FloatRange:
         Returns:
             A new FloatRange object representing the intersection of the two FloatRanges.
         """
-        result_ranges = []
-        for lower, upper in self.ranges:
-            for other_lower, other_upper in other.ranges:
-                if other_lower <= lower <= upper <= other_upper:
-                    result_ranges.append((lower, upper))
-                elif lower <= other_lower <= other_upper <= upper:
-                    result_ranges.append((other_lower, other_upper))
-                elif other_lower <= lower <= other_upper <= upper:
-                    result_ranges.append((lower, other_upper))
-                elif lower <= other_lower <= upper <= other_upper:
-                    result_ranges.append((other_lower, upper))
-        return FloatRange(*result_ranges)
+        profiling.count("floatrange_ops")
+        return FloatRange._from_sorted(self._intersection(other))
+
+    def intersection_update(self, other: "FloatRange") -> typing.Self:
+        """Keep only the parts of this FloatRange that are also in `other`, in place."""
+        profiling.count("floatrange_ops")
+        return self._assign(self._intersection(other))
 
     def __and__(self, other: "FloatRange") -> "FloatRange":
         """
@@ -175,6 +433,10 @@ class FloatRange:
         """
         return self.intersection(other)
 
+    __iadd__ = __ior__ = update
+    __isub__ = difference_update
+    __iand__ = intersection_update
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.ranges})"
 
@@ -182,4 +444,4 @@ class FloatRange:
         return " ∪ ".join(f"[{lower}, {upper}]" for lower, upper in self.ranges)
 
     def __bool__(self) -> bool:
-        return len(self.ranges) >= 1
+        return len(self._lowers) >= 1
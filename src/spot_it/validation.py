@@ -0,0 +1,111 @@
+"""Check that a Spot It! deck has exactly one symbol in common between every pair of cards."""
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # Pillow is only needed to check symbols, so that the plane alone can be checked quickly.
+    from .utils import Symbol
+
+
+class DeckValidationError(ValueError):
+    """Exception raised when a deck does not have exactly one match between every two cards"""
+
+
+@dataclass
+class ValidationReport:
+    """The result of checking a deck."""
+
+    cards: int
+    symbols: int
+    # (first card, second card, number of symbols in common) for every pair that isn't 1
+    bad_pairs: list[tuple[int, int, int]] = field(default_factory=list)
+    # Cards that have the same symbol more than once
+    repeated_on_card: list[int] = field(default_factory=list)
+    # Groups of symbol numbers whose images are the same
+    duplicate_symbols: list[list[int]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """Whether every pair of cards has exactly one symbol in common."""
+        return not (self.bad_pairs or self.repeated_on_card)
+
+    def __str__(self) -> str:
+        if self.ok:
+            return f"{self.cards} cards with {self.symbols} symbols: every pair matches once."
+        problems = [
+            f"cards {first} and {second} have {count} symbols in common"
+            for first, second, count in self.bad_pairs[:10]
+        ]
+        if len(self.bad_pairs) > 10:
+            problems.append(f"and {len(self.bad_pairs) - 10} more pairs")
+        problems.extend(
+            f"card {card} has the same symbol more than once"
+            for card in self.repeated_on_card[:10]
+        )
+        problems.extend(
+            f"symbols {', '.join(map(str, group))} are the same image"
+            for group in self.duplicate_symbols
+        )
+        return f"{self.cards} cards with {self.symbols} symbols: " + "; ".join(problems)
+
+
+def symbol_classes(symbols: Sequence["Symbol"]) -> list[int]:
+    """
+    Number each symbol by its contents, so that identical images (for example, the same file
+    copied twice) get the same number.
+    """
+    from .utils import image_digest  # pylint: disable=import-outside-toplevel
+
+    numbers: dict[str, int] = {}
+    return [numbers.setdefault(image_digest(image), len(numbers)) for image in symbols]
+
+
+def validate_deck(
+    lines: Sequence[Sequence[int]] | np.ndarray,
+    symbols: Sequence["Symbol"] | None = None,
+) -> ValidationReport:
+    """
+    Check that every pair of cards has exactly one symbol in common. `lines` holds the symbol
+    numbers on each card. If the symbol images are given, symbols with identical images count as
+    the same symbol.
+
+    The number of symbols two cards share is found for every pair at once by multiplying the
+    card/symbol incidence matrix by its transpose.
+    """
+    lines = np.asarray(lines)
+    if symbols is not None:
+        classes = np.asarray(symbol_classes(symbols))
+        lines = classes[lines]
+    number_of_symbols = int(lines.max()) + 1 if lines.size else 0
+    incidence = np.zeros((len(lines), number_of_symbols), dtype=np.float32)
+    incidence[np.arange(len(lines))[:, None], lines] = 1
+    shared = (incidence @ incidence.T).astype(np.int64)
+    report = ValidationReport(len(lines), number_of_symbols)
+    bad_first, bad_second = np.nonzero(np.triu(shared != 1, 1))
+    report.bad_pairs = [
+        (int(first), int(second), int(shared[first, second]))
+        for first, second in zip(bad_first, bad_second)
+    ]
+    report.repeated_on_card = np.flatnonzero(
+        np.diagonal(shared) != lines.shape[1]
+    ).tolist()
+    if symbols is not None:
+        groups: dict[int, list[int]] = {}
+        for symbol, number in enumerate(classes.tolist()):
+            groups.setdefault(number, []).append(symbol)
+        report.duplicate_symbols = [group for group in groups.values() if len(group) > 1]
+    return report
+
+
+def check_deck(
+    lines: Sequence[Sequence[int]] | np.ndarray,
+    symbols: Sequence["Symbol"] | None = None,
+) -> ValidationReport:
+    """Like `validate_deck`, but raise a `DeckValidationError` if the deck is not valid."""
+    report = validate_deck(lines, symbols)
+    if not report.ok:
+        raise DeckValidationError(str(report))
+    return report
@@ -0,0 +1,402 @@
+"""
+Keep a deck warm in a long-running process, and only make again the cards that a change to the
+symbols affects.
+
+`WarmDeck` keeps the decoded symbols, the plane and the layout of every card in memory, so a
+change to one symbol only costs decoding it and drawing the cards it is on. Requests are lines of
+JSON, like `{"command": "refresh"}`, answered with a line of JSON each. `serve` takes them from a
+stream like stdin, and `serve_socket` from connections to a socket on this machine.
+"""
+
+import concurrent.futures
+import json
+import pathlib
+import socketserver
+import threading
+import time
+from typing import Callable, Iterable, TextIO
+
+from PIL import Image
+
+from . import images, outputs, pdfs, projective_plane, utils
+from .layouts import load_or_build
+from .randomization import RandomizeImageInfo
+from .spot_it import RESOLUTION, deck_placements
+from .symbol_cache import ImageLRU, image_bytes
+
+# How often the symbols are looked at for changes, in seconds.
+INTERVAL = 0.5
+# How many bytes of symbols as they are drawn on cards are kept between refreshes.
+TRANSFORMED_BYTES = 256 * 2**20
+
+
+def _signature(path: pathlib.Path) -> tuple[int, int]:
+    """Get the size and modification time of `path`, which change when it is written."""
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+class TransformedSymbols:
+    """
+    Symbols scaled and rotated as they are drawn on cards, kept so that a card with one changed
+    symbol only transforms that one again. At most `max_bytes` bytes of pixels are kept, with the
+    least recently used dropped first. It is passed to `images.composite_card` as its `cache`, and
+    draws exactly what drawing without one does.
+    """
+
+    def __init__(self, max_bytes: int = TRANSFORMED_BYTES) -> None:
+        # Keyed by id(source) and the placement. The source is kept so its id can't be reused.
+        self._symbols: ImageLRU[tuple[Image.Image, Image.Image]] = ImageLRU(
+            max_bytes, lambda kept: image_bytes(kept[1])
+        )
+
+    @property
+    def max_bytes(self) -> int:
+        """How many bytes of pixels are kept at most."""
+        return self._symbols.max_bytes
+
+    def get(
+        self, image: Image.Image, info: RandomizeImageInfo, quality: str = "default"
+    ) -> Image.Image:
+        """Get `image` transformed as `images.make_image_random` does."""
+        key = (id(image), info.center, info.radius, info.rotation, quality)
+        found = self._symbols.get(key)
+        if found is not None:
+            return found[1]
+        transformed = images.make_image_random(image, info, quality=quality)
+        self._symbols.put(key, (image, transformed))
+        return transformed
+
+    def forget(self, image: Image.Image):
+        """Drop every transformed copy of `image`, which has changed."""
+        self._symbols.drop(lambda key: key[0] == id(image))
+
+
+class WarmDeck:
+    """
+    The deck made from the PNGs in `directory` with `seed` and the other options as for
+    `spot_it.DeckOptions`, kept in memory and written to `output_dir` with `backend` (PNGs by
+    default). Cards are numbered from 1, as their files are. The whole deck is made when it is
+    created. Symbols are kept as they are drawn on each card too: see `TransformedSymbols`.
+
+    Methods can be called from many threads; one request is carried out at a time.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        output_dir: pathlib.Path,
+        seed: int | str,
+        resolution: int = RESOLUTION,
+        engine: str = "rejection",
+        quality: str = "default",
+        canvas: str = "rgba",
+        backend: outputs.OutputBackend | None = None,
+        layouts_path: pathlib.Path | None = None,
+        pdf_dpi: int | None = None,
+    ) -> None:
+        images.get_quality(quality)
+        images.get_canvas(canvas)
+        self.directory = directory
+        self.output_dir = output_dir
+        self.seed = seed
+        self.resolution = resolution
+        self.engine = engine
+        self.quality = quality
+        self.canvas = canvas
+        self.backend = outputs.PNGBackend() if backend is None else backend
+        self.layouts_path = layouts_path
+        self.pdf_dpi = pdf_dpi
+        self.paths: list[pathlib.Path] = []
+        self.signatures: list[tuple[int, int]] = []
+        self.symbols: list[Image.Image] = []
+        self.lines: list[list[int]] = []
+        self.placements: list[list[RandomizeImageInfo]] = []
+        self._transformed = TransformedSymbols()
+        self._lock = threading.Lock()
+        with self._lock:
+            self._load(self._scan())
+
+    @property
+    def _largest(self) -> int:
+        return images.largest_symbol(images.drawn_size(self.resolution, self.quality))
+
+    def _scan(self) -> list[pathlib.Path]:
+        """Find the PNGs in the directory, in the order `utils.get_images` has them."""
+        return [
+            file
+            for file in sorted(self.directory.iterdir())
+            if file.is_file() and file.suffix.lower() == ".png"
+        ]
+
+    def _load(self, paths: list[pathlib.Path]) -> list[int]:
+        """Decode every symbol in `paths`, lay out every card, and make the whole deck."""
+        signatures = [_signature(path) for path in paths]
+        symbols = utils.load_symbols(
+            [utils.LazySymbol(path, self._largest) for path in paths]
+        )
+        library = None
+        if self.layouts_path is not None:
+            order = projective_plane.get_order(len(symbols))
+            library = load_or_build(self.layouts_path, order + 1, self.resolution)
+        laid_out = list(
+            deck_placements(
+                len(symbols), self.resolution, self.seed, self.engine, library
+            )
+        )
+        self.symbols = symbols
+        self._transformed = TransformedSymbols(self._transformed.max_bytes)
+        self.lines = [line for line, _ in laid_out]
+        self.placements = [placements for _, placements in laid_out]
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.backend.suffix is not None:
+            # Cards past the end of a deck that got smaller would be left behind.
+            for file in self.output_dir.glob(f"*{self.backend.suffix}"):
+                if file.stem.isdigit() and int(file.stem) > len(self.lines):
+                    file.unlink()
+        made = self._render(range(len(self.lines)))
+        # Only now are the symbols drawn, so if anything failed, the next refresh tries again.
+        self.paths, self.signatures = paths, signatures
+        return made
+
+    def _render(self, cards: Iterable[int]) -> list[int]:
+        """Draw and write the cards at `cards` (counting from 0), returning their numbers."""
+        drawn = images.drawn_size(self.resolution, self.quality)
+
+        def draw(index: int) -> int:
+            placements = self.placements[index]
+            if drawn != self.resolution:
+                placements = [info.scaled(drawn) for info in placements]
+            card = images.composite_card(
+                [self.symbols[point] for point in self.lines[index]],
+                placements,
+                drawn,
+                self._transformed,
+                quality=self.quality,
+                canvas=self.canvas,
+            )
+            self.backend.write(card, self.output_dir / str(index + 1))
+            return index + 1
+
+        # Pillow lets go of the GIL while it draws and encodes, so threads draw cards at once.
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            return list(pool.map(draw, cards))
+
+    def refresh(self) -> list[int]:
+        """
+        Look for symbols that changed since they were read, decode them again, and make the cards
+        they are on again. If PNGs were added or removed, the plane changes, so the whole deck is
+        made again. Returns the numbers of the cards that were made.
+        """
+        with self._lock:
+            paths = self._scan()
+            if paths != self.paths:
+                return self._load(paths)
+            # Signatures are read before decoding, so a write while it is decoded is found next
+            # time, but kept only once the cards are drawn, so a failure is tried again.
+            signatures = {
+                index: signature
+                for index, signature in enumerate(map(_signature, paths))
+                if signature != self.signatures[index]
+            }
+            for index in signatures:
+                self._transformed.forget(self.symbols[index])
+                self.symbols[index] = utils.LazySymbol(paths[index], self._largest).load()
+            made = self._render(
+                index
+                for index, line in enumerate(self.lines)
+                if signatures.keys() & set(line)
+            )
+            for index, signature in signatures.items():
+                self.signatures[index] = signature
+            return made
+
+    def render(self, numbers: Iterable[int] | None = None) -> list[int]:
+        """Make the cards numbered `numbers` (every card by default) again, as they are now."""
+        with self._lock:
+            if numbers is None:
+                return self._render(range(len(self.lines)))
+            cards = [int(number) - 1 for number in numbers]
+            for index in cards:
+                if not 0 <= index < len(self.lines):
+                    raise ValueError(
+                        f"There is no card {index + 1} in a deck of {len(self.lines)}."
+                    )
+            return self._render(cards)
+
+    def pdf(self) -> pathlib.Path:
+        """
+        Write `cards.pdf` from the layouts of the cards, as `spot_it.deck` does with
+        `vector_pdf=True`, without drawing any cards. Returns its path.
+        """
+        with self._lock:
+            path = self.output_dir / "cards.pdf"
+            writer = pdfs.VectorPdfWriter(path, self.pdf_dpi)
+            for line, placements in zip(self.lines, self.placements):
+                writer.add_layout(
+                    [self.symbols[point] for point in line], placements, self.resolution
+                )
+            writer.save()
+            return path
+
+    def status(self) -> dict:
+        """Describe the deck."""
+        with self._lock:
+            return {
+                "symbols": len(self.symbols),
+                "cards": len(self.lines),
+                "seed": self.seed,
+                "output": str(self.output_dir),
+            }
+
+
+# What each command does, and the response it gets.
+COMMANDS: dict[str, Callable[[WarmDeck, dict], dict]] = {
+    "refresh": lambda deck, request: {"cards": deck.refresh()},
+    "render": lambda deck, request: {"cards": deck.render(request.get("cards"))},
+    "pdf": lambda deck, request: {"path": str(deck.pdf())},
+    "status": lambda deck, request: deck.status(),
+}
+
+
+def handle(deck: WarmDeck, request: object) -> dict:
+    """Carry out `request`, a decoded line of JSON, and get the response."""
+    start = time.perf_counter()
+    try:
+        if not isinstance(request, dict):
+            raise ValueError("A request is a JSON object, like {\"command\": \"status\"}.")
+        command = COMMANDS.get(request.get("command"))
+        if command is None:
+            raise ValueError(
+                f"Unknown command {request.get('command')!r}. Choose from "
+                f"{', '.join([*COMMANDS, 'quit'])}."
+            )
+        response = command(deck, request)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        return {"ok": False, "error": str(error)}
+    return {"ok": True, **response, "seconds": round(time.perf_counter() - start, 4)}
+
+
+def _watch(
+    deck: WarmDeck, interval: float, send: Callable[[dict], None], stop: threading.Event
+):
+    """Refresh `deck` every `interval` seconds until `stop` is set, sending what was made."""
+    while not stop.wait(interval):
+        start = time.perf_counter()
+        try:
+            cards = deck.refresh()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            send({"event": "error", "error": str(error)})
+            continue
+        if cards:
+            seconds = round(time.perf_counter() - start, 4)
+            send({"event": "refreshed", "cards": cards, "seconds": seconds})
+
+
+def _sender(stream: TextIO) -> Callable[[dict], None]:
+    """Make a function that writes messages to `stream` as lines of JSON, from any thread."""
+    lock = threading.Lock()
+
+    def send(message: dict):
+        with lock:
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+
+    return send
+
+
+def _answer(deck: WarmDeck, requests: Iterable[str], send: Callable[[dict], None]):
+    """Answer each line of `requests` until there are no more or one says to quit."""
+    for line in requests:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            send({"ok": False, "error": f"The request isn't JSON: {error}"})
+            continue
+        if isinstance(request, dict) and request.get("command") == "quit":
+            send({"ok": True})
+            return
+        send(handle(deck, request))
+
+
+def serve(
+    deck: WarmDeck,
+    requests: TextIO,
+    responses: TextIO,
+    interval: float | None = INTERVAL,
+):
+    """
+    Answer the requests in `requests`, a line of JSON each, with a line of JSON each in
+    `responses`, until there are no more or `{"command": "quit"}`. Unless `interval` is None, the
+    symbols are also looked at every `interval` seconds, and cards that are made again because
+    they changed are sent as `{"event": "refreshed", ...}` lines.
+    """
+    send = _sender(responses)
+    stop = threading.Event()
+    if interval is not None:
+        threading.Thread(
+            target=_watch, args=(deck, interval, send, stop), daemon=True
+        ).start()
+    try:
+        _answer(deck, requests, send)
+    finally:
+        stop.set()
+
+
+def serve_socket(
+    deck: WarmDeck,
+    port: int = 0,
+    host: str = "127.0.0.1",
+    interval: float | None = INTERVAL,
+    ready: Callable[[tuple[str, int]], None] | None = None,
+):
+    """
+    Answer requests from connections to a TCP socket at `host` and `port` (any free port by
+    default), each as `serve` does, until the process is interrupted. `ready` is called with the
+    address once connections are taken. Unless `interval` is None, the symbols are looked at for
+    changes every `interval` seconds, whether or not anything is connected, and the events `serve`
+    sends are sent to every connection.
+    """
+    clients: set[Callable[[dict], None]] = set()
+    clients_lock = threading.Lock()
+
+    def send_all(message: dict):
+        with clients_lock:
+            sends = list(clients)
+        for send in sends:
+            try:
+                send(message)
+            except OSError:
+                pass  # The connection closed, and its handler will drop it.
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            lines = (line.decode("utf-8") for line in self.rfile)
+            lock = threading.Lock()
+
+            def send(message: dict):
+                with lock:
+                    self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+
+            with clients_lock:
+                clients.add(send)
+            try:
+                _answer(deck, lines, send)
+            finally:
+                with clients_lock:
+                    clients.discard(send)
+
+    stop = threading.Event()
+    if interval is not None:
+        threading.Thread(
+            target=_watch, args=(deck, interval, send_all, stop), daemon=True
+        ).start()
+    with socketserver.ThreadingTCPServer((host, port), Handler) as server:
+        if ready is not None:
+            ready(server.server_address[:2])
+        try:
+            server.serve_forever()
+        finally:
+            stop.set()
@@ -0,0 +1,28 @@
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def symbols():
+    """Make `count` plain symbols, each a different colour."""
+
+    def make(count: int) -> list[Image.Image]:
+        return [
+            Image.new("RGBA", (40, 40), (index * 10, 0, 0, 255)) for index in range(count)
+        ]
+
+    return make
+
+
+@pytest.fixture
+def write_symbols():
+    """Save `count` plain symbols as PNGs in a new `directory`."""
+
+    def write(directory, count: int):
+        directory.mkdir()
+        for index in range(count):
+            Image.new("RGBA", (40, 40), (index * 10, 0, 0, 255)).save(
+                directory / f"{index}.png"
+            )
+
+    return write
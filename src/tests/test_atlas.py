@@ -0,0 +1,46 @@
+import concurrent.futures
+import os
+import pickle
+
+from PIL import Image
+
+from ..spot_it import atlas, spot_it, utils
+
+
+def test_atlas_matches_decoded_symbols(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    symbols = atlas.load_or_build(tmp_path / "symbols.atlas", tmp_path / "symbols")
+    decoded = utils.get_images(tmp_path / "symbols")
+    assert len(symbols) == 7
+    assert [image.tobytes() for image in symbols] == [
+        image.tobytes() for image in decoded
+    ]
+    assert symbols[2] is symbols[2]
+    copy = pickle.loads(pickle.dumps(symbols))
+    assert copy[5].tobytes() == decoded[5].tobytes()
+    first = [card.tobytes() for card, _ in spot_it.deck_generator(symbols, 50, seed=1)]
+    second = [card.tobytes() for card, _ in spot_it.deck_generator(decoded, 50, seed=1)]
+    assert first == second
+
+
+def test_atlas_is_made_again_when_symbols_change(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    path = tmp_path / "symbols.atlas"
+    atlas.load_or_build(path, tmp_path / "symbols").close()
+    Image.new("RGBA", (20, 30), (0, 0, 255, 255)).save(tmp_path / "symbols" / "3.png")
+    stat = os.stat(tmp_path / "symbols" / "3.png")
+    os.utime(tmp_path / "symbols" / "3.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert atlas.load_or_build(path, tmp_path / "symbols")[3].size == (20, 30)
+
+
+def test_shared_atlas_in_workers(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 3)
+    decoded = utils.get_images(tmp_path / "symbols")
+    with atlas.shared(decoded) as symbols:
+        with concurrent.futures.ProcessPoolExecutor(2) as pool:
+            sizes = list(pool.map(_first_size, [symbols, symbols]))
+    assert sizes == [(40, 40), (40, 40)]
+
+
+def _first_size(symbols: atlas.SymbolAtlas) -> tuple[int, int]:
+    return symbols[0].size
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+import weakref
+
+from PIL import Image
+
+from ..spot_it import batch, images, outputs, pdfs, progress, spot_it, utils
+
+
+def test_batch(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    jobs = [
+        batch.DeckJob(tmp_path / "symbols", tmp_path / "first", seed=1, resolution=50),
+        batch.DeckJob(tmp_path / "missing", tmp_path / "broken", resolution=50),
+        batch.DeckJob(
+            tmp_path / "symbols", tmp_path / "second", seed=2, resolution=50, pdf=False
+        ),
+    ]
+    events = []
+    results = batch.run_batch(jobs, workers=2, max_in_flight=3, progress=events.append)
+    assert [result.ok for result in results] == [True, False, True]
+    assert results[0].cards == 7
+    assert len(list((tmp_path / "first").glob("*.png"))) == 7
+    assert (tmp_path / "first" / "cards.pdf").is_file()
+    assert not (tmp_path / "second" / "cards.pdf").exists()
+    stages = [event.stage for event in events if event.deck == jobs[0].label]
+    assert stages[0] == progress.STARTED
+    assert stages.count(progress.CARD) == 7
+    assert stages[-1] == progress.FINISHED
+    symbols = utils.get_images(tmp_path / "symbols", images.largest_symbol(50), lazy=True)
+    with Image.open(tmp_path / "first" / "3.png") as card:
+        assert card.tobytes() == spot_it.deck_card(symbols, 2, 1, 50).tobytes()
+
+
+def test_deck_events(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    job = batch.DeckJob(tmp_path / "symbols", tmp_path / "deck", resolution=50)
+
+    async def collect():
+        return [event async for event in batch.deck_events([job], workers=1)]
+
+    events = asyncio.run(collect())
+    assert events[-1] == progress.ProgressEvent(job.label, progress.FINISHED, 7, 7)
+
+
+def test_cards_on_the_pdf_count_against_the_limit(tmp_path, write_symbols, monkeypatch):
+    write_symbols(tmp_path / "symbols", 13)
+    cards: list[weakref.ref] = []
+    live = []
+    lock = threading.Lock()
+    write = outputs.PNGBackend.write
+    prepare_card = pdfs.prepare_card
+
+    def tracked_write(self, image, stem):
+        with lock:
+            cards.append(weakref.ref(image))
+            live.append(sum(card() is not None for card in cards))
+        return write(self, image, stem)
+
+    def slow_prepare_card(image, dpi):
+        time.sleep(0.05)
+        with lock:
+            live.append(sum(card() is not None for card in cards))
+        return prepare_card(image, dpi)
+
+    monkeypatch.setattr(outputs.PNGBackend, "write", tracked_write)
+    monkeypatch.setattr(pdfs, "prepare_card", slow_prepare_card)
+    job = batch.DeckJob(tmp_path / "symbols", tmp_path / "deck", seed=1, resolution=50)
+    (result,) = batch.run_batch([job], workers=1, max_in_flight=2)
+    assert result.ok
+    assert max(live) <= 2
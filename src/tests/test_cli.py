@@ -0,0 +1,77 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from ..spot_it.__main__ import main
+
+
+def test_plan_and_check(tmp_path, capsys, write_symbols):
+    write_symbols(tmp_path / "symbols", 13)
+    main(["plan", "--images", str(tmp_path / "symbols"), "--resolution", "100"])
+    output = capsys.readouterr().out
+    assert "Cards:            13" in output
+    assert "Symbols per card: 4" in output
+    main(["check", "--images", str(tmp_path / "symbols")])
+    assert "every pair matches once" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main(["plan", "--images", str(tmp_path / "missing")])
+
+
+def test_check_does_not_import_pillow(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    code = (
+        "import sys; from src.spot_it.__main__ import main; "
+        f"main(['check', '--images', {str(tmp_path / 'symbols')!r}]); "
+        "assert not {'PIL', 'tqdm', 'reportlab'} & set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=pathlib.Path(__file__).parents[2])
+
+
+def test_plan_does_not_import_numpy(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    code = (
+        "import sys; from src.spot_it.__main__ import main; "
+        f"main(['plan', '--images', {str(tmp_path / 'symbols')!r}]); "
+        "assert not {'numpy', 'PIL'} & set(sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=pathlib.Path(__file__).parents[2])
+
+
+def test_dry_run_writes_nothing(tmp_path, capsys, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    main(
+        [
+            "--images",
+            str(tmp_path / "symbols"),
+            "--output",
+            str(tmp_path / "out"),
+            "--resolution",
+            "50",
+            "--seed",
+            "1",
+            "--dry-run",
+        ]
+    )
+    assert "Made 7 cards" in capsys.readouterr().out
+    assert not (tmp_path / "out").exists()
+
+
+
+@pytest.mark.parametrize(
+    "option", [["--cache-dir", "cache"], ["--cards", "1-3"], ["--shard", "1/2"]]
+)
+def test_options_that_need_a_seed(tmp_path, write_symbols, option):
+    write_symbols(tmp_path / "symbols", 7)
+    with pytest.raises(SystemExit, match="needs a seed"):
+        main(["--images", str(tmp_path / "symbols"), "--output", str(tmp_path), *option])
+
+
+def test_symbol_cache(tmp_path, capsys, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    options = ["--images", str(tmp_path / "symbols"), "--resolution", "50", "--dry-run"]
+    main([*options, "--symbol-cache", "--rotation-step", "15"])
+    assert "Made 7 cards" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main([*options, "--scale-step", "2"])
@@ -65,3 +65,36 @@ def test_contains():
 def test_union():
     float_range = FloatRange((0, 1), (1.5, 2.5)) + (3, 4)
     assert float_range.ranges == [(0, 1), (1.5, 2.5), (3, 4)]
+
+def test_from_ranges():
+    float_range = FloatRange.from_ranges((lower, lower + 2) for lower in (4, 0, 2))
+    assert float_range.ranges == [(0, 6)]
+    assert FloatRange.from_ranges([]).ranges == []
+
+
+def test_difference():
+    float_range = FloatRange((0, 10)) - FloatRange((1, 2), (4, 5), (9, 12))
+    assert float_range.ranges == [(0, 1), (2, 4), (5, 9)]
+    float_range = FloatRange((0, 1), (2, 3), (4, 5)) - (0.5, 4.5)
+    assert float_range.ranges == [(0, 0.5), (4.5, 5)]
+    assert not FloatRange((1, 2)) - (0, 3)
+
+
+def test_intersection():
+    float_range = FloatRange((0, 2), (3, 5), (6, 8)) & FloatRange((1, 3.5), (7, 9))
+    assert float_range.ranges == [(1, 2), (3, 3.5), (7, 8)]
+    assert (FloatRange((0, 1)) & FloatRange((1, 2))).ranges == [(1, 1)]
+    assert not FloatRange((0, 1)) & FloatRange((2, 3))
+
+
+def test_in_place():
+    float_range = FloatRange((0, 1))
+    same = float_range
+    float_range += (2, 3)
+    float_range -= (0.5, 2.5)
+    float_range &= FloatRange((0, 2.75))
+    assert float_range is same
+    assert float_range.ranges == [(0, 0.5), (2.5, 2.75)]
+    copy = float_range.copy()
+    copy.update(FloatRange((0, 3)))
+    assert float_range.ranges == [(0, 0.5), (2.5, 2.75)]
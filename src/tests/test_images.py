@@ -0,0 +1,42 @@
+import random
+
+from PIL import Image
+
+from ..spot_it import images, profiling
+from ..spot_it.outputs import flatten
+
+
+def test_blend_matches_alpha_composite():
+    card = images.get_circle(20)
+    symbol = Image.new("RGBA", (30, 30), images.BACKGROUND)
+    symbol.paste((200, 10, 10, 128), (5, 8, 20, 25))
+    for location in [(3, 4), (-6, 12), (25, 25)]:
+        expected = card.copy()
+        layer = Image.new("RGBA", card.size, (0, 0, 0, 0))
+        layer.paste(symbol, location)
+        expected = Image.alpha_composite(expected, layer)
+        blended = card.copy()
+        images.blend(blended, symbol, location)
+        assert blended.tobytes() == expected.tobytes()
+
+
+def test_circle_is_not_shared():
+    first = images.get_circle(10)
+    first.putpixel((10, 10), (1, 2, 3, 255))
+    assert images.get_circle(10).getpixel((10, 10)) == images.BACKGROUND
+
+
+def test_canvases():
+    symbol = Image.new("RGBA", (30, 30), images.BACKGROUND)
+    symbol.paste((200, 10, 10, 128), (5, 8, 20, 25))
+    cards = {}
+    recorder = profiling.Recorder()
+    for canvas in images.CANVASES:
+        with profiling.recording(recorder), profiling.card(len(cards)):
+            cards[canvas] = images.spot_it_card(
+                [symbol] * 3, 50, rng=random.Random(1), canvas=canvas
+            )
+    assert cards["rgb"].tobytes() == flatten(cards["rgba"], (255, 255, 255)).tobytes()
+    assert cards["gray"].mode == "L"
+    peaks = [card["peaks"]["card_bytes"] for card in recorder.to_dict()["cards"]]
+    assert peaks[2] < peaks[0] == recorder.peaks["card_bytes"]
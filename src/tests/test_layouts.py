@@ -0,0 +1,40 @@
+import pytest
+
+from ..spot_it import spot_it
+from ..spot_it.layouts import LayoutLibrary, build_library
+from ..spot_it.placement import BOUNDARY
+
+
+def test_save_and_load(tmp_path):
+    library = build_library(4, 100, layouts=8)
+    library.save(tmp_path / "layouts.npz")
+    loaded = LayoutLibrary.load(tmp_path / "layouts.npz")
+    assert len(loaded) == 8
+    assert loaded.count == 4
+    assert loaded.digest() == library.digest()
+
+
+def test_placements_fit_at_any_size():
+    library = build_library(6, 1000, layouts=8)
+    for seed in range(8):
+        placements = library.placements(6, 300, spot_it.utils.card_rng(1, seed))
+        for info in placements:
+            assert abs(info.center) + info.radius <= 300 * BOUNDARY + 1e-9
+            for other in placements:
+                if other is not info:
+                    assert info.dont_overlap(other)
+
+
+def test_wrong_count():
+    with pytest.raises(ValueError):
+        build_library(4, 100, layouts=1).placements(5, 100)
+
+
+def test_deck_from_library(symbols):
+    library = build_library(3, 50, layouts=4)
+    images = symbols(7)
+    deck = [
+        card.tobytes()
+        for card, _ in spot_it.deck_generator(images, 50, seed=3, layouts=library)
+    ]
+    assert spot_it.deck_card(images, 2, 3, 50, layouts=library).tobytes() == deck[2]
@@ -0,0 +1,50 @@
+import pickle
+
+from PIL import Image
+
+from ..spot_it.utils import LazySymbol, as_image, get_images, image_digest
+
+
+def make_pngs(directory, count, size=(400, 300)):
+    for index in range(count):
+        Image.new("RGBA", size, (index, 0, 0, 255)).save(directory / f"{index}.PNG")
+    (directory / "notes.txt").write_text("not an image")
+
+
+def test_lazy_until_used(tmp_path):
+    make_pngs(tmp_path, 3)
+    symbols = get_images(tmp_path, lazy=True)
+    assert len(symbols) == 3
+    assert not any(symbol.loaded for symbol in symbols)
+    assert symbols[0].size == (400, 300)
+    assert as_image(symbols[0]).mode == "RGBA"
+    assert symbols[0].loaded
+
+
+def test_reduced_on_load(tmp_path):
+    make_pngs(tmp_path, 1)
+    symbol = LazySymbol(tmp_path / "0.PNG", max_dimension=100)
+    assert symbol.size == (100, 75)
+    assert as_image(symbol).size == (100, 75)
+
+
+def test_eager_and_pickle(tmp_path):
+    make_pngs(tmp_path, 2)
+    images = get_images(tmp_path, workers=2)
+    assert all(isinstance(image, Image.Image) for image in images)
+    symbol = LazySymbol(tmp_path / "1.PNG")
+    symbol.load()
+    copy = pickle.loads(pickle.dumps(symbol))
+    assert not copy.loaded
+    assert as_image(copy).tobytes() == images[1].tobytes()
+    assert image_digest(copy) == image_digest(symbol)
+
+
+def test_changed_symbols_are_hashed_by_pixels(tmp_path):
+    make_pngs(tmp_path, 1)
+    symbol = LazySymbol(tmp_path / "0.PNG")
+    loaded = symbol.load()
+    assert image_digest(loaded) == image_digest(symbol)
+    rotated = loaded.rotate(90)
+    assert rotated.size == loaded.size
+    assert image_digest(rotated) != image_digest(symbol)
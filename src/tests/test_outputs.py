@@ -0,0 +1,81 @@
+import pytest
+from PIL import Image, ImageChops, ImageStat, features
+
+from ..spot_it import outputs
+from ..spot_it.render_cache import RenderCache
+
+
+def card() -> Image.Image:
+    image = Image.new("RGBA", (64, 64), (255, 255, 255, 0))
+    image.paste((200, 30, 30, 255), (10, 10, 40, 50))
+    return image
+
+
+def test_png_round_trip(tmp_path):
+    sizes = []
+    for level in (0, 9):
+        backend = outputs.get_backend("png", compress_level=level)
+        path = backend.write(card(), tmp_path / str(level))
+        assert path == tmp_path / f"{level}.png"
+        with Image.open(path) as written:
+            assert written.tobytes() == card().tobytes()
+        sizes.append(path.stat().st_size)
+    assert sizes[1] < sizes[0]
+    assert backend.stats.cards == 1 and backend.stats.bytes == sizes[1]
+
+
+def test_png_copies_cached_cards_at_the_same_level(tmp_path):
+    noise = Image.effect_noise((64, 64), 64).convert("RGBA")
+    cache = RenderCache(tmp_path / "cache")
+    cache.put("card", noise)
+    sizes = {}
+    for level in (outputs.DEFAULT_COMPRESS_LEVEL, 0):
+        path = outputs.get_backend("png", compress_level=level).write(
+            cache.get("card"), tmp_path / str(level)
+        )
+        with Image.open(path) as written:
+            assert written.tobytes() == noise.tobytes()
+        sizes[level] = path.stat().st_size
+    assert sizes[outputs.DEFAULT_COMPRESS_LEVEL] == cache.path("card").stat().st_size
+    assert sizes[0] > sizes[outputs.DEFAULT_COMPRESS_LEVEL]
+
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow was built without WebP")
+def test_webp_round_trip(tmp_path):
+    path = outputs.get_backend("webp").write(card(), tmp_path / "card")
+    assert path.suffix == ".webp"
+    with Image.open(path) as written:
+        # Lossless WebP keeps what can be seen, but not the colour of transparent pixels.
+        white = (255, 255, 255)
+        assert (
+            outputs.flatten(written.convert("RGBA"), white).tobytes()
+            == outputs.flatten(card(), white).tobytes()
+        )
+
+
+def test_webp_needs_pillow_support(monkeypatch):
+    monkeypatch.setattr(features, "check", lambda feature: False)
+    with pytest.raises(ValueError, match="without webp"):
+        outputs.get_backend("webp")
+    assert outputs.get_backend("png").name == "png"
+
+
+def test_jpeg_round_trip(tmp_path):
+    path = outputs.get_backend("jpeg").write(card(), tmp_path / "card")
+    assert path.suffix == ".jpg"
+    with Image.open(path) as written:
+        assert written.mode == "RGB"
+        expected = outputs.flatten(card(), (255, 255, 255))
+        difference = ImageStat.Stat(ImageChops.difference(written, expected))
+        assert max(difference.mean) < 4
+
+
+def test_pdf_only_writes_nothing(tmp_path):
+    backend = outputs.get_backend("pdf-only")
+    assert backend.write(card(), tmp_path / "card") is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_backends_need_encode():
+    with pytest.raises(TypeError):
+        outputs.OutputBackend()  # pylint: disable=abstract-class-instantiated
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from ..spot_it import outputs, pdfs, spot_it
+
+
+def test_vector_pdf(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 13)
+    options = {"directory": tmp_path / "symbols", "seed": 3, "resolution": 200}
+    spot_it.deck(output_dir=tmp_path / "raster", **options)
+    spot_it.deck(output_dir=tmp_path / "vector", vector_pdf=True, **options)
+    spot_it.deck(
+        output_dir=tmp_path / "only",
+        vector_pdf=True,
+        backend=outputs.PdfOnlyBackend(),
+        **options,
+    )
+    for number in range(1, 14):
+        assert (tmp_path / "vector" / f"{number}.png").read_bytes() == (
+            tmp_path / "raster" / f"{number}.png"
+        ).read_bytes()
+    assert not (tmp_path / "only" / "1.png").exists()
+    vector = (tmp_path / "only" / "cards.pdf").stat().st_size
+    assert vector * 3 < (tmp_path / "raster" / "cards.pdf").stat().st_size
+    with pytest.raises(ValueError, match="split"):
+        spot_it.deck(
+            output_dir=tmp_path / "split", vector_pdf=True, pages_per_pdf=2, **options
+        )
+    with pytest.raises(ValueError, match="merge"):
+        spot_it.deck(
+            output_dir=tmp_path / "part", vector_pdf=True, cards=range(3), **options
+        )
+
+
+def test_pdf_split_into_files(tmp_path):
+    writer = pdfs.ShardedPdfWriter(tmp_path, pages_per_file=1)
+    for index in range(13):
+        writer.add(Image.new("RGB", (20, 20), (index, 0, 0)))
+    paths = writer.save()
+    assert [path.name for path in paths] == [
+        "cards-1-6.pdf",
+        "cards-7-12.pdf",
+        "cards-13-13.pdf",
+    ]
+    assert all(path.is_file() for path in paths)
+    assert sorted(tmp_path.iterdir()) == sorted(paths)
+
+
+def test_pdf_dpi(tmp_path):
+    card = Image.effect_noise((600, 600), 64).convert("RGB")
+    assert pdfs.prepare_card(card, 100).size == (350, 350)
+    assert pdfs.prepare_card(card, 1000) is card
+    sizes = []
+    for dpi in (None, 50):
+        writer = pdfs.ShardedPdfWriter(tmp_path / str(dpi), dpi)
+        (tmp_path / str(dpi)).mkdir()
+        writer.add(card)
+        (path,) = writer.save()
+        sizes.append(path.stat().st_size)
+    assert sizes[1] < sizes[0] / 10
+
+
+def test_one_pdf_is_encoded_in_many_threads(tmp_path, monkeypatch):
+    encode_card = pdfs.encode_card
+    threads = set()
+
+    def slow_encode_card(image, dpi=None):
+        threads.add(threading.get_ident())
+        time.sleep(0.02)
+        return encode_card(image, dpi)
+
+    monkeypatch.setattr(pdfs, "encode_card", slow_encode_card)
+    writer = pdfs.ShardedPdfWriter(tmp_path, workers=4)
+    for index in range(8):
+        writer.add(Image.new("RGB", (20, 20), (index, 0, 0)))
+    (path,) = writer.save()
+    assert path.name == "cards.pdf" and writer.stats.cards == 8
+    assert len(threads) > 1
+
+
+def test_pdf_threads_stop_when_saving_fails(tmp_path, monkeypatch):
+    threads = threading.active_count()
+
+    def fail(_):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pdfs.PdfWriter, "save", fail)
+    writer = pdfs.ShardedPdfWriter(tmp_path, pages_per_file=1)
+    for _ in range(8):
+        writer.add(Image.new("RGB", (20, 20)))
+    with pytest.raises(OSError, match="disk full"):
+        writer.save()
+    assert threading.active_count() == threads
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from ..spot_it import profiling
+from ..spot_it.placement import BOUNDARY, layout_card
+
+
+@pytest.mark.parametrize("engine", ["rejection", "vectorized", "packed", "template"])
+def test_layout_fits(engine):
+    random.seed(0)
+    placements = layout_card(6, 100, engine)
+    assert len(placements) == 6
+    for info in placements:
+        assert abs(info.center) + info.radius <= 100 * BOUNDARY + 1e-9
+        for other in placements:
+            if other is not info:
+                assert info.dont_overlap(other)
+
+
+def test_vectorized_dense_card():
+    random.seed(0)
+    assert len(layout_card(10, 100, "vectorized")) == 10
+
+
+@pytest.mark.parametrize("count", [14, 18])
+def test_vectorized_falls_back_on_crowded_cards(count):
+    recorder = profiling.Recorder()
+    with profiling.recording(recorder):
+        placements = layout_card(count, 100, "vectorized", random.Random(0))
+    assert len(placements) == count
+    assert recorder.counters["packed_fallbacks"] == 1
+    for info in placements:
+        for other in placements:
+            if other is not info:
+                assert info.dont_overlap(other)
+
+
+@pytest.mark.parametrize("count", [8, 18, 32])
+def test_packed_never_starts_over(count):
+    recorder = profiling.Recorder()
+    with profiling.recording(recorder):
+        placements = layout_card(count, 100, "packed", random.Random(0))
+    assert len(placements) == count
+    assert "layout_restarts" not in recorder.counters
+    for info in placements:
+        assert abs(info.center) + info.radius <= 100 * BOUNDARY + 1e-9
+        for other in placements:
+            if other is not info:
+                assert info.dont_overlap(other)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        layout_card(3, 100, "nope")
@@ -0,0 +1,31 @@
+from ..spot_it import profiling, spot_it
+
+
+def test_nothing_recorded_without_recorder():
+    profiling.count("things")
+    with profiling.stage("stage"):
+        pass
+    assert profiling.active() is None
+
+
+def test_stages_and_counters_per_card(symbols):
+    recorder = profiling.Recorder()
+    with profiling.recording(recorder):
+        cards = list(spot_it.deck_generator(symbols(7), 50, seed=3))
+    report = recorder.to_dict()
+    assert len(report["cards"]) == len(cards)
+    assert report["stages"]["card"]["calls"] == len(cards)
+    assert report["stages"]["layout"]["calls"] == len(cards)
+    assert report["stages"]["transform"]["calls"] == 7 * 3
+    assert report["counters"]["random_image_info"] == sum(
+        card["counters"]["random_image_info"] for card in report["cards"]
+    )
+
+
+def test_profiling_does_not_change_deck(symbols):
+    plain = [card.tobytes() for card, _ in spot_it.deck_generator(symbols(7), 50, seed=3)]
+    with profiling.recording(profiling.Recorder()):
+        profiled = [
+            card.tobytes() for card, _ in spot_it.deck_generator(symbols(7), 50, seed=3)
+        ]
+    assert plain == profiled
@@ -0,0 +1,70 @@
+import itertools
+
+import pytest
+
+from ..spot_it import spot_it
+from ..spot_it.projective_plane import (
+    PointAtInfinity,
+    ProjectivePlane,
+    ProjectivePlaneError,
+    all_points,
+    points_at_infinity,
+)
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 4, 5, 7, 8, 9])
+def test_lines_meet_once(order):
+    plane = ProjectivePlane(order)
+    lines = [set(line) for line in plane.lines.tolist()]
+    assert len(lines) == order**2 + order + 1
+    assert all(len(line) == order + 1 for line in lines)
+    for first, second in itertools.combinations(range(len(lines)), 2):
+        common = lines[first] & lines[second]
+        assert common == {plane.common_point(first, second)}
+
+
+@pytest.mark.parametrize("order", [1, 3, 4, 9])
+def test_line_through(order):
+    plane = ProjectivePlane(order)
+    for first, second in itertools.combinations(range(plane.size), 2):
+        line = plane.line_through(first, second)
+        assert first in plane.lines[line] and second in plane.lines[line]
+        assert line in plane.point_lines[first] and line in plane.point_lines[second]
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 5, 7])
+def test_same_as_modular_lines_for_primes(order):
+    points = {point: index for index, point in enumerate(all_points(order))}
+    infinity_points = list(points_at_infinity(order))
+    lines = [
+        [points[point] for point in line]
+        for infinity_point in infinity_points
+        for line in PointAtInfinity.lines(infinity_point)
+    ]
+    lines.append([points[point] for point in infinity_points])
+    assert ProjectivePlane(order).lines.tolist() == lines
+
+
+def test_no_plane():
+    with pytest.raises(ProjectivePlaneError):
+        ProjectivePlane(6)
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 4, 8, 9, 11])
+def test_line_without_table(order):
+    plane = ProjectivePlane(order)
+    found = [plane.line(index) for index in range(plane.size)]
+    assert "lines" not in vars(plane)
+    assert found == plane.lines.tolist()
+    with pytest.raises(IndexError):
+        plane.line(plane.size)
+
+
+def test_deck_of_three_symbols(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 3)
+    spot_it.deck(directory=tmp_path / "symbols", output_dir=tmp_path / "deck", resolution=50)
+    assert sorted(path.name for path in (tmp_path / "deck").glob("*.png")) == [
+        "1.png",
+        "2.png",
+        "3.png",
+    ]
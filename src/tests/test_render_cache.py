@@ -0,0 +1,50 @@
+import pytest
+from PIL import Image
+
+from ..spot_it import spot_it
+
+
+def test_hits_with_any_number_of_workers(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    options = {
+        "directory": tmp_path / "symbols",
+        "seed": 2,
+        "resolution": 50,
+        "cache_dir": tmp_path / "cache",
+        "dry_run": True,
+    }
+    spot_it.deck(workers=1, **options)
+    for workers in (2, 1):
+        counters = spot_it.deck(workers=workers, **options).counters
+        assert counters["render_cache_hits"] == 7
+        assert "render_cache_misses" not in counters
+
+
+def test_misses_after_changes(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    options = spot_it.DeckOptions(
+        directory=tmp_path / "symbols",
+        seed=2,
+        resolution=50,
+        cache_dir=tmp_path / "cache",
+        dry_run=True,
+    )
+
+    def counters(**changes):
+        return spot_it.deck(options, **changes).counters
+
+    assert counters()["render_cache_misses"] == 7
+    assert counters()["render_cache_hits"] == 7
+    assert counters(resolution=60)["render_cache_misses"] == 7
+    assert counters(seed=3)["render_cache_misses"] == 7
+    assert counters(quality="preview")["render_cache_misses"] == 7
+    Image.new("RGBA", (40, 40), (0, 0, 255, 255)).save(tmp_path / "symbols" / "0.png")
+    changed = counters()
+    # Symbol 0 is on three of the seven cards.
+    assert changed["render_cache_misses"] == 3
+    assert changed["render_cache_hits"] == 4
+
+
+def test_needs_a_seed(tmp_path):
+    with pytest.raises(ValueError, match="seed"):
+        spot_it.DeckOptions(cache_dir=tmp_path / "cache")
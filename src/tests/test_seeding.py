@@ -0,0 +1,40 @@
+from ..spot_it import spot_it
+
+
+def test_card_can_be_made_alone(symbols):
+    images = symbols(7)
+    deck = [card.tobytes() for card, _ in spot_it.deck_generator(images, 50, seed=3)]
+    assert spot_it.deck_card(images, 4, 3, 50).tobytes() == deck[4]
+
+
+def test_same_seed_same_deck(symbols):
+    images = symbols(7)
+    first = [card.tobytes() for card, _ in spot_it.deck_generator(images, 50, seed=3)]
+    second = [card.tobytes() for card, _ in spot_it.deck_generator(images, 50, seed=3)]
+    assert first == second
+
+
+def test_workers_make_the_same_deck(symbols):
+    images = symbols(7)
+    serial = [card.tobytes() for card, _ in spot_it.deck_generator(images, 50, seed=3)]
+    pooled = [
+        card.tobytes()
+        for card, _ in spot_it.deck_generator(images, 50, workers=2, seed=3)
+    ]
+    assert pooled == serial
+
+
+def test_preview_has_the_same_layout(symbols):
+    images = symbols(7)
+    full = spot_it.deck_card(images, 4, 3, 200, quality="print")
+    preview = spot_it.deck_card(images, 4, 3, 200, quality="preview")
+    assert preview.size == (100, 100)
+    # Where the symbols are, which should match up to the edges that come out differently when
+    # drawn so small. A different layout differs in about a quarter of the card.
+    full_mask = full.getchannel("A").resize(preview.size).point(lambda a: a > 128)
+    preview_mask = preview.getchannel("A").point(lambda a: a > 128)
+    different = sum(
+        first != second
+        for first, second in zip(full_mask.tobytes(), preview_mask.tobytes())
+    )
+    assert different < 0.05 * 100 * 100
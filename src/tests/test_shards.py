@@ -0,0 +1,44 @@
+import pytest
+
+from ..spot_it import shards, spot_it
+
+
+def test_shard_ranges_cover_the_deck():
+    parts = [shards.shard_range(183, shard, 4) for shard in range(1, 5)]
+    assert [index for part in parts for index in part] == list(range(183))
+    assert max(map(len, parts)) - min(map(len, parts)) <= 1
+
+
+def test_merged_parts_match_whole_deck(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    options = {"directory": tmp_path / "symbols", "seed": 4, "resolution": 50}
+    spot_it.deck(output_dir=tmp_path / "whole", **options)
+    for shard in (1, 2):
+        spot_it.deck(
+            output_dir=tmp_path / f"part{shard}",
+            cards=shards.shard_range(7, shard, 2),
+            **options,
+        )
+    assert not (tmp_path / "part1" / "cards.pdf").exists()
+    with pytest.raises(ValueError, match="aren't in any part"):
+        shards.merge([tmp_path / "part1"], tmp_path / "merged")
+    shards.merge([tmp_path / "part1", tmp_path / "part2"], tmp_path / "merged")
+    for number in range(1, 8):
+        assert (tmp_path / "merged" / f"{number}.png").read_bytes() == (
+            tmp_path / "whole" / f"{number}.png"
+        ).read_bytes()
+    assert (tmp_path / "merged" / "cards.pdf").is_file()
+
+
+def test_parts_of_different_decks(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    for seed, cards in ((1, range(0, 3)), (2, range(3, 7))):
+        spot_it.deck(
+            directory=tmp_path / "symbols",
+            output_dir=tmp_path / f"seed{seed}",
+            seed=seed,
+            resolution=50,
+            cards=cards,
+        )
+    with pytest.raises(ValueError, match="seed"):
+        shards.merge([tmp_path / "seed1", tmp_path / "seed2"], tmp_path / "merged")
@@ -0,0 +1,62 @@
+import threading
+import time
+import weakref
+
+from PIL import Image
+
+from ..spot_it import outputs, pdfs, spot_it
+
+
+class SlowBackend(outputs.PNGBackend):
+    """Write PNGs slowly, counting how many are done."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.done = 0
+        self._count_lock = threading.Lock()
+
+    def encode(self, image, path):
+        time.sleep(0.01)
+        super().encode(image, path)
+        with self._count_lock:
+            self.done += 1
+
+
+def test_stream_in_order_with_backpressure(tmp_path):
+    backend = SlowBackend()
+    outstanding = []
+
+    def cards():
+        for index in range(12):
+            outstanding.append(index - backend.done)
+            yield Image.new("RGB", (4, 4), (index, 0, 0)), []
+
+    spot_it.stream_deck(cards(), tmp_path, 3, backend=backend, make_pdf=False)
+    assert max(outstanding) == 3
+    for number in range(1, 13):
+        with Image.open(tmp_path / f"{number}.png") as card:
+            assert card.getpixel((0, 0)) == (number - 1, 0, 0)
+
+
+def test_cards_on_the_pdf_count_against_max_in_flight(tmp_path, monkeypatch):
+    prepare_card = pdfs.prepare_card
+
+    def slow_prepare_card(image, dpi):
+        time.sleep(0.02)
+        return prepare_card(image, dpi)
+
+    monkeypatch.setattr(pdfs, "prepare_card", slow_prepare_card)
+    made: list[weakref.ref] = []
+    live = []
+
+    def cards():
+        for index in range(12):
+            live.append(sum(card() is not None for card in made))
+            card = Image.new("RGB", (4, 4), (index, 0, 0))
+            made.append(weakref.ref(card))
+            yield card, []
+            del card
+
+    pdf = spot_it.stream_deck(cards(), tmp_path, 3)
+    assert max(live) <= 3
+    assert pdf is not None and pdf.added == 12
@@ -0,0 +1,87 @@
+import math
+
+from PIL import Image
+
+from ..spot_it import spot_it
+from ..spot_it.randomization import RandomizeImageInfo
+from ..spot_it.symbol_cache import ImageLRU, SymbolCache
+
+
+def placement(radius: float, rotation: int) -> RandomizeImageInfo:
+    info = RandomizeImageInfo(100, [])
+    info.radius = radius
+    info.rotation = rotation
+    return info
+
+
+def test_master_is_downsampled():
+    image = Image.new("RGBA", (1000, 1000))
+    cache = SymbolCache(100)
+    master = cache.master(image)
+    assert max(master.size) <= 2 * 100 * 4 / 5
+    assert cache.master(image) is master
+
+
+def test_masters_are_resampled_for_the_quality():
+    image = Image.effect_noise((1000, 1000), 64).convert("RGBA")
+    cache = SymbolCache(100)
+    master = cache.master(image)
+    smooth = cache.master(image, "print")
+    assert smooth is not master and cache.master(image, "print") is smooth
+    assert smooth.tobytes() == image.resize(master.size, Image.LANCZOS).tobytes()
+    assert smooth.tobytes() != master.tobytes()
+
+
+def test_quantized_hits():
+    image = Image.new("RGBA", (300, 300))
+    cache = SymbolCache(100, scale_step=0.1, rotation_step=10)
+    first = cache.get(image, placement(50.5, 3))
+    second = cache.get(image, placement(51.5, 1))
+    assert first is second
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_scale_step_follows_drawn_size():
+    image = Image.new("RGBA", (300, 300))
+    cache = SymbolCache(100, scale_step=0.1)
+    # Placements on a card laid out at 100 pixels, drawn at 50 for a preview.
+    info = placement(28.8, 0)
+    info.center = 0j
+    drawn = cache.get(image, info.scaled(50))
+    # Rounded down by at most a step of the drawn card, and a pixel each way.
+    assert 28.8 - 0.1 * 50 - 2 <= math.hypot(*drawn.size) <= 28.8
+
+
+def test_lru_bound():
+    image = Image.new("RGBA", (300, 300))
+    cache = SymbolCache(100, max_bytes=1, rotation_step=1)
+    cache.get(image, placement(50, 0))
+    cache.get(image, placement(50, 90))
+    assert cache.stats()["variants"] <= 1
+
+
+def test_image_lru():
+    images = ImageLRU(2 * 10 * 10 * 4)
+    for key in "abc":
+        images.put(key, Image.new("RGBA", (10, 10)))
+        images.get("a")
+    assert images.get("b") is None
+    assert images.get("a") is not None and images.get("c") is not None
+    images.drop(lambda key: key == "a")
+    assert len(images) == 1 and images.current_bytes == 10 * 10 * 4
+
+
+def test_deck_with_symbol_cache(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    cache = SymbolCache(50, rotation_step=90)
+    spot_it.deck(
+        directory=tmp_path / "symbols",
+        output_dir=tmp_path / "deck",
+        resolution=50,
+        symbol_cache=cache,
+    )
+    assert len(list((tmp_path / "deck").glob("*.png"))) == 7
+    stats = cache.stats()
+    assert stats["masters"] == 7
+    assert stats["hits"] + stats["misses"] == 7 * 3
@@ -0,0 +1,27 @@
+from PIL import Image
+
+import pytest
+
+from ..spot_it.projective_plane import ProjectivePlane
+from ..spot_it.validation import DeckValidationError, check_deck, validate_deck
+
+
+@pytest.mark.parametrize("order", [2, 4, 31])
+def test_plane_is_valid(order):
+    assert validate_deck(ProjectivePlane(order).lines).ok
+
+
+def test_bad_pair():
+    report = validate_deck([[0, 1], [0, 1], [1, 2]])
+    assert report.bad_pairs == [(0, 1, 2)]
+
+
+def test_duplicate_images():
+    lines = ProjectivePlane(2).lines
+    symbols = [Image.new("RGBA", (2, 2), (index, 0, 0, 255)) for index in range(7)]
+    symbols[6] = symbols[0].copy()
+    report = validate_deck(lines, symbols)
+    assert not report.ok
+    assert report.duplicate_symbols == [[0, 6]]
+    with pytest.raises(DeckValidationError):
+        check_deck(lines, symbols)
@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import socket
+import threading
+
+import pytest
+from PIL import Image
+
+from ..spot_it import spot_it, watch
+
+
+def touch(path):
+    """Make a file look written a second after it was, so its signature changes."""
+    modified = path.stat().st_mtime_ns + 10**9
+    os.utime(path, ns=(modified, modified))
+
+
+def test_only_changed_cards_are_made(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    options = {"seed": 4, "resolution": 50}
+    deck = watch.WarmDeck(tmp_path / "symbols", tmp_path / "warm", **options)
+    assert deck.refresh() == []
+    symbol = tmp_path / "symbols" / "0.png"
+    Image.new("RGBA", (40, 40), (0, 0, 200, 255)).save(symbol)
+    touch(symbol)
+    made = deck.refresh()
+    assert made == [number for number, line in enumerate(deck.lines, 1) if 0 in line]
+    spot_it.deck(directory=tmp_path / "symbols", output_dir=tmp_path / "cold", **options)
+    for number in range(1, 8):
+        assert (tmp_path / "warm" / f"{number}.png").read_bytes() == (
+            tmp_path / "cold" / f"{number}.png"
+        ).read_bytes()
+
+
+def test_failed_refresh_is_tried_again(tmp_path, write_symbols, monkeypatch):
+    write_symbols(tmp_path / "symbols", 7)
+    deck = watch.WarmDeck(tmp_path / "symbols", tmp_path / "warm", seed=1, resolution=50)
+    symbol = tmp_path / "symbols" / "0.png"
+    symbol.write_bytes(b"not a png")
+    touch(symbol)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            deck.refresh()
+    Image.new("RGBA", (40, 40), (0, 0, 200, 255)).save(symbol)
+    touch(symbol)
+    write = deck.backend.write
+
+    def fail(*args):
+        raise OSError("The disk is full.")
+
+    monkeypatch.setattr(deck.backend, "write", fail)
+    with pytest.raises(OSError, match="full"):
+        deck.refresh()
+    monkeypatch.setattr(deck.backend, "write", write)
+    assert deck.refresh() == [
+        number for number, line in enumerate(deck.lines, 1) if 0 in line
+    ]
+    assert deck.refresh() == []
+
+
+def test_serve(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    deck = watch.WarmDeck(tmp_path / "symbols", tmp_path / "warm", seed=1, resolution=50)
+    requests = io.StringIO(
+        '{"command": "status"}\n'
+        "not json\n"
+        '{"command": "render", "cards": [2, 9]}\n'
+        '{"command": "pdf"}\n'
+        '{"command": "quit"}\n'
+        '{"command": "status"}\n'
+    )
+    responses = io.StringIO()
+    watch.serve(deck, requests, responses, interval=None)
+    status, not_json, missing, pdf, quit_ = map(
+        json.loads, responses.getvalue().splitlines()
+    )
+    assert status["ok"] and status["cards"] == 7
+    assert not not_json["ok"]
+    assert not missing["ok"] and "no card 9" in missing["error"]
+    assert pdf["ok"] and (tmp_path / "warm" / "cards.pdf").is_file()
+    assert quit_ == {"ok": True}
+
+
+def test_serve_socket_sends_refreshes(tmp_path, write_symbols):
+    write_symbols(tmp_path / "symbols", 7)
+    deck = watch.WarmDeck(tmp_path / "symbols", tmp_path / "warm", seed=1, resolution=50)
+    address = []
+    listening = threading.Event()
+
+    def ready(where):
+        address.extend(where)
+        listening.set()
+
+    threading.Thread(
+        target=watch.serve_socket,
+        args=(deck,),
+        kwargs={"interval": 0.05, "ready": ready},
+        daemon=True,
+    ).start()
+    assert listening.wait(10)
+    with socket.create_connection(tuple(address), timeout=10) as connection:
+        lines = connection.makefile("r", encoding="utf-8")
+        connection.sendall(b'{"command": "status"}\n')
+        assert json.loads(lines.readline())["ok"]
+        symbol = tmp_path / "symbols" / "0.png"
+        Image.new("RGBA", (40, 40), (0, 0, 200, 255)).save(symbol)
+        touch(symbol)
+        event = json.loads(lines.readline())
+    assert event["event"] == "refreshed"
+    assert event["cards"] == [
+        number for number, line in enumerate(deck.lines, 1) if 0 in line
+    ]